@@ -0,0 +1,586 @@
+#!/usr/bin/env python3
+"""
+Офлайн бенчмарк обработчика сигналов run_cmc_signal.py.
+
+Команды:
+    record - один раз записывает ответы REST API Binance и Bybit (тикеры и
+             свечи) для списка токенов в JSON фикстуры;
+    run    - поднимает локальный HTTP сервер, воспроизводящий фикстуры с
+             заданной задержкой и долей ошибок, засевает локальную PostgreSQL
+             синтетическими сигналами и прогоняет их пачками через
+             SignalProcessor.process_signals.
+
+Отчет: сигналов в секунду, исходящих запросов на сигнал, p50/p95/p99
+длительности тиков и этапов конвейера (по PIPELINE_METRICS).
+
+Примеры:
+    python bench_cmc_signal.py record --assets BTC,ETH,SOL,XRP --out bench_fixtures
+    python bench_cmc_signal.py run --fixtures bench_fixtures --signals 200 --batch 20 \\
+        --latency-ms 80 --jitter-ms 30 --error-rate 0.01 --mode async
+"""
+
+import os
+import io
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+import contextlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Any, Optional, List, Tuple
+from urllib.parse import urlparse, parse_qs
+
+import numpy as np
+import psycopg2
+import requests
+
+# Свечи записываются и воспроизводятся в единых обозначениях интервалов
+FIXTURE_INTERVALS = {'1m': 60_000, '1h': 3_600_000, '1d': 86_400_000}
+BINANCE_INTERVALS = {'1m': '1m', '1h': '1h', '1d': '1d'}
+BYBIT_INTERVALS = {'1m': '1', '1h': '60', '1d': 'D'}
+RECORD_KLINES_LIMIT = 1000
+LOCAL_DB_HOSTS = {'localhost', '127.0.0.1', '::1', ''}
+
+
+# --- 1. Запись фикстур ---
+
+def record_fixtures(assets: List[str], out_dir: str) -> None:
+    """
+    Записывает ответы бирж для всех спотовых ног токенов в фикстуры.
+
+    Для каждой пары сохраняется исходный ответ тикера и свечи 1m/1h/1d
+    (по возрастанию времени). Пары, которых нет на бирже, пропускаются.
+
+    Args:
+        assets: Базовые активы (BTC, ETH, ...)
+        out_dir: Каталог фикстур
+    """
+    import run_cmc_signal as rcs
+
+    session = requests.Session()
+    session.headers.update({'User-Agent': rcs.USER_AGENT})
+
+    for asset in assets:
+        for _, exchange_id, quote_asset in rcs.SPOT_LEGS:
+            symbol = f"{asset}{quote_asset}"
+            exchange = rcs.EXCHANGE_NAMES[exchange_id].lower()
+            if exchange_id == rcs.BINANCE_EXCHANGE_ID:
+                fixture = _record_binance(session, rcs.BINANCE_SPOT_API_URL, symbol)
+            else:
+                fixture = _record_bybit(session, rcs.BYBIT_API_URL, symbol)
+            if fixture is None:
+                print(f"  - {exchange} {symbol}: пары нет, пропущена")
+                continue
+
+            path = os.path.join(out_dir, exchange, f"{symbol}.json")
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'w') as f:
+                json.dump(fixture, f)
+            sizes = ', '.join(f"{name}: {len(klines)}" for name, klines in fixture['klines'].items())
+            print(f"  + {exchange} {symbol}: свечи {sizes}")
+
+
+def _record_binance(session: requests.Session, base_url: str, symbol: str) -> Optional[Dict[str, Any]]:
+    """Записывает тикер и свечи пары Binance; None, если пары нет."""
+    response = session.get(f"{base_url}/api/v3/ticker/24hr", params={'symbol': symbol}, timeout=10)
+    if response.status_code == 400:
+        return None
+    response.raise_for_status()
+    fixture = {'ticker': response.json(), 'klines': {}}
+    for name, interval in BINANCE_INTERVALS.items():
+        response = session.get(f"{base_url}/api/v3/klines", timeout=10, params={
+            'symbol': symbol, 'interval': interval, 'limit': RECORD_KLINES_LIMIT
+        })
+        response.raise_for_status()
+        fixture['klines'][name] = response.json()
+    return fixture
+
+
+def _record_bybit(session: requests.Session, base_url: str, symbol: str) -> Optional[Dict[str, Any]]:
+    """Записывает тикер и свечи пары Bybit; None, если пары нет."""
+    response = session.get(f"{base_url}/v5/market/tickers", params={'category': 'spot', 'symbol': symbol},
+                           timeout=10)
+    response.raise_for_status()
+    ticker = response.json()
+    if ticker.get('retCode') != 0 or not ticker.get('result', {}).get('list'):
+        return None
+    fixture = {'ticker': ticker, 'klines': {}}
+    for name, interval in BYBIT_INTERVALS.items():
+        response = session.get(f"{base_url}/v5/market/kline", timeout=10, params={
+            'category': 'spot', 'symbol': symbol, 'interval': interval, 'limit': RECORD_KLINES_LIMIT
+        })
+        response.raise_for_status()
+        # Bybit отдает свечи от новых к старым
+        fixture['klines'][name] = list(reversed(response.json().get('result', {}).get('list', [])))
+    return fixture
+
+
+def load_fixtures(fixtures_dir: str) -> Dict[Tuple[str, str], Dict[str, Any]]:
+    """
+    Загружает фикстуры.
+
+    Args:
+        fixtures_dir: Каталог фикстур (подкаталоги binance/ и bybit/)
+
+    Returns:
+        Словарь {(биржа, символ): фикстура}
+    """
+    fixtures = {}
+    for exchange in ('binance', 'bybit'):
+        exchange_dir = os.path.join(fixtures_dir, exchange)
+        if not os.path.isdir(exchange_dir):
+            continue
+        for name in sorted(os.listdir(exchange_dir)):
+            if name.endswith('.json'):
+                with open(os.path.join(exchange_dir, name)) as f:
+                    fixtures[(exchange, name[:-5])] = json.load(f)
+    return fixtures
+
+
+# --- 2. Сервер воспроизведения ---
+
+class ReplayServer:
+    """
+    Локальная замена REST API Binance и Bybit на основе фикстур.
+
+    Свечи отдаются на сетке времени запроса: значения записанных свечей
+    циклически раскладываются по запрошенным интервалам, поэтому ответы
+    выглядят свежими для любого момента запуска и корректно работают с
+    кэшем свечей обработчика. Каждый ответ задерживается на latency_ms
+    (± jitter_ms); доля error_rate ответов - 500, доля throttle_rate - 429.
+    """
+
+    def __init__(self, fixtures: Dict[Tuple[str, str], Dict[str, Any]], latency_ms: float = 0,
+                 jitter_ms: float = 0, error_rate: float = 0, throttle_rate: float = 0, seed: int = 0):
+        self.fixtures = fixtures
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.requests: Dict[str, int] = {'binance': 0, 'bybit': 0}
+        self.injected_errors = 0
+        self._server: Optional[ThreadingHTTPServer] = None
+
+    @property
+    def url(self) -> str:
+        """Базовый URL запущенного сервера."""
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def total_requests(self) -> int:
+        """Всего принятых запросов."""
+        with self._lock:
+            return sum(self.requests.values())
+
+    def start(self) -> None:
+        """Запускает сервер на свободном порту в фоновом потоке."""
+        replay = self
+
+        class ReplayHandler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            # Заголовки и тело пишутся отдельно - без этого keep-alive ответы ждут delayed ACK
+            disable_nagle_algorithm = True
+
+            def do_GET(self):
+                parsed = urlparse(self.path)
+                params = {key: values[0] for key, values in parse_qs(parsed.query).items()}
+                status, body, headers = replay.handle(parsed.path, params)
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), ReplayHandler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name='replay-http', daemon=True).start()
+
+    def stop(self) -> None:
+        """Останавливает сервер."""
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+
+    def handle(self, path: str, params: Dict[str, str]) -> Tuple[int, Any, Dict[str, str]]:
+        """
+        Формирует ответ на запрос.
+
+        Args:
+            path: Путь запроса
+            params: Параметры запроса
+
+        Returns:
+            Кортеж (HTTP статус, тело, дополнительные заголовки)
+        """
+        exchange = 'bybit' if path.startswith('/v5/') else 'binance'
+        with self._lock:
+            self.requests[exchange] += 1
+            roll = self._random.random()
+            delay = max(0.0, self._random.gauss(self.latency_ms, self.jitter_ms)) / 1000 if self.latency_ms else 0
+        if delay:
+            time.sleep(delay)
+
+        if roll < self.error_rate:
+            with self._lock:
+                self.injected_errors += 1
+            return 500, {'code': -1000, 'msg': 'Injected error'}, {}
+        if roll < self.error_rate + self.throttle_rate:
+            with self._lock:
+                self.injected_errors += 1
+            return 429, {'code': -1003, 'msg': 'Injected throttling'}, {'Retry-After': '1'}
+
+        if path == '/api/v3/ticker/24hr':
+            return self._binance_ticker(params)
+        if path == '/api/v3/klines':
+            return self._binance_klines(params)
+        if path == '/v5/market/tickers':
+            return self._bybit_ticker(params)
+        if path == '/v5/market/kline':
+            return self._bybit_klines(params)
+        return 404, {'msg': 'Not found'}, {}
+
+    def _binance_ticker(self, params: Dict[str, str]) -> Tuple[int, Any, Dict[str, str]]:
+        if 'symbol' not in params:
+            tickers = [fixture['ticker'] for (exchange, _), fixture in self.fixtures.items() if exchange == 'binance']
+            return 200, tickers, {}
+        fixture = self.fixtures.get(('binance', params['symbol']))
+        if fixture is None:
+            return 400, {'code': -1121, 'msg': 'Invalid symbol.'}, {}
+        return 200, fixture['ticker'], {}
+
+    def _bybit_ticker(self, params: Dict[str, str]) -> Tuple[int, Any, Dict[str, str]]:
+        if 'symbol' not in params:
+            items = [item for (exchange, _), fixture in self.fixtures.items() if exchange == 'bybit'
+                     for item in fixture['ticker']['result']['list']]
+            return 200, {'retCode': 0, 'retMsg': 'OK', 'result': {'category': 'spot', 'list': items}}, {}
+        fixture = self.fixtures.get(('bybit', params['symbol']))
+        if fixture is None:
+            return 200, {'retCode': 10001, 'retMsg': 'Not supported symbols', 'result': {}}, {}
+        return 200, fixture['ticker'], {}
+
+    def _binance_klines(self, params: Dict[str, str]) -> Tuple[int, Any, Dict[str, str]]:
+        fixture = self.fixtures.get(('binance', params.get('symbol')))
+        interval = {v: k for k, v in BINANCE_INTERVALS.items()}.get(params.get('interval'))
+        if fixture is None or interval is None:
+            return 400, {'code': -1121, 'msg': 'Invalid symbol.'}, {}
+        interval_ms = FIXTURE_INTERVALS[interval]
+        opens = self._open_times(interval_ms, int(params.get('limit', 500)), params.get('startTime'),
+                                 params.get('endTime'), from_start=True)
+        recorded = fixture['klines'][interval]
+        klines = []
+        for open_time in opens:
+            source = recorded[open_time // interval_ms % len(recorded)]
+            klines.append([open_time, *source[1:6], open_time + interval_ms - 1, *source[7:]])
+        return 200, klines, {}
+
+    def _bybit_klines(self, params: Dict[str, str]) -> Tuple[int, Any, Dict[str, str]]:
+        fixture = self.fixtures.get(('bybit', params.get('symbol')))
+        interval = {v: k for k, v in BYBIT_INTERVALS.items()}.get(params.get('interval'))
+        if fixture is None or interval is None:
+            return 200, {'retCode': 10001, 'retMsg': 'Not supported symbols', 'result': {}}, {}
+        interval_ms = FIXTURE_INTERVALS[interval]
+        opens = self._open_times(interval_ms, int(params.get('limit', 200)), params.get('start'),
+                                 params.get('end'), from_start=False)
+        recorded = fixture['klines'][interval]
+        klines = [[str(open_time), *recorded[open_time // interval_ms % len(recorded)][1:]]
+                  for open_time in reversed(opens)]
+        return 200, {'retCode': 0, 'retMsg': 'OK',
+                     'result': {'symbol': params['symbol'], 'category': 'spot', 'list': klines}}, {}
+
+    @staticmethod
+    def _open_times(interval_ms: int, limit: int, start: Optional[str], end: Optional[str],
+                    from_start: bool) -> List[int]:
+        """
+        Время открытия свечей, которые биржа вернула бы на запрос.
+
+        Binance при startTime отдает первые limit свечей после начала,
+        Bybit - последние limit свечей диапазона.
+        """
+        last = int(time.time() * 1000) // interval_ms * interval_ms
+        if end is not None:
+            last = min(last, int(end) // interval_ms * interval_ms)
+        first = None
+        if start is not None:
+            first = -(-int(start) // interval_ms) * interval_ms
+        if first is not None and from_start:
+            last = min(last, first + (limit - 1) * interval_ms)
+        lowest = last - (limit - 1) * interval_ms
+        if first is not None:
+            lowest = max(lowest, first)
+        return list(range(lowest, last + 1, interval_ms))
+
+
+# --- 3. Синтетические сигналы в локальной PostgreSQL ---
+
+def seed_trading_pairs(cursor, rcs, fixtures: Dict[Tuple[str, str], Dict[str, Any]], assets: List[str]) -> None:
+    """
+    Добавляет токены и спотовые пары фикстур в tokens/trading_pairs.
+
+    Args:
+        cursor: Курсор БД
+        rcs: Модуль run_cmc_signal
+        fixtures: Загруженные фикстуры
+        assets: Базовые активы
+    """
+    exchange_ids = {name.lower(): exchange_id for exchange_id, name in rcs.EXCHANGE_NAMES.items()}
+    for asset in assets:
+        cursor.execute("INSERT INTO tokens (symbol) VALUES (%s) ON CONFLICT (symbol) DO NOTHING;", (asset,))
+    for (exchange, symbol) in fixtures:
+        for _, _, quote_asset in rcs.SPOT_LEGS:
+            asset = symbol[:-len(quote_asset)]
+            if symbol.endswith(quote_asset) and asset in assets:
+                cursor.execute("""
+                    INSERT INTO trading_pairs (token_id, exchange_id, pair_symbol, contract_type_id)
+                    SELECT id, %s, %s, %s FROM tokens WHERE symbol = %s
+                    ON CONFLICT (token_id, exchange_id, pair_symbol, contract_type_id) DO NOTHING;
+                """, (exchange_ids[exchange], symbol, rcs.SPOT_CONTRACT_TYPE_ID, asset))
+                break
+
+
+def load_bench_tokens(cursor, rcs, assets: List[str]) -> List[Tuple[int, str]]:
+    """
+    Находит токены, у которых есть спотовая пара Binance USDT.
+
+    Без нее сигнал не считается обработанным (claim_new_signals), поэтому
+    такие токены в бенчмарке не используются.
+
+    Returns:
+        Список кортежей (token_id, base_asset)
+    """
+    cursor.execute("""
+        SELECT DISTINCT t.id, t.symbol
+        FROM tokens t
+        JOIN trading_pairs tp ON tp.token_id = t.id
+        WHERE t.symbol = ANY(%s)
+          AND tp.exchange_id = %s
+          AND tp.contract_type_id = %s
+          AND tp.pair_symbol = t.symbol || 'USDT'
+        ORDER BY t.id
+    """, (assets, rcs.BINANCE_EXCHANGE_ID, rcs.SPOT_CONTRACT_TYPE_ID))
+    return cursor.fetchall()
+
+
+def seed_signals(cursor, tokens: List[Tuple[int, str]], count: int, offset: int) -> List[int]:
+    """
+    Вставляет count синтетических сигналов, циклически по токенам.
+
+    Returns:
+        ID вставленных сигналов
+    """
+    rows = [tokens[(offset + i) % len(tokens)] for i in range(count)]
+    ids = []
+    for token_id, asset in rows:
+        cursor.execute("""
+            INSERT INTO signals_10min (token_id, token_symbol, base_asset, signal_time)
+            VALUES (%s, %s, %s, NOW())
+            RETURNING id
+        """, (token_id, asset, asset))
+        ids.append(cursor.fetchone()[0])
+    return ids
+
+
+# --- 4. Прогон ---
+
+def quantiles(values: List[float]) -> Dict[str, float]:
+    """p50/p95/p99/max в миллисекундах."""
+    if not values:
+        return {}
+    p50, p95, p99 = np.percentile(values, (50, 95, 99))
+    return {'p50_ms': round(p50 * 1000, 1), 'p95_ms': round(p95 * 1000, 1),
+            'p99_ms': round(p99 * 1000, 1), 'max_ms': round(max(values) * 1000, 1)}
+
+
+def run_benchmark(args: argparse.Namespace) -> Dict[str, Any]:
+    """
+    Прогоняет синтетические сигналы через SignalProcessor и собирает отчет.
+
+    Args:
+        args: Аргументы командной строки
+
+    Returns:
+        Отчет бенчмарка
+    """
+    fixtures = load_fixtures(args.fixtures)
+    if not fixtures:
+        sys.exit(f"Нет фикстур в {args.fixtures}, сначала выполните record")
+
+    replay = ReplayServer(fixtures, args.latency_ms, args.jitter_ms, args.error_rate, args.throttle_rate,
+                          args.seed)
+    replay.start()
+
+    # Конфигурация run_cmc_signal читается при импорте
+    os.environ['BINANCE_SPOT_API_URL'] = replay.url
+    os.environ['BYBIT_API_URL'] = replay.url
+    os.environ['SIGNAL_HTTP_MODE'] = args.mode
+    os.environ['LIVE_STATE_URL'] = args.live_state_url
+    os.environ['METRICS_JSON_LOG'] = '0'
+    import run_cmc_signal as rcs
+
+    if (rcs.DB_CONFIG['host'] or '') not in LOCAL_DB_HOSTS and not args.allow_remote_db:
+        sys.exit(f"POSTGRES_HOST={rcs.DB_CONFIG['host']} не локальный; используйте --allow-remote-db")
+
+    assets = sorted({symbol[:-4] for exchange, symbol in fixtures if exchange == 'binance'
+                     and symbol.endswith('USDT')})
+    conn = psycopg2.connect(**rcs.DB_CONFIG)
+    with conn.cursor() as cursor:
+        if args.seed_pairs:
+            seed_trading_pairs(cursor, rcs, fixtures, assets)
+        tokens = load_bench_tokens(cursor, rcs, assets)
+    conn.commit()
+    if not tokens:
+        sys.exit("В trading_pairs нет пар Binance USDT для токенов фикстур; используйте --seed-pairs")
+
+    print(f"Фикстуры: {len(fixtures)} пар, токенов: {len(tokens)}, сервер: {replay.url}")
+    print(f"Режим: {args.mode}, сигналов: {args.signals} пачками по {args.batch}, прогрев: {args.warmup} пачек, "
+          f"задержка {args.latency_ms}±{args.jitter_ms} мс, ошибки {args.error_rate:.1%}, "
+          f"429 {args.throttle_rate:.1%}")
+
+    processor = rcs.SignalProcessor()
+    processor.prepare_database(notify_trigger=False)
+    tick_times: List[float] = []
+    stage_ticks: Dict[str, List[Dict[str, Any]]] = {}
+    signals_done = signals_enriched = requests_measured = 0
+    batches = -(-args.signals // args.batch)
+
+    try:
+        for batch_no in range(args.warmup + batches):
+            measured = batch_no >= args.warmup
+            size = args.batch if not measured else min(args.batch, args.signals - signals_done)
+            if args.cold and measured:
+                processor.close()
+                processor = rcs.SignalProcessor()
+
+            with conn.cursor() as cursor:
+                ids = seed_signals(cursor, tokens, size, batch_no * args.batch)
+            conn.commit()
+
+            requests_before = replay.total_requests()
+            output = contextlib.nullcontext() if args.verbose else contextlib.ExitStack()
+            with output as stack:
+                if stack is not None:
+                    sink = io.StringIO()
+                    stack.enter_context(contextlib.redirect_stdout(sink))
+                    stack.enter_context(contextlib.redirect_stderr(sink))
+                started = time.perf_counter()
+                processor.process_signals(run_db_function=False)
+                elapsed = time.perf_counter() - started
+
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT count(*) FROM signals_10min WHERE id = ANY(%s) "
+                               "AND spot_usdt_binance_price_now IS NOT NULL", (ids,))
+                enriched = cursor.fetchone()[0]
+                if not args.keep:
+                    cursor.execute("DELETE FROM signals_10min WHERE id = ANY(%s)", (ids,))
+            conn.commit()
+
+            if not measured:
+                continue
+            signals_done += size
+            signals_enriched += enriched
+            requests_measured += replay.total_requests() - requests_before
+            tick_times.append(elapsed)
+            for entry in rcs.PIPELINE_METRICS.last_tick.get('stages', []):
+                name = entry['stage'] + (f"[{entry['exchange']}]" if entry.get('exchange') else '')
+                stage_ticks.setdefault(name, []).append(entry)
+            print(f"  пачка {batch_no - args.warmup + 1}/{batches}: {size} сигналов за {elapsed * 1000:.0f} мс, "
+                  f"обогащено {enriched}")
+    finally:
+        processor.close()
+        conn.close()
+        replay.stop()
+
+    total_time = sum(tick_times)
+    report = {
+        'mode': args.mode,
+        'signals': signals_done,
+        'signals_enriched': signals_enriched,
+        'signals_per_sec': round(signals_done / total_time, 2) if total_time else None,
+        'requests_per_signal': round(requests_measured / signals_done, 2) if signals_done else None,
+        'injected_errors': replay.injected_errors,
+        'tick': quantiles(tick_times),
+        # Для этапов: медиана p50 и худший p99 по тикам
+        'stages': {
+            name: {
+                'count': sum(entry['count'] for entry in entries),
+                'p50_ms': round(float(np.median([entry['p50_ms'] for entry in entries])), 2),
+                'p99_ms': max(entry['p99_ms'] for entry in entries),
+            }
+            for name, entries in sorted(stage_ticks.items())
+        },
+        'counters': {
+            f"{counter['event']}[{counter['exchange']}]" if counter['exchange'] else counter['event']: counter['value']
+            for counter in rcs.PIPELINE_METRICS.last_tick.get('counters', [])
+        }
+    }
+    return report
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    """Печатает отчет бенчмарка."""
+    print("\n" + "=" * 60)
+    print(f"Сигналов: {report['signals']} (обогащено {report['signals_enriched']}), режим {report['mode']}")
+    print(f"Пропускная способность: {report['signals_per_sec']} сигналов/сек")
+    print(f"Исходящих запросов на сигнал: {report['requests_per_signal']}")
+    print(f"Внесенных ошибок: {report['injected_errors']}")
+    tick = report['tick']
+    print(f"Тик: p50 {tick.get('p50_ms')} мс, p95 {tick.get('p95_ms')} мс, p99 {tick.get('p99_ms')} мс, "
+          f"max {tick.get('max_ms')} мс")
+    print("Этапы (медиана p50 / худший p99 по тикам, мс):")
+    for name, stage in report['stages'].items():
+        print(f"  {name:<32} {stage['p50_ms']:>9} / {stage['p99_ms']:<9} ({stage['count']} замеров)")
+    print("=" * 60)
+
+
+def main():
+    """Точка входа: разбор аргументов и запуск команды."""
+    parser = argparse.ArgumentParser(description="Офлайн бенчмарк run_cmc_signal.py")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    record_parser = subparsers.add_parser('record', help="Записать ответы бирж в фикстуры")
+    record_parser.add_argument('--assets', required=True, help="Базовые активы через запятую (BTC,ETH,...)")
+    record_parser.add_argument('--out', default='bench_fixtures', help="Каталог фикстур")
+
+    run_parser = subparsers.add_parser('run', help="Прогнать сигналы на фикстурах")
+    run_parser.add_argument('--fixtures', default='bench_fixtures', help="Каталог фикстур")
+    run_parser.add_argument('--signals', type=int, default=100, help="Всего сигналов в замере")
+    run_parser.add_argument('--batch', type=int, default=20, help="Сигналов за тик")
+    run_parser.add_argument('--warmup', type=int, default=1, help="Пачек прогрева (не учитываются)")
+    run_parser.add_argument('--mode', choices=('threads', 'async'), default=os.getenv("SIGNAL_HTTP_MODE", "threads"))
+    run_parser.add_argument('--latency-ms', type=float, default=50, help="Средняя задержка ответа")
+    run_parser.add_argument('--jitter-ms', type=float, default=10, help="Стандартное отклонение задержки")
+    run_parser.add_argument('--error-rate', type=float, default=0.0, help="Доля ответов 500")
+    run_parser.add_argument('--throttle-rate', type=float, default=0.0, help="Доля ответов 429")
+    run_parser.add_argument('--seed', type=int, default=0, help="Seed генератора задержек и ошибок")
+    run_parser.add_argument('--cold', action='store_true', help="Новый процессор (пустой кэш) на каждую пачку")
+    run_parser.add_argument('--live-state-url', default='', help="API состояния сборщика (по умолчанию выключен)")
+    run_parser.add_argument('--seed-pairs', action='store_true', help="Добавить токены и пары фикстур в БД")
+    run_parser.add_argument('--keep', action='store_true', help="Не удалять синтетические сигналы")
+    run_parser.add_argument('--allow-remote-db', action='store_true', help="Разрешить нелокальный POSTGRES_HOST")
+    run_parser.add_argument('--json', help="Сохранить отчет в JSON файл")
+    run_parser.add_argument('--verbose', action='store_true', help="Показывать вывод обработчика")
+
+    args = parser.parse_args()
+    if args.command == 'record':
+        record_fixtures([asset.strip().upper() for asset in args.assets.split(',') if asset.strip()], args.out)
+        return
+
+    report = run_benchmark(args)
+    print_report(report)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"Отчет сохранен в {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -22,6 +22,8 @@ EXCHANGES = {'binance': 1, 'bybit': 2}
 CONTRACT_TYPES = {'PERPETUAL': 1, 'SPOT': 2}
 # Белый список квотируемых активов для фильтрации
 ALLOWED_QUOTE_ASSETS = {'USDT', 'USDC', 'BUSD', 'BTC'}  # BUSD для совместимости со старыми парами Binance
+# Канал уведомления об обновлении trading_pairs (слушает run_cmc_signal.py)
+TRADING_PAIRS_NOTIFY_CHANNEL = os.getenv("TRADING_PAIRS_NOTIFY_CHANNEL", "trading_pairs_updated")
 
 
 def get_db_connection():
@@ -329,6 +331,8 @@ def process_and_store_data(all_pairs: list[dict], cmc_map: dict[str, int]):
                             """, pairs_insert_data)
 
             logging.info(f"Вставлено/обновлено {len(pairs_insert_data)} торговых пар в БД.")
+            # Уведомление доставляется слушателям только после коммита
+            cur.execute("SELECT pg_notify(%s, %s);", (TRADING_PAIRS_NOTIFY_CHANNEL, str(len(pairs_insert_data))))
             conn.commit()
     except psycopg2.Error as e:
         logging.error(f"Ошибка при работе с БД: {e}")
@@ -1,16 +1,22 @@
+import array
 import asyncio
 import ssl
+import time
 import certifi
 import aiohttp
+import multiprocessing
+import numpy as np
+from aiohttp import web
 import orjson
 import os
 from dotenv import load_dotenv
 import asyncpg
 import websockets
-from datetime import datetime, timezone, timedelta
+from datetime import datetime, timezone
 import logging
-from typing import Dict, List, Optional, Tuple, Any, Callable
+from typing import Dict, List, Optional, Tuple, Any, Callable, Iterable
 import random
+from collections import Counter
 import colorlog  # <-- НОВЫЙ ИМПОРТ
 
 
@@ -43,12 +49,390 @@ logger = setup_colored_logging()
 
 # --- 1. Настройки и глобальные переменные ---
 load_dotenv()
-MARKET_STATE: Dict[str, Dict] = {}
-SPOT_STATE: Dict[str, Dict] = {}
-LAST_KNOWN_FUTURES_STATE: Dict[int, Dict] = {}
-# --- НОВОЕ: Словарь для истории минутных свечей Bybit ---
-BYBIT_KLINE_HISTORY: Dict[str, List[float]] = {}
-# ------------------------------------------------------
+# Поля состояния пар: спот и фьючерсы (фьючерсная строка market_data пишется, только когда есть все поля)
+SPOT_SNAPSHOT_FIELDS = ('price', 'volume_1h', 'quote_volume_1h', 'volume_24h', 'quote_volume_24h')
+FUTURES_FIELDS = ('mark_price', 'index_price', 'funding_rate', 'volume_base_24h', 'volume_quote_24h', 'open_interest')
+EXCHANGE_KEYS = {1: "BINANCE", 2: "BYBIT"}
+# Режим разбора WebSocket: inline - все воркеры в event loop основного процесса,
+# process - каждый воркер в своем процессе, состояние в разделяемой памяти
+COLLECTOR_INGEST_MODE = os.getenv("COLLECTOR_INGEST_MODE", "inline")
+# Запас слотов разделяемого состояния под пары, добавленные без перезапуска (режим process)
+COLLECTOR_SLOT_RESERVE = int(os.getenv("COLLECTOR_SLOT_RESERVE", 1024))
+# Период перечитывания trading_pairs (сек)
+COLLECTOR_PAIRS_RELOAD_SECONDS = float(os.getenv("COLLECTOR_PAIRS_RELOAD_SECONDS", 300))
+# Допустимые периоды снимков таблиц (секунды); снимки выровнены по кратным периоду моментам
+SNAPSHOT_RESOLUTIONS = (1, 5, 15, 60)
+
+
+def snapshot_interval(env_name: str) -> int:
+    """
+    Читает период снимков таблицы из переменной окружения.
+
+    Args:
+        env_name: Имя переменной окружения
+
+    Returns:
+        Период в секундах из SNAPSHOT_RESOLUTIONS (60 по умолчанию и при ошибке)
+    """
+    raw_value = os.getenv(env_name, "60")
+    try:
+        interval = int(raw_value)
+    except ValueError:
+        interval = None
+    if interval not in SNAPSHOT_RESOLUTIONS:
+        logger.warning(f"{env_name}={raw_value} не входит в {SNAPSHOT_RESOLUTIONS}, используется 60 сек.")
+        return 60
+    return interval
+
+
+SPOT_SNAPSHOT_INTERVAL = snapshot_interval("SPOT_SNAPSHOT_INTERVAL")
+FUTURES_SNAPSHOT_INTERVAL = snapshot_interval("FUTURES_SNAPSHOT_INTERVAL")
+
+
+class ColumnarState:
+    """
+    Колоночное хранилище состояния пар сборщика.
+
+    Каждой паре биржи при загрузке назначается целочисленный слот. Каждое
+    поле - типизированный столбец array('d') по слотам (NaN - значения еще не
+    было), рядом такой же столбец времени обновления поля. Сообщение WebSocket
+    записывает значения в свой слот без создания объектов, а сохранение снимка
+    читает столбцы всех пар сразу через NumPy без копирования буфера.
+
+    Столбец ready отмечает пары, у которых уже есть все поля. Его ведут
+    воркеры: проверка выполняется только при первой записи поля пары, а
+    значения не сбрасываются, поэтому готовая пара остается готовой.
+    """
+
+    def __init__(self, fields: Iterable[str]):
+        self.fields = tuple(fields)
+        self._field_index = {name: index for index, name in enumerate(self.fields)}
+        # Слот -> ключ "БИРЖА:СИМВОЛ" и биржа -> {символ: слот}
+        self.keys: List[str] = []
+        self.slots: Dict[str, Dict[str, int]] = {}
+        self.values = [array.array('d') for _ in self.fields]
+        self.updated_at = [array.array('d') for _ in self.fields]
+        self.ready = array.array('b')
+        # Число слотов разделяемых столбцов; None - столбцы растут на месте
+        self.capacity: Optional[int] = None
+
+    def field(self, name: str) -> int:
+        """Возвращает индекс поля."""
+        return self._field_index[name]
+
+    def add_pairs(self, exchange: str, symbols: Iterable[str]) -> None:
+        """Назначает слоты новым парам биржи; уже известные пары сохраняют свои слоты."""
+        exchange_slots = self.slots.setdefault(exchange, {})
+        new_symbols = [symbol for symbol in dict.fromkeys(symbols) if symbol not in exchange_slots]
+        if not new_symbols:
+            return
+        if self.capacity is not None and len(self.keys) + len(new_symbols) > self.capacity:
+            raise RuntimeError(f"Запас разделяемых слотов исчерпан ({self.capacity}): "
+                               f"{len(new_symbols)} новых пар требуют перезапуска сборщика")
+        for symbol in new_symbols:
+            exchange_slots[symbol] = len(self.keys)
+            self.keys.append(f"{exchange}:{symbol}")
+        if self.is_shared:
+            # Разделяемые столбцы выделены с запасом и уже заполнены NaN
+            return
+        # Столбцы растут на месте, поэтому ссылки на них в воркерах остаются верными
+        for column in self.values:
+            column.extend(array.array('d', [np.nan]) * len(new_symbols))
+        for column in self.updated_at:
+            column.extend(array.array('d', [0.0]) * len(new_symbols))
+        self.ready.extend(array.array('b', [0]) * len(new_symbols))
+
+    @property
+    def is_shared(self) -> bool:
+        """Столбцы лежат в разделяемой памяти процессов разбора."""
+        return bool(self.values) and not isinstance(self.values[0], array.array)
+
+    def share(self, context: multiprocessing.context.BaseContext, reserve: int = 0) -> None:
+        """
+        Переносит столбцы в разделяемую память (RawArray) для процессов разбора.
+
+        Вызывается после назначения слотов и до запуска процессов. Запись
+        одного поля атомарна для читателя, блокировки не нужны. Разделяемые
+        столбцы не растут, поэтому выделяются с запасом reserve слотов под
+        пары, добавленные на лету.
+
+        Args:
+            context: Контекст multiprocessing, которым будут запускаться процессы
+            reserve: Запас слотов сверх уже назначенных
+        """
+        self.capacity = len(self.keys) + reserve
+
+        def to_shared(column: array.array, fill: float) -> Any:
+            shared = context.RawArray(column.typecode, self.capacity)
+            shared[:] = column + array.array(column.typecode, [fill]) * (self.capacity - len(column))
+            return shared
+
+        self.values = [to_shared(column, np.nan) for column in self.values]
+        self.updated_at = [to_shared(column, 0.0) for column in self.updated_at]
+        self.ready = to_shared(self.ready, 0)
+
+    def shared_handles(self) -> Optional[Tuple[List[str], List[Any], List[Any], Any]]:
+        """Возвращает (ключи слотов, столбцы значений, столбцы времени, столбец готовности) для процесса разбора."""
+        return (self.keys, self.values, self.updated_at, self.ready) if self.is_shared else None
+
+    def attach(self, keys: List[str], values: List[Any], updated_at: List[Any], ready: Any) -> None:
+        """Подключает состояние процесса разбора к разделяемым столбцам основного процесса."""
+        self.keys = list(keys)
+        self.slots = {}
+        for slot, market_key in enumerate(self.keys):
+            exchange, _, symbol = market_key.partition(':')
+            self.slots.setdefault(exchange, {})[symbol] = slot
+        self.values = values
+        self.updated_at = updated_at
+        self.ready = ready
+        self.capacity = len(ready)
+
+    def sync_keys(self, keys: List[str]) -> None:
+        """
+        Дополняет слоты процесса разбора парами, добавленными основным процессом.
+
+        Слоты только добавляются, поэтому новые ключи - хвост списка. Словари
+        слотов бирж дополняются на месте: воркеры держат ссылки на них.
+        """
+        for slot in range(len(self.keys), len(keys)):
+            exchange, _, symbol = keys[slot].partition(':')
+            self.slots.setdefault(exchange, {})[symbol] = slot
+        self.keys = list(keys)
+
+    def slot(self, exchange: str, symbol: str) -> Optional[int]:
+        """Возвращает слот пары или None, если пара не отслеживается."""
+        return self.slots.get(exchange, {}).get(symbol)
+
+    def slot_by_key(self, market_key: str) -> Optional[int]:
+        """Возвращает слот по ключу "БИРЖА:СИМВОЛ"."""
+        exchange, _, symbol = market_key.partition(':')
+        return self.slot(exchange, symbol)
+
+    def set(self, slot: int, field: int, value: float, now: float) -> None:
+        """Записывает значение поля пары."""
+        column = self.values[field]
+        first_value = column[slot] != column[slot]
+        column[slot] = value
+        self.updated_at[field][slot] = now
+        if first_value:
+            self._mark_ready(slot)
+
+    def touch(self, slot: int, field: int, now: float) -> None:
+        """
+        Подтверждает, что значение поля актуально (дельта-сообщение без изменения поля).
+
+        Поле без значения не подтверждается: иначе оно не считалось бы
+        устаревшим и сборщик открытого интереса не дозапрашивал бы его.
+        """
+        column = self.values[field]
+        if column[slot] == column[slot]:
+            self.updated_at[field][slot] = now
+
+    def _mark_ready(self, slot: int) -> None:
+        """Отмечает пару готовой, если у нее есть все поля."""
+        if all(column[slot] == column[slot] for column in self.values):
+            self.ready[slot] = 1
+
+    def ready_mask(self, slots: np.ndarray) -> np.ndarray:
+        """
+        Возвращает маску готовых пар набора.
+
+        Пары без отметки перепроверяются по значениям: последние поля пары
+        могут впервые прийти одновременно из разных процессов, и тогда ни
+        один из них не увидит пару полной.
+
+        Args:
+            slots: Массив слотов
+
+        Returns:
+            Булев массив по парам набора
+        """
+        ready = np.frombuffer(self.ready, dtype=np.int8)[slots].astype(bool)
+        if not ready.all():
+            pending = slots[~ready]
+            complete = ~np.isnan(np.stack([np.frombuffer(column, dtype=np.float64)[pending]
+                                           for column in self.values])).any(axis=0)
+            for slot in pending[complete].tolist():
+                self.ready[slot] = 1
+            ready[~ready] = complete
+        return ready
+
+    def get(self, slot: int, field: int) -> float:
+        """Возвращает значение поля пары (NaN, если его еще не было)."""
+        return self.values[field][slot]
+
+    def columns(self, slots: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Читает все поля набора пар.
+
+        Args:
+            slots: Массив слотов
+
+        Returns:
+            Кортеж (значения [поле, пара], время обновления [поле, пара]) - копии
+        """
+        return (np.stack([np.frombuffer(column, dtype=np.float64)[slots] for column in self.values]),
+                np.stack([np.frombuffer(column, dtype=np.float64)[slots] for column in self.updated_at]))
+
+
+class MinuteRing:
+    """
+    Кольцевой буфер значений по минутам за последние size минут.
+
+    Ячейка определяется временем начала минутной свечи, поэтому повторные
+    обновления открытой свечи заменяют ее значение на месте. Для каждого окна
+    из windows (в минутах, не больше size) хранится текущая сумма, которая
+    меняется на разницу значений за O(1); раз в size минут суммы
+    пересчитываются точно, чтобы не копилась ошибка округления. Буфер
+    хранит несколько каналов (например, объем и оборот) с общей шкалой минут.
+    """
+
+    def __init__(self, size: int = 60, windows: Tuple[int, ...] = (60,), channels: int = 1):
+        if not windows or max(windows) > size:
+            raise ValueError(f"Окна {windows} должны помещаться в буфер из {size} минут")
+        self.size = size
+        self.windows = tuple(windows)
+        self._window_index = {window: index for index, window in enumerate(self.windows)}
+        self._minutes = array.array('q', [-1]) * size
+        self._values = [array.array('d', [0.0]) * size for _ in range(channels)]
+        self._sums = [array.array('d', [0.0]) * len(self.windows) for _ in range(channels)]
+        self.last_minute = -1
+
+    def update(self, start_ms: int, *values: float) -> bool:
+        """
+        Записывает значения каналов для минутной свечи.
+
+        Args:
+            start_ms: Время начала свечи в миллисекундах
+            *values: Значения каналов свечи (накопленные с начала минуты)
+
+        Returns:
+            False, если свеча старше буфера и отброшена
+        """
+        minute = start_ms // 60000
+        if minute > self.last_minute:
+            self._advance(minute)
+        elif minute <= self.last_minute - self.size:
+            return False
+        cell = minute % self.size
+        age = self.last_minute - minute
+        for column, sums, value in zip(self._values, self._sums, values):
+            delta = value - column[cell]
+            if delta:
+                column[cell] = value
+                for index, window in enumerate(self.windows):
+                    if age < window:
+                        sums[index] += delta
+        return True
+
+    def window_sum(self, window: int, channel: int = 0) -> float:
+        """Возвращает сумму канала за последние window минут, включая открытую свечу."""
+        return self._sums[channel][self._window_index[window]]
+
+    def _advance(self, minute: int) -> None:
+        """Сдвигает буфер до минуты minute: уходящие из окон минуты вычитаются, новые ячейки обнуляются."""
+        if self.last_minute < 0 or minute - self.last_minute >= self.size:
+            for offset in range(self.size):
+                cell = (minute - offset) % self.size
+                self._minutes[cell] = minute - offset
+                for column in self._values:
+                    column[cell] = 0.0
+            for sums in self._sums:
+                for index in range(len(self.windows)):
+                    sums[index] = 0.0
+            self.last_minute = minute
+            return
+
+        for current in range(self.last_minute + 1, minute + 1):
+            for index, window in enumerate(self.windows):
+                leaving_cell = (current - window) % self.size
+                if self._minutes[leaving_cell] == current - window:
+                    for column, sums in zip(self._values, self._sums):
+                        sums[index] -= column[leaving_cell]
+            cell = current % self.size
+            self._minutes[cell] = current
+            for column in self._values:
+                column[cell] = 0.0
+        self.last_minute = minute
+        if minute % self.size == 0:
+            self._resync()
+
+    def _resync(self) -> None:
+        """Пересчитывает суммы окон по ячейкам буфера."""
+        for column, sums in zip(self._values, self._sums):
+            for index, window in enumerate(self.windows):
+                sums[index] = sum(column[(self.last_minute - age) % self.size] for age in range(window))
+
+
+class TrackedPairs:
+    """
+    Набор отслеживаемых элементов (символов или id пар), меняющийся на лету.
+
+    Наблюдатель trading_pairs заменяет набор через update(); version растет
+    при каждом изменении, а wait_changed() будит воркеры, которые сами
+    сравнивают свои подписки с новым набором.
+    """
+
+    def __init__(self, items: Iterable = ()):
+        self.items: List = list(dict.fromkeys(items))
+        self.version = 0
+        # Событие создается при первом ожидании, внутри работающего event loop
+        self._changed: Optional[asyncio.Event] = None
+
+    def update(self, items: Iterable) -> Tuple[List, List]:
+        """
+        Заменяет набор.
+
+        Returns:
+            Кортеж (добавленные, удаленные); при пустой разнице версия не меняется
+        """
+        items = list(dict.fromkeys(items))
+        current, wanted = set(self.items), set(items)
+        added = [item for item in items if item not in current]
+        removed = [item for item in self.items if item not in wanted]
+        if added or removed:
+            self.items = items
+            self.version += 1
+            if self._changed is not None:
+                self._changed.set()
+                self._changed = None
+        return added, removed
+
+    async def wait_changed(self, version: int) -> None:
+        """Ждет, пока версия набора не станет отличной от version."""
+        while self.version == version:
+            if self._changed is None:
+                self._changed = asyncio.Event()
+            await self._changed.wait()
+
+
+MARKET_STATE = ColumnarState(FUTURES_FIELDS)
+SPOT_STATE = ColumnarState(SPOT_SNAPSHOT_FIELDS)
+# Поля тикера линейных контрактов Bybit (WebSocket и REST) -> поля MARKET_STATE
+BYBIT_LINEAR_TICKER_FIELDS = (
+    ('markPrice', 'mark_price'), ('indexPrice', 'index_price'), ('fundingRate', 'funding_rate'),
+    ('volume24h', 'volume_base_24h'), ('turnover24h', 'volume_quote_24h'), ('openInterest', 'open_interest'))
+# Минутные объем и оборот спотовых пар Bybit (каналы 0 и 1) для скользящих окон
+BYBIT_MINUTE_VOLUMES: Dict[str, MinuteRing] = {}
+
+# Локальный API чтения SPOT_STATE для run_cmc_signal.py
+LIVE_STATE_HOST = os.getenv("LIVE_STATE_HOST", "127.0.0.1")
+LIVE_STATE_PORT = int(os.getenv("LIVE_STATE_PORT", 8765))
+# Канал PostgreSQL, в который сообщается о каждом сохраненном снимке (слушает run_cmc_signal.py)
+COLLECTOR_NOTIFY_CHANNEL = os.getenv("COLLECTOR_NOTIFY_CHANNEL", "collector_data_saved")
+# Локальный буфер снимков, не принятых БД: каталог, лимит диска на таблицу и размер сегмента (МБ)
+COLLECTOR_SPILL_DIR = os.getenv("COLLECTOR_SPILL_DIR", "collector_spill")
+COLLECTOR_SPILL_MAX_MB = float(os.getenv("COLLECTOR_SPILL_MAX_MB", 512))
+COLLECTOR_SPILL_SEGMENT_MB = float(os.getenv("COLLECTOR_SPILL_SEGMENT_MB", 8))
+# Период цикла открытого интереса (сек) и частота поштучных запросов OI к одной бирже (запросов в секунду)
+OI_CYCLE_SECONDS = float(os.getenv("OI_CYCLE_SECONDS", 120))
+OI_REQUESTS_PER_SECOND = float(os.getenv("OI_REQUESTS_PER_SECOND", 10))
+# Допустимый возраст поля в снимке (сек), для поля переопределяется COLLECTOR_MAX_AGE_<ПОЛЕ>
+COLLECTOR_FIELD_MAX_AGE = float(os.getenv("COLLECTOR_FIELD_MAX_AGE", 300))
+# Что делать со строкой, у которой есть устаревшие поля: flag - писать с is_stale = true,
+# skip - не писать, refresh - писать с is_stale = true и дозапросить пару по REST
+STALE_POLICIES = ('flag', 'skip', 'refresh')
+COLLECTOR_STALE_POLICY = os.getenv("COLLECTOR_STALE_POLICY", "flag")
 
 QUOTE_ASSETS = ['USDT', 'USDC', 'USD', 'FDUSD', 'TUSD', 'BTC', 'ETH']
 USER_AGENTS = [
@@ -80,151 +464,302 @@ async def create_aiohttp_session() -> aiohttp.ClientSession:
     return aiohttp.ClientSession(connector=connector, json_serialize=orjson.dumps)
 
 
+class TokenBucket:
+    """
+    Ограничитель частоты запросов: токены пополняются со скоростью rate в
+    секунду, в запасе не больше capacity. При capacity=1 запросы, ожидающие
+    токен, идут с равным шагом 1/rate, а не уходят разом.
+    """
+
+    def __init__(self, rate: float, capacity: float = 1.0):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+
+    async def acquire(self) -> None:
+        """Ждет и забирает один токен."""
+        while True:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+            await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
 # --- 3. Воркеры для сбора данных ---
-async def spot_binance_worker(pairs_to_track: List[str]) -> None:
-    logger.info(f"[Spot Binance] Запуск WebSocket воркера для {len(pairs_to_track)} пар.")
+async def run_binance_chunks(tracked: TrackedPairs, handle_chunk: Callable, log_name: str,
+                             chunk_size: int = 100) -> None:
+    """
+    Держит по соединению Binance на каждый блок из chunk_size пар.
+
+    При изменении набора пар пересобираются только блоки, из которых пары
+    удалены или в которые добавлены (новые пары сначала занимают свободные
+    места). Новое соединение блока поднимается до закрытия старого, чтобы
+    поток данных не прерывался.
+
+    Args:
+        tracked: Отслеживаемые символы
+        handle_chunk: Корутина соединения блока (пары блока, событие подключения)
+        log_name: Имя воркера для логов
+        chunk_size: Число пар в блоке
+    """
+    chunks = [tracked.items[i:i + chunk_size] for i in range(0, len(tracked.items), chunk_size)]
+    tasks: List[Optional[asyncio.Task]] = [asyncio.create_task(handle_chunk(list(chunk), asyncio.Event()))
+                                           for chunk in chunks]
+
+    async def replace_chunk(old_task: Optional[asyncio.Task], connected: asyncio.Event) -> None:
+        if old_task is None:
+            return
+        try:
+            await asyncio.wait_for(connected.wait(), timeout=15)
+        except asyncio.TimeoutError:
+            logger.warning(f"[{log_name}] Новое соединение блока не подключилось за 15 сек, старое закрывается.")
+        old_task.cancel()
+
+    try:
+        version = tracked.version
+        while True:
+            await tracked.wait_changed(version)
+            version = tracked.version
+            wanted = set(tracked.items)
+            current = {symbol for chunk in chunks for symbol in chunk}
+            added = [symbol for symbol in tracked.items if symbol not in current]
+            affected = set()
+            for index, chunk in enumerate(chunks):
+                kept = [symbol for symbol in chunk if symbol in wanted]
+                if len(kept) != len(chunk):
+                    chunks[index] = kept
+                    affected.add(index)
+            for index, chunk in enumerate(chunks):
+                free = chunk_size - len(chunk)
+                if added and free > 0:
+                    chunk.extend(added[:free])
+                    added = added[free:]
+                    affected.add(index)
+            while added:
+                chunks.append(added[:chunk_size])
+                tasks.append(None)
+                added = added[chunk_size:]
+                affected.add(len(chunks) - 1)
+            replacements = []
+            for index in sorted(affected):
+                old_task = tasks[index]
+                if chunks[index]:
+                    connected = asyncio.Event()
+                    tasks[index] = asyncio.create_task(handle_chunk(list(chunks[index]), connected))
+                    replacements.append(replace_chunk(old_task, connected))
+                else:
+                    tasks[index] = None
+                    if old_task: old_task.cancel()
+            logger.info(f"[{log_name}] Набор пар изменен: пересобрано блоков {len(affected)} из {len(chunks)}.")
+            await asyncio.gather(*replacements)
+    finally:
+        for task in tasks:
+            if task: task.cancel()
+
+
+async def send_bybit_op(websocket: Any, op: str, topics: List[str]) -> None:
+    """Отправляет subscribe / unsubscribe по 10 тем в запросе."""
+    chunk_size = 10
+    for i in range(0, len(topics), chunk_size):
+        await websocket.send(orjson.dumps({"op": op, "args": topics[i:i + chunk_size]}))
+        await asyncio.sleep(0.1)
+
+
+async def sync_bybit_topics(websocket: Any, tracked: TrackedPairs, version: int, subscribed: List[str],
+                            topic_templates: Tuple[str, ...], log_name: str) -> None:
+    """
+    Досылает подписки и отписки открытого сокета Bybit при изменении набора пар.
+
+    Args:
+        websocket: Открытое соединение
+        tracked: Отслеживаемые символы
+        version: Версия набора, по которой сделаны subscribed
+        subscribed: Темы, на которые сокет уже подписан
+        topic_templates: Шаблоны тем пары, например ("tickers.{}",)
+        log_name: Имя воркера для логов
+    """
+    subscribed = set(subscribed)
+    while True:
+        await tracked.wait_changed(version)
+        version = tracked.version
+        wanted = {template.format(pair) for pair in tracked.items for template in topic_templates}
+        removed, added = sorted(subscribed - wanted), sorted(wanted - subscribed)
+        await send_bybit_op(websocket, "unsubscribe", removed)
+        await send_bybit_op(websocket, "subscribe", added)
+        subscribed = wanted
+        logger.info(f"[{log_name}] Подписки обновлены: +{len(added)} -{len(removed)} тем.")
+
+
+async def spot_binance_worker(tracked: TrackedPairs) -> None:
+    logger.info(f"[Spot Binance] Запуск WebSocket воркера для {len(tracked.items)} пар.")
     ssl_context = ssl.create_default_context(cafile=certifi.where())
+    slots = SPOT_STATE.slots.setdefault("BINANCE", {})
+    price_f, volume_24h_f, quote_volume_24h_f, volume_1h_f, quote_volume_1h_f = map(
+        SPOT_STATE.field, ('price', 'volume_24h', 'quote_volume_24h', 'volume_1h', 'quote_volume_1h'))
 
-    async def handle_spot_chunk(pairs_chunk: List[str]) -> None:
+    async def handle_spot_chunk(pairs_chunk: List[str], connected: asyncio.Event) -> None:
         streams = [f"{p.lower()}@ticker" for p in pairs_chunk] + [f"{p.lower()}@ticker_1h" for p in pairs_chunk]
         url = f"wss://stream.binance.com:9443/stream?streams={'/'.join(streams)}"
         while True:
             try:
                 async with websockets.connect(url, ssl=ssl_context) as websocket:
                     logger.info(f"[Spot Binance Chunk] Подключен к {len(pairs_chunk)} парам.")
+                    connected.set()
                     while True:
                         wrapper = orjson.loads(await websocket.recv());
                         stream_name = wrapper.get('stream');
                         data = wrapper.get('data')
                         if not data: continue
-                        symbol = data.get('s')
-                        if not symbol: continue
-                        market_key = f"BINANCE:{symbol}"
+                        slot = slots.get(data.get('s'))
+                        if slot is None: continue
+                        now = time.time()
                         if '@ticker_1h' in stream_name:
-                            SPOT_STATE.setdefault(market_key, {}).update(
-                                {'volume_1h': float(data.get('v', 0)), 'quote_volume_1h': float(data.get('q', 0))})
+                            SPOT_STATE.set(slot, volume_1h_f, float(data.get('v', 0)), now)
+                            SPOT_STATE.set(slot, quote_volume_1h_f, float(data.get('q', 0)), now)
                         elif '@ticker' in stream_name:
-                            SPOT_STATE.setdefault(market_key, {}).update(
-                                {'price': float(data.get('c', 0)), 'volume_24h': float(data.get('v', 0)),
-                                 'quote_volume_24h': float(data.get('q', 0))})
+                            SPOT_STATE.set(slot, price_f, float(data.get('c', 0)), now)
+                            SPOT_STATE.set(slot, volume_24h_f, float(data.get('v', 0)), now)
+                            SPOT_STATE.set(slot, quote_volume_24h_f, float(data.get('q', 0)), now)
             except Exception as e:
                 logger.error(f"[Spot Binance Chunk] Ошибка: {e}. Переподключение через 10 сек...");
                 await asyncio.sleep(10)
 
-    chunk_size = 100
-    tasks = [handle_spot_chunk(pairs_to_track[i:i + chunk_size]) for i in range(0, len(pairs_to_track), chunk_size)]
-    await asyncio.gather(*tasks)
+    await run_binance_chunks(tracked, handle_spot_chunk, "Spot Binance")
 
 
 # --- ИЗМЕНЕНИЕ: Полностью переработанный spot_bybit_worker ---
-async def spot_bybit_worker(pairs_to_track: List[str]) -> None:
+async def spot_bybit_worker(tracked: TrackedPairs) -> None:
     """Подключается к потокам tickers и kline для спота Bybit и рассчитывает часовой объем на лету."""
-    logger.info(f"[Spot Bybit] Запуск WebSocket воркера для {len(pairs_to_track)} пар (с расчетом 1ч объема).")
-    topics = [f"tickers.{pair}" for pair in pairs_to_track] + [f"kline.1.{pair}" for pair in pairs_to_track]
+    logger.info(f"[Spot Bybit] Запуск WebSocket воркера для {len(tracked.items)} пар (с расчетом 1ч объема).")
+    topic_templates = ("tickers.{}", "kline.1.{}")
     url = "wss://stream.bybit.com/v5/public/spot"
     ssl_context = ssl.create_default_context(cafile=certifi.where())
+    slots = SPOT_STATE.slots.setdefault("BYBIT", {})
+    price_f, volume_24h_f, quote_volume_24h_f, volume_1h_f, quote_volume_1h_f = map(
+        SPOT_STATE.field, ('price', 'volume_24h', 'quote_volume_24h', 'volume_1h', 'quote_volume_1h'))
     while True:
+        while not tracked.items:
+            await tracked.wait_changed(tracked.version)
         try:
             async with websockets.connect(url, ssl=ssl_context) as websocket:
-                chunk_size = 10
-                for i in range(0, len(topics), chunk_size):
-                    await websocket.send(orjson.dumps({"op": "subscribe", "args": topics[i:i + chunk_size]}))
-                    await asyncio.sleep(0.1)
+                version = tracked.version
+                topics = [template.format(pair) for template in topic_templates for pair in tracked.items]
+                await send_bybit_op(websocket, "subscribe", topics)
                 logger.info(f"[Spot Bybit] Отправлены запросы на подписку для {len(topics)} тем.")
-                while True:
-                    data = orjson.loads(await websocket.recv())
-                    if data.get('op') == 'ping': await websocket.send(orjson.dumps({"op": "pong"})); continue
-                    topic = data.get('topic', '')
-                    if topic.startswith('tickers.'):
-                        ticker_data = data['data'];
-                        symbol = ticker_data.get('symbol')
-                        if not symbol: continue
-                        market_key = f"BYBIT:{symbol}"
-                        SPOT_STATE.setdefault(market_key, {}).update({'price': float(ticker_data.get('lastPrice', 0)),
-                                                                      'volume_24h': float(
-                                                                          ticker_data.get('volume24h', 0)),
-                                                                      'quote_volume_24h': float(
-                                                                          ticker_data.get('turnover24h', 0))})
-                    elif topic.startswith('kline.'):
-                        kline_list = data.get('data', [])
-                        if not kline_list: continue
-                        kline_data = kline_list[0];
-                        symbol = topic.split('.')[-1]
-                        market_key = f"BYBIT:{symbol}"
-                        volume_history = BYBIT_KLINE_HISTORY.setdefault(symbol, [])
-                        volume_history.append(float(kline_data.get('volume', 0)))
-                        BYBIT_KLINE_HISTORY[symbol] = volume_history[-60:]
-                        volume_1h = sum(BYBIT_KLINE_HISTORY[symbol])
-                        price = SPOT_STATE.get(market_key, {}).get('price', 0)
-                        quote_volume_1h = volume_1h * price if price > 0 else 0
-                        SPOT_STATE.setdefault(market_key, {}).update(
-                            {'volume_1h': volume_1h, 'quote_volume_1h': quote_volume_1h})
+                sync_task = asyncio.create_task(
+                    sync_bybit_topics(websocket, tracked, version, topics, topic_templates, "Spot Bybit"))
+                try:
+                    while True:
+                        data = orjson.loads(await websocket.recv())
+                        if data.get('op') == 'ping': await websocket.send(orjson.dumps({"op": "pong"})); continue
+                        topic = data.get('topic', '')
+                        if topic.startswith('tickers.'):
+                            ticker_data = data['data'];
+                            slot = slots.get(ticker_data.get('symbol'))
+                            if slot is None: continue
+                            now = time.time()
+                            SPOT_STATE.set(slot, price_f, float(ticker_data.get('lastPrice', 0)), now)
+                            SPOT_STATE.set(slot, volume_24h_f, float(ticker_data.get('volume24h', 0)), now)
+                            SPOT_STATE.set(slot, quote_volume_24h_f, float(ticker_data.get('turnover24h', 0)), now)
+                        elif topic.startswith('kline.'):
+                            kline_list = data.get('data', [])
+                            if not kline_list: continue
+                            symbol = topic.split('.')[-1]
+                            slot = slots.get(symbol)
+                            if slot is None: continue
+                            ring = BYBIT_MINUTE_VOLUMES.get(symbol)
+                            if ring is None:
+                                ring = BYBIT_MINUTE_VOLUMES[symbol] = MinuteRing(channels=2)
+                            # Обновления открытой свечи заменяют ее объем, а не добавляются к часу
+                            for kline_data in kline_list:
+                                ring.update(int(kline_data['start']), float(kline_data.get('volume', 0)),
+                                            float(kline_data.get('turnover', 0)))
+                            now = time.time()
+                            SPOT_STATE.set(slot, volume_1h_f, ring.window_sum(60, 0), now)
+                            SPOT_STATE.set(slot, quote_volume_1h_f, ring.window_sum(60, 1), now)
+                finally:
+                    sync_task.cancel()
         except Exception as e:
             logger.error(f"[Spot Bybit] Ошибка: {e}. Переподключение через 10 сек...");
             await asyncio.sleep(10)
 
 
-async def binance_worker(pairs_to_track: List[str]) -> None:
-    logger.info(f"[Futures Binance] Запуск WebSocket воркера для {len(pairs_to_track)} пар.")
+async def binance_worker(tracked: TrackedPairs) -> None:
+    logger.info(f"[Futures Binance] Запуск WebSocket воркера для {len(tracked.items)} пар.")
     ssl_context = ssl.create_default_context(cafile=certifi.where())
+    slots = MARKET_STATE.slots.setdefault("BINANCE", {})
+    mark_price_f, index_price_f, funding_rate_f, volume_base_24h_f, volume_quote_24h_f = map(
+        MARKET_STATE.field, ('mark_price', 'index_price', 'funding_rate', 'volume_base_24h', 'volume_quote_24h'))
 
-    async def handle_binance_chunk(pairs_chunk: List[str]) -> None:
+    async def handle_binance_chunk(pairs_chunk: List[str], connected: asyncio.Event) -> None:
         streams = [f"{p.lower()}@ticker" for p in pairs_chunk] + [f"{p.lower()}@markPrice@1s" for p in pairs_chunk]
         url = f"wss://fstream.binance.com/stream?streams={'/'.join(streams)}"
         while True:
             try:
                 async with websockets.connect(url, ssl=ssl_context) as websocket:
                     logger.info(f"[Futures Binance Chunk] Подключен к {len(pairs_chunk)} парам.")
+                    connected.set()
                     while True:
                         wrapper = orjson.loads(await websocket.recv());
                         data = wrapper['data'];
-                        symbol = data['s']
+                        slot = slots.get(data['s'])
+                        if slot is None: continue
+                        now = time.time()
                         if data['e'] == '24hrTicker':
-                            MARKET_STATE.setdefault(f"BINANCE:{symbol}", {}).update(
-                                {'volume_base_24h': float(data.get('v', 0)),
-                                 'volume_quote_24h': float(data.get('q', 0))})
+                            MARKET_STATE.set(slot, volume_base_24h_f, float(data.get('v', 0)), now)
+                            MARKET_STATE.set(slot, volume_quote_24h_f, float(data.get('q', 0)), now)
                         elif data['e'] == 'markPriceUpdate':
-                            MARKET_STATE.setdefault(f"BINANCE:{symbol}", {}).update(
-                                {'mark_price': float(data.get('p', 0)), 'index_price': float(data.get('i', 0)),
-                                 'funding_rate': float(data.get('r', 0))})
+                            MARKET_STATE.set(slot, mark_price_f, float(data.get('p', 0)), now)
+                            MARKET_STATE.set(slot, index_price_f, float(data.get('i', 0)), now)
+                            MARKET_STATE.set(slot, funding_rate_f, float(data.get('r', 0)), now)
             except Exception as e:
                 logger.error(f"[Futures Binance Chunk] Ошибка: {e}. Переподключение через 10 сек...");
                 await asyncio.sleep(10)
 
-    chunk_size = 100
-    tasks = [handle_binance_chunk(pairs_to_track[i:i + chunk_size]) for i in range(0, len(pairs_to_track), chunk_size)]
-    await asyncio.gather(*tasks)
+    await run_binance_chunks(tracked, handle_binance_chunk, "Futures Binance")
 
 
-async def bybit_worker(pairs_to_track: List[str]) -> None:
-    logger.info(f"[Futures Bybit] Запуск WebSocket воркера для {len(pairs_to_track)} пар.")
-    topics = [f"tickers.{pair}" for pair in pairs_to_track];
+async def bybit_worker(tracked: TrackedPairs) -> None:
+    logger.info(f"[Futures Bybit] Запуск WebSocket воркера для {len(tracked.items)} пар.")
+    topic_templates = ("tickers.{}",)
     url = "wss://stream.bybit.com/v5/public/linear";
     ssl_context = ssl.create_default_context(cafile=certifi.where())
+    slots = MARKET_STATE.slots.setdefault("BYBIT", {})
+    # Поля дельта-сообщения tickers -> индексы полей состояния
+    ticker_fields = [(source, MARKET_STATE.field(name)) for source, name in BYBIT_LINEAR_TICKER_FIELDS]
     while True:
+        while not tracked.items:
+            await tracked.wait_changed(tracked.version)
         try:
             async with websockets.connect(url, ssl=ssl_context) as websocket:
-                chunk_size = 10
-                for i in range(0, len(topics), chunk_size):
-                    await websocket.send(orjson.dumps({"op": "subscribe", "args": topics[i:i + chunk_size]}));
-                    await asyncio.sleep(0.1)
+                version = tracked.version
+                topics = [template.format(pair) for template in topic_templates for pair in tracked.items]
+                await send_bybit_op(websocket, "subscribe", topics)
                 logger.info(f"[Futures Bybit] Отправлены запросы на подписку для {len(topics)} тем.")
-                while True:
-                    data = orjson.loads(await websocket.recv())
-                    if data.get('op') == 'ping':
-                        await websocket.send(orjson.dumps({"op": "pong"}))
-                    elif 'topic' in data and data['topic'].startswith('tickers'):
-                        ticker_data = data['data'];
-                        update_payload = {}
-                        if 'markPrice' in ticker_data: update_payload['mark_price'] = float(ticker_data['markPrice'])
-                        if 'indexPrice' in ticker_data: update_payload['index_price'] = float(ticker_data['indexPrice'])
-                        if 'fundingRate' in ticker_data: update_payload['funding_rate'] = float(
-                            ticker_data['fundingRate'])
-                        if 'volume24h' in ticker_data: update_payload['volume_base_24h'] = float(
-                            ticker_data['volume24h'])
-                        if 'turnover24h' in ticker_data: update_payload['volume_quote_24h'] = float(
-                            ticker_data['turnover24h'])
-                        MARKET_STATE.setdefault(f"BYBIT:{ticker_data['symbol']}", {}).update(update_payload)
+                sync_task = asyncio.create_task(
+                    sync_bybit_topics(websocket, tracked, version, topics, topic_templates, "Futures Bybit"))
+                try:
+                    while True:
+                        data = orjson.loads(await websocket.recv())
+                        if data.get('op') == 'ping':
+                            await websocket.send(orjson.dumps({"op": "pong"}))
+                        elif 'topic' in data and data['topic'].startswith('tickers'):
+                            ticker_data = data['data'];
+                            slot = slots.get(ticker_data['symbol'])
+                            if slot is None: continue
+                            now = time.time()
+                            # Дельта несет только изменившиеся поля: остальные подтверждены этим же сообщением
+                            for source, field in ticker_fields:
+                                if source in ticker_data:
+                                    MARKET_STATE.set(slot, field, float(ticker_data[source]), now)
+                                else:
+                                    MARKET_STATE.touch(slot, field, now)
+                finally:
+                    sync_task.cancel()
         except Exception as e:
             logger.error(f"[Futures Bybit] Ошибка: {e}. Переподключение через 10 сек...");
             await asyncio.sleep(10)
@@ -238,7 +773,8 @@ async def parse_binance_oi(session: aiohttp.ClientSession, symbol: str) -> Tuple
             if response.status == 200:
                 data = await response.json(loads=orjson.loads);
                 oi_value = float(data.get('openInterest', 0))
-                MARKET_STATE.setdefault(f"BINANCE:{symbol}", {})['open_interest'] = oi_value;
+                MARKET_STATE.set(MARKET_STATE.slot("BINANCE", symbol), MARKET_STATE.field('open_interest'), oi_value,
+                                 time.time())
                 return symbol, True, None
             else:
                 logger.warning(f"[OI - Binance] HTTP {response.status} для {symbol}");
@@ -251,152 +787,966 @@ async def parse_binance_oi(session: aiohttp.ClientSession, symbol: str) -> Tuple
 async def parse_bybit_oi(session: aiohttp.ClientSession, symbol: str) -> Tuple[str, bool, None]:
     headers = {'User-Agent': get_random_user_agent()}
     try:
-        url = f"https://api.bybit.com/v5/market/open-interest?category=linear&symbol={symbol}"
+        url = f"https://api.bybit.com/v5/market/open-interest?category=linear&symbol={symbol}&intervalTime=5min&limit=1"
         async with session.get(url, timeout=10, headers=headers) as response:
             if response.status == 200:
                 data = await response.json(loads=orjson.loads)
                 if data.get('retCode') == 0 and data.get('result', {}).get('list'):
-                    oi_list = data['result']['list']
-                    if oi_list:
-                        oi_value = float(oi_list[0].get('openInterest', 0))
-                        if oi_value > 0:
-                            MARKET_STATE.setdefault(f"BYBIT:{symbol}", {})['open_interest'] = oi_value
-                            return symbol, True, None
-        logger.debug(f"[OI - Bybit] Для {symbol} нет данных на /open-interest, пробую /tickers.")
-        tickers_url = f"https://api.bybit.com/v5/market/tickers?category=linear&symbol={symbol}"
-        async with session.get(tickers_url, timeout=10, headers=headers) as response:
-            if response.status == 200:
-                data = await response.json(loads=orjson.loads)
-                if data.get('retCode') == 0 and data.get('result', {}).get('list'):
-                    ticker_data = data['result']['list'][0]
-                    oi_value = float(ticker_data.get('openInterestValue', 0))
+                    oi_value = float(data['result']['list'][0].get('openInterest', 0))
                     if oi_value > 0:
-                        MARKET_STATE.setdefault(f"BYBIT:{symbol}", {})['open_interest'] = oi_value
+                        MARKET_STATE.set(MARKET_STATE.slot("BYBIT", symbol), MARKET_STATE.field('open_interest'),
+                                         oi_value, time.time())
                         return symbol, True, None
-        logger.warning(f"[OI - Bybit] Не удалось получить OI для {symbol} всеми способами.");
+        logger.warning(f"[OI - Bybit] Не удалось получить OI для {symbol}.");
         return symbol, False, None
     except Exception as e:
         logger.error(f"[OI - Bybit] Критическая ошибка для {symbol}: {e}");
         return symbol, False, None
 
 
-async def oi_collector(exchange_name: str, pairs: List[str], oi_parser: Callable) -> None:
-    logger.info(f"[OI Collector - {exchange_name}] Запущен для {len(pairs)} пар.");
+async def fetch_bybit_oi_bulk(session: aiohttp.ClientSession) -> int:
+    """
+    Обновляет OI всех отслеживаемых пар Bybit одним запросом /v5/market/tickers.
+
+    Берется openInterest (в базовом активе, как у /open-interest и Binance),
+    а не openInterestValue в долларах.
+
+    Returns:
+        Число обновленных пар
+    """
+    url = "https://api.bybit.com/v5/market/tickers?category=linear"
+    try:
+        async with session.get(url, timeout=15, headers={'User-Agent': get_random_user_agent()}) as response:
+            if response.status != 200:
+                logger.warning(f"[OI - Bybit] HTTP {response.status} для пакетного запроса тикеров.");
+                return 0
+            data = await response.json(loads=orjson.loads)
+    except Exception as e:
+        logger.error(f"[OI - Bybit] Ошибка пакетного запроса тикеров: {e}");
+        return 0
+    if data.get('retCode') != 0:
+        logger.warning(f"[OI - Bybit] Пакетный запрос тикеров: retCode {data.get('retCode')}.");
+        return 0
+    slots = MARKET_STATE.slots["BYBIT"]
+    oi_field = MARKET_STATE.field('open_interest')
+    now = time.time()
+    updated = 0
+    for ticker in data.get('result', {}).get('list', []):
+        slot = slots.get(ticker.get('symbol'))
+        if slot is None: continue
+        oi_value = float(ticker.get('openInterest') or 0)
+        if oi_value > 0:
+            MARKET_STATE.set(slot, oi_field, oi_value, now)
+            updated += 1
+    return updated
+
+
+async def oi_collector(exchange_name: str, tracked: TrackedPairs, oi_parser: Callable,
+                       bulk_fetcher: Optional[Callable] = None) -> None:
+    """
+    Собирает открытый интерес пар биржи раз в OI_CYCLE_SECONDS.
+
+    Сначала используются пакетный запрос биржи (bulk_fetcher) и потоки
+    WebSocket, которые пишут OI в MARKET_STATE сами. Поштучно опрашиваются
+    только пары, OI которых не обновлялся дольше полуцикла; запросы идут через
+    TokenBucket с частотой OI_REQUESTS_PER_SECOND.
+
+    Args:
+        exchange_name: Имя биржи ("Binance" / "Bybit")
+        tracked: Символы фьючерсных пар (набор перечитывается каждый цикл)
+        oi_parser: Поштучный запрос OI пары
+        bulk_fetcher: Пакетный запрос OI всех пар биржи или None
+    """
+    logger.info(f"[OI Collector - {exchange_name}] Запущен для {len(tracked.items)} пар.");
     session = await create_aiohttp_session()
+    bucket = TokenBucket(OI_REQUESTS_PER_SECOND)
+    oi_field = MARKET_STATE.field('open_interest')
     try:
         while True:
             start_time = datetime.now(timezone.utc);
-            tasks = [oi_parser(session, symbol) for symbol in pairs];
+            pairs = list(tracked.items)
+            slots = np.array([MARKET_STATE.slot(exchange_name.upper(), symbol) for symbol in pairs], dtype=np.intp)
+            bulk_count = await bulk_fetcher(session) if bulk_fetcher else 0
+            _, updated_at = MARKET_STATE.columns(slots)
+            # Поштучно опрошенная в прошлом цикле пара успевает устареть; пакет и потоки - нет
+            stale = updated_at[oi_field] < start_time.timestamp() - OI_CYCLE_SECONDS / 2
+            leftovers = [pairs[index] for index in np.flatnonzero(stale).tolist()]
+            tasks = []
+            for symbol in leftovers:
+                await bucket.acquire()
+                tasks.append(asyncio.create_task(oi_parser(session, symbol)))
             results = await asyncio.gather(*tasks, return_exceptions=True)
             success_count = sum(1 for r in results if isinstance(r, tuple) and r[1]);
             end_time = datetime.now(timezone.utc);
             duration = (end_time - start_time).total_seconds()
             logger.info(
-                f"[{end_time.strftime('%H:%M:%S')}] OI Collector - {exchange_name}: Цикл завершен за {duration:.1f} сек. Успешно: {success_count}/{len(pairs)}")
-            next_cycle_delay = max(120 - duration, 5)
+                f"[{end_time.strftime('%H:%M:%S')}] OI Collector - {exchange_name}: Цикл завершен за {duration:.1f} сек. "
+                f"Пакетно: {bulk_count}, поштучно успешно: {success_count}/{len(leftovers)}, "
+                f"из потоков и пакета: {len(pairs) - len(leftovers)}/{len(pairs)}")
+            next_cycle_delay = max(OI_CYCLE_SECONDS - duration, 5)
             await asyncio.sleep(next_cycle_delay)
     finally:
         await session.close();
         logger.info(f"[OI Collector - {exchange_name}] Сессия закрыта.")
 
 
-# --- 4. Сохранение данных в БД ---
-async def spot_db_saver(db_pool: asyncpg.Pool, spot_pairs_from_db: Dict[int, Dict]) -> None:
-    logger.info("[Spot DB Saver] Запущен.")
-    # --- ИЗМЕНЕНИЕ: Требования для Bybit теперь такие же, как для Binance ---
-    required_keys = ['price', 'volume_1h', 'quote_volume_1h', 'volume_24h', 'quote_volume_24h']
-    exchange_map = {1: "BINANCE", 2: "BYBIT"}
+async def fetch_json(session: aiohttp.ClientSession, url: str, params: Optional[Dict[str, str]] = None) -> Any:
+    """GET-запрос REST API; при ошибке или статусе не 200 возвращает None."""
+    try:
+        async with session.get(url, params=params, timeout=10,
+                               headers={'User-Agent': get_random_user_agent()}) as response:
+            if response.status != 200:
+                logger.warning(f"[Refresh] HTTP {response.status} для {url} {params or ''}");
+                return None
+            return await response.json(loads=orjson.loads)
+    except Exception as e:
+        logger.error(f"[Refresh] Ошибка запроса {url} {params or ''}: {e}");
+        return None
+
+
+def bybit_result_list(data: Any) -> List[Any]:
+    """Возвращает result.list ответа Bybit или пустой список при ошибке."""
+    if not data or data.get('retCode') != 0:
+        return []
+    return data.get('result', {}).get('list') or []
+
+
+async def refresh_per_symbol(symbols: List[str], refresh_symbol: Callable) -> int:
+    """Дозапрашивает пары по одной через TokenBucket; возвращает число успешно обновленных."""
+    bucket = TokenBucket(OI_REQUESTS_PER_SECOND)
+    tasks = []
+    for symbol in symbols:
+        await bucket.acquire()
+        tasks.append(asyncio.create_task(refresh_symbol(symbol)))
+    return sum(1 for ok in await asyncio.gather(*tasks, return_exceptions=True) if ok is True)
+
+
+async def refresh_spot_binance(session: aiohttp.ClientSession, symbols: List[str]) -> int:
+    """Обновляет все спотовые поля пар Binance пакетами по 100 символов (24ч и скользящий 1ч тикеры)."""
+    slots = SPOT_STATE.slots.get("BINANCE", {})
+    price_f, volume_24h_f, quote_volume_24h_f, volume_1h_f, quote_volume_1h_f = map(
+        SPOT_STATE.field, ('price', 'volume_24h', 'quote_volume_24h', 'volume_1h', 'quote_volume_1h'))
+    day_refreshed, hour_refreshed = set(), set()
+    for i in range(0, len(symbols), 100):
+        params = {'symbols': orjson.dumps(symbols[i:i + 100]).decode()}
+        day = await fetch_json(session, "https://api.binance.com/api/v3/ticker/24hr", params)
+        hour = await fetch_json(session, "https://api.binance.com/api/v3/ticker", dict(params, windowSize='1h'))
+        now = time.time()
+        for ticker in day or []:
+            slot = slots.get(ticker.get('symbol'))
+            if slot is None: continue
+            SPOT_STATE.set(slot, price_f, float(ticker['lastPrice']), now)
+            SPOT_STATE.set(slot, volume_24h_f, float(ticker['volume']), now)
+            SPOT_STATE.set(slot, quote_volume_24h_f, float(ticker['quoteVolume']), now)
+            day_refreshed.add(ticker['symbol'])
+        for ticker in hour or []:
+            slot = slots.get(ticker.get('symbol'))
+            if slot is None: continue
+            SPOT_STATE.set(slot, volume_1h_f, float(ticker['volume']), now)
+            SPOT_STATE.set(slot, quote_volume_1h_f, float(ticker['quoteVolume']), now)
+            hour_refreshed.add(ticker['symbol'])
+    return len(day_refreshed & hour_refreshed)
+
+
+async def refresh_spot_bybit(session: aiohttp.ClientSession, symbols: List[str]) -> int:
+    """Обновляет спотовые поля пар Bybit: тикер и 1ч объем как сумма 60 минутных свечей (как в воркере)."""
+    slots = SPOT_STATE.slots.get("BYBIT", {})
+    price_f, volume_24h_f, quote_volume_24h_f, volume_1h_f, quote_volume_1h_f = map(
+        SPOT_STATE.field, ('price', 'volume_24h', 'quote_volume_24h', 'volume_1h', 'quote_volume_1h'))
+
+    async def refresh_symbol(symbol: str) -> bool:
+        slot = slots.get(symbol)
+        tickers = bybit_result_list(await fetch_json(session, "https://api.bybit.com/v5/market/tickers",
+                                                     {'category': 'spot', 'symbol': symbol}))
+        klines = bybit_result_list(await fetch_json(session, "https://api.bybit.com/v5/market/kline",
+                                                    {'category': 'spot', 'symbol': symbol, 'interval': '1',
+                                                     'limit': '60'}))
+        if slot is None or not tickers or not klines:
+            return False
+        now = time.time()
+        SPOT_STATE.set(slot, price_f, float(tickers[0]['lastPrice']), now)
+        SPOT_STATE.set(slot, volume_24h_f, float(tickers[0]['volume24h']), now)
+        SPOT_STATE.set(slot, quote_volume_24h_f, float(tickers[0]['turnover24h']), now)
+        # Свеча: [start, open, high, low, close, volume, turnover]
+        SPOT_STATE.set(slot, volume_1h_f, sum(float(kline[5]) for kline in klines), now)
+        SPOT_STATE.set(slot, quote_volume_1h_f, sum(float(kline[6]) for kline in klines), now)
+        return True
+
+    return await refresh_per_symbol(symbols, refresh_symbol)
+
+
+async def refresh_futures_binance(session: aiohttp.ClientSession, symbols: List[str]) -> int:
+    """Обновляет фьючерсные поля пар Binance: premiumIndex, 24ч тикер и открытый интерес."""
+    slots = MARKET_STATE.slots.get("BINANCE", {})
+    mark_price_f, index_price_f, funding_rate_f, volume_base_24h_f, volume_quote_24h_f = map(
+        MARKET_STATE.field, ('mark_price', 'index_price', 'funding_rate', 'volume_base_24h', 'volume_quote_24h'))
+
+    async def refresh_symbol(symbol: str) -> bool:
+        slot = slots.get(symbol)
+        premium = await fetch_json(session, "https://fapi.binance.com/fapi/v1/premiumIndex", {'symbol': symbol})
+        ticker = await fetch_json(session, "https://fapi.binance.com/fapi/v1/ticker/24hr", {'symbol': symbol})
+        if slot is None or not premium or not ticker:
+            return False
+        now = time.time()
+        MARKET_STATE.set(slot, mark_price_f, float(premium['markPrice']), now)
+        MARKET_STATE.set(slot, index_price_f, float(premium['indexPrice']), now)
+        MARKET_STATE.set(slot, funding_rate_f, float(premium['lastFundingRate']), now)
+        MARKET_STATE.set(slot, volume_base_24h_f, float(ticker['volume']), now)
+        MARKET_STATE.set(slot, volume_quote_24h_f, float(ticker['quoteVolume']), now)
+        _, oi_ok, _ = await parse_binance_oi(session, symbol)
+        return oi_ok
+
+    return await refresh_per_symbol(symbols, refresh_symbol)
+
+
+async def refresh_futures_bybit(session: aiohttp.ClientSession, symbols: List[str]) -> int:
+    """Обновляет все фьючерсные поля пар Bybit из REST тикера линейного контракта."""
+    slots = MARKET_STATE.slots.get("BYBIT", {})
+    ticker_fields = [(source, MARKET_STATE.field(name)) for source, name in BYBIT_LINEAR_TICKER_FIELDS]
+
+    async def refresh_symbol(symbol: str) -> bool:
+        slot = slots.get(symbol)
+        tickers = bybit_result_list(await fetch_json(session, "https://api.bybit.com/v5/market/tickers",
+                                                     {'category': 'linear', 'symbol': symbol}))
+        if slot is None or not tickers:
+            return False
+        now = time.time()
+        for source, field in ticker_fields:
+            MARKET_STATE.set(slot, field, float(tickers[0][source]), now)
+        return True
+
+    return await refresh_per_symbol(symbols, refresh_symbol)
+
+
+# Дозапрос устаревших пар по REST: (таблица, биржа) -> функция (session, символы) -> число обновленных
+REST_REFRESHERS: Dict[Tuple[str, str], Callable] = {
+    ('spot_data', 'BINANCE'): refresh_spot_binance,
+    ('spot_data', 'BYBIT'): refresh_spot_bybit,
+    ('market_data', 'BINANCE'): refresh_futures_binance,
+    ('market_data', 'BYBIT'): refresh_futures_bybit,
+}
+
+
+class StaleRefresher:
+    """Фоновые REST-дозапросы устаревших пар: не больше одного одновременного на таблицу и биржу."""
+
+    def __init__(self):
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._running: Dict[Tuple[str, str], asyncio.Task] = {}
+
+    def request(self, table: str, exchange: str, symbols: List[str]) -> None:
+        """Запускает дозапрос пар, если для этой таблицы и биржи он еще не идет."""
+        key = (table, exchange)
+        refresher = REST_REFRESHERS.get(key)
+        running = self._running.get(key)
+        if refresher is None or (running is not None and not running.done()):
+            return
+        self._running[key] = asyncio.create_task(self._refresh(key, refresher, symbols))
+
+    async def _refresh(self, key: Tuple[str, str], refresher: Callable, symbols: List[str]) -> None:
+        if self._session is None:
+            self._session = await create_aiohttp_session()
+        started = time.monotonic()
+        refreshed = await refresher(self._session, symbols)
+        logger.info(f"[Refresh {key[0]} {key[1]}] По REST обновлено {refreshed}/{len(symbols)} устаревших пар "
+                    f"за {time.monotonic() - started:.1f} сек.")
+
+
+STALE_REFRESHER = StaleRefresher()
+
+
+# Воркеры WebSocket по группам потоков; в режиме process каждая группа разбирается своим процессом
+INGEST_WORKERS: Dict[str, Callable] = {
+    'spot_binance': spot_binance_worker,
+    'spot_bybit': spot_bybit_worker,
+    'futures_binance': binance_worker,
+    'futures_bybit': bybit_worker,
+}
+
+
+def ingest_process_main(worker_name: str, pairs: List[str], spot_handles: Optional[Tuple],
+                        market_handles: Optional[Tuple], updates: Any) -> None:
+    """
+    Точка входа процесса разбора: воркер группы пишет обновления прямо в разделяемые столбцы.
+
+    Новые наборы пар приходят из основного процесса через updates вместе с
+    ключами слотов и применяются как в режиме inline - досылкой подписок,
+    без перезапуска процесса и потери накопленных минутных объемов.
+    """
+    for state, handles in ((SPOT_STATE, spot_handles), (MARKET_STATE, market_handles)):
+        if handles:
+            state.attach(*handles)
+    tracked = TrackedPairs(pairs)
+
+    async def receive_updates() -> None:
+        while True:
+            try:
+                items, spot_keys, market_keys = await asyncio.to_thread(updates.recv)
+            except EOFError:
+                return
+            for state, keys in ((SPOT_STATE, spot_keys), (MARKET_STATE, market_keys)):
+                if keys is not None:
+                    state.sync_keys(keys)
+            tracked.update(items)
+
+    async def run() -> None:
+        receiver = asyncio.create_task(receive_updates())
+        try:
+            await INGEST_WORKERS[worker_name](tracked)
+        finally:
+            receiver.cancel()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+
+
+async def ingest_process_supervisor(context: multiprocessing.context.BaseContext, worker_name: str,
+                                    tracked: TrackedPairs) -> None:
+    """
+    Запускает процесс разбора группы потоков и перезапускает его при падении.
+
+    При изменении набора пар новый набор и ключи слотов передаются работающему
+    процессу, который досылает подписки сам, как воркер в режиме inline.
+    """
+    def start_process() -> Tuple[multiprocessing.process.BaseProcess, Any]:
+        receiver, sender = context.Pipe(duplex=False)
+        process = context.Process(target=ingest_process_main, name=f"ingest-{worker_name}", daemon=True,
+                                  args=(worker_name, tracked.items, SPOT_STATE.shared_handles(),
+                                        MARKET_STATE.shared_handles(), receiver))
+        process.start()
+        receiver.close()
+        logger.info(f"[Ingest] Процесс {worker_name} запущен (pid {process.pid}) для {len(tracked.items)} пар.")
+        return process, sender
 
     while True:
-        now = datetime.now(timezone.utc);
-        next_minute = (now.replace(second=0, microsecond=0) + timedelta(minutes=1));
-        sleep_seconds = (next_minute - now).total_seconds()
-        if sleep_seconds > 0: await asyncio.sleep(sleep_seconds)
-        capture_time = next_minute
-        logger.info(f"[{capture_time.strftime('%H:%M:%S')}] Spot DB Saver: Начало сессии сбора данных.")
-        records_to_save_this_minute = {};
-        pairs_needing_data = set(spot_pairs_from_db.keys())
-        for _ in range(58):
-            if not pairs_needing_data: logger.info("[Spot DB Saver] Все спотовые данные собраны досрочно."); break
-            for pair_id in list(pairs_needing_data):
-                pair_info = spot_pairs_from_db[pair_id]
-                exchange_name = exchange_map.get(pair_info['exchange_id'])
-                market_key = f"{exchange_name}:{pair_info['pair_symbol']}"
-                state = SPOT_STATE.get(market_key)
-                if state and all(key in state for key in required_keys):
-                    records_to_save_this_minute[pair_id] = state.copy();
-                    pairs_needing_data.remove(pair_id)
-            await asyncio.sleep(1)
-        if not records_to_save_this_minute: logger.warning(
-            "[Spot DB Saver] Нет полностью собранных спотовых данных для сохранения."); continue
-        records_for_executemany = []
-        for pair_id, state in records_to_save_this_minute.items():
-            pair_info = spot_pairs_from_db[pair_id];
-            pair_symbol = pair_info['pair_symbol'];
-            base_asset, quote_asset = parse_symbol(pair_symbol)
-            records_for_executemany.append(
-                (pair_id, capture_time, pair_symbol, base_asset, quote_asset, state['price'], state['volume_1h'],
-                 state['quote_volume_1h'], state['volume_24h'], state['quote_volume_24h']))
+        while not tracked.items:
+            await tracked.wait_changed(tracked.version)
+        version = tracked.version
+        process, sender = start_process()
         try:
-            async with db_pool.acquire() as conn:
-                await conn.executemany("""
-                                       INSERT INTO spot_data (trading_pair_id, capture_time, pair_symbol, base_asset,
-                                                              quote_asset, price, volume_1h, quote_volume_1h,
-                                                              volume_24h, quote_volume_24h)
-                                       VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9,
-                                               $10) ON CONFLICT (trading_pair_id, capture_time) DO NOTHING;
-                                       """, records_for_executemany)
-            logger.info(f"[Spot DB Saver] УСПЕШНО СОХРАНЕНО {len(records_for_executemany)} записей в 'spot_data'.")
-        except Exception as e:
-            logger.error(f"[Spot DB Saver] DB_ERROR: {e}")
+            while process.is_alive():
+                if tracked.version != version:
+                    version = tracked.version
+                    # Слоты новым парам уже назначены (apply_pair_groups), ключи передаются вместе с набором
+                    sender.send((tracked.items, SPOT_STATE.keys if SPOT_STATE.is_shared else None,
+                                 MARKET_STATE.keys if MARKET_STATE.is_shared else None))
+                await asyncio.sleep(1)
+        except (BrokenPipeError, EOFError):
+            pass
+        finally:
+            sender.close()
+            if process.is_alive():
+                process.terminate()
+        logger.error(f"[Ingest] Процесс {worker_name} завершился с кодом {process.exitcode}. Перезапуск через 10 сек...")
+        await asyncio.sleep(10)
+
+
+# --- 4. Локальный API состояния ---
+async def handle_spot_state(request: web.Request) -> web.Response:
+    """
+    Отдает текущее спотовое состояние: GET /spot?keys=BINANCE:BTCUSDT,BYBIT:ETHUSDT.
+    Без keys возвращаются все пары. updated_at - время самого старого из потоков (ticker / 1h).
+    """
+    keys = request.query.get('keys')
+    if keys:
+        slots = [slot for slot in map(SPOT_STATE.slot_by_key, keys.split(',')) if slot is not None]
+    else:
+        slots = range(len(SPOT_STATE.keys))
+    slots = np.fromiter(slots, dtype=np.intp)
+    values, updated_at = SPOT_STATE.columns(slots)
+    complete = SPOT_STATE.ready_mask(slots)
+    snapshot = {}
+    for slot, row, updated in zip(slots[complete].tolist(), values[:, complete].T.tolist(),
+                                  updated_at[:, complete].min(axis=0).tolist()):
+        entry = dict(zip(SPOT_SNAPSHOT_FIELDS, row))
+        entry['updated_at'] = updated
+        snapshot[SPOT_STATE.keys[slot]] = entry
+    return web.Response(body=orjson.dumps({'now': time.time(), 'spot': snapshot}), content_type='application/json')
+
+
+async def handle_spill_state(request: web.Request) -> web.Response:
+    """Отдает состояние буферов несохраненных снимков: GET /spill."""
+    return web.Response(body=orjson.dumps({table: spill.stats() for table, spill in SPILL_BUFFERS.items()}),
+                        content_type='application/json')
+
+
+async def handle_freshness_state(request: web.Request) -> web.Response:
+    """Отдает счетчики строк с устаревшими полями по таблицам и биржам: GET /freshness."""
+    return web.Response(body=orjson.dumps({table: counter.stats() for table, counter in STALE_ROW_COUNTERS.items()}),
+                        content_type='application/json')
+
+
+async def live_state_server(host: str, port: int) -> None:
+    """Запускает HTTP API чтения состояния сборщика."""
+    app = web.Application()
+    app.router.add_get('/spot', handle_spot_state)
+    app.router.add_get('/spill', handle_spill_state)
+    app.router.add_get('/freshness', handle_freshness_state)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    try:
+        await web.TCPSite(runner, host, port).start()
+        logger.info(f"[Live State API] Слушает http://{host}:{port}/spot")
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
+
+
+# --- 5. Сохранение данных в БД ---
+async def wait_for_capture_time(interval: int, last_capture: Optional[datetime], saver_name: str) -> datetime:
+    """
+    Ждет следующего момента снимка, кратного периоду от начала эпохи.
+
+    Если сохранение предыдущего снимка заняло больше периода, пропущенные
+    моменты не догоняются, а только логируются.
+
+    Args:
+        interval: Период снимков в секундах
+        last_capture: Время предыдущего снимка или None
+        saver_name: Имя сохранения для логов
+
+    Returns:
+        Время снимка (UTC)
+    """
+    now = time.time()
+    boundary = (int(now // interval) + 1) * interval
+    await asyncio.sleep(boundary - now)
+    capture_time = datetime.fromtimestamp(boundary, timezone.utc)
+    if last_capture is not None:
+        skipped = int((capture_time - last_capture).total_seconds()) // interval - 1
+        if skipped > 0:
+            logger.warning(f"[{saver_name}] Пропущено снимков: {skipped} (сохранение дольше периода {interval} сек).")
+    return capture_time
+
+
+def snapshot_log(capture_time: datetime) -> Callable[..., None]:
+    """Уровень логов снимка: подробно только снимки на границе минуты, остальные - в debug."""
+    return logger.info if capture_time.second == 0 else logger.debug
+
+
+class SnapshotWriter:
+    """
+    Пакетная запись снимков в таблицу данных.
+
+    Строки снимка передаются бинарным COPY во временную таблицу-буфер
+    pg_temp.<table>_staging и переносятся в основную таблицу одним
+    INSERT ... SELECT ... ON CONFLICT DO NOTHING в той же транзакции.
+    Буфер создается один раз на соединение с ON COMMIT DELETE ROWS: он
+    очищается коммитом без TRUNCATE, не меняет каталог на каждом снимке и
+    не блокирует другие соединения, пишущие в ту же таблицу.
+    """
+
+    def __init__(self, table: str, columns: Tuple[str, ...], added_columns: Optional[Dict[str, str]] = None):
+        self.table = table
+        self.staging_table = f"{table}_staging"
+        self.columns = columns
+        # Колонки, которых может не быть в таблицах старой схемы: имя -> тип SQL
+        self.added_columns = added_columns or {}
+        self._column_list = ", ".join(columns)
+        self._prepared = False
+        # PID серверных процессов соединений, в которых уже создан буфер
+        self._staging_pids: set = set()
+
+    async def prepare(self, conn: asyncpg.Connection) -> None:
+        """Добавляет в основную таблицу недостающие колонки."""
+        existing = {row['column_name'] for row in await conn.fetch(
+            "SELECT column_name FROM information_schema.columns WHERE table_name = $1", self.table)}
+        # ALTER TABLE только при отсутствии колонок, чтобы не брать эксклюзивную блокировку зря
+        missing = [(column, sql_type) for column, sql_type in self.added_columns.items()
+                   if existing and column not in existing]
+        if missing:
+            await conn.execute(f"ALTER TABLE {self.table} " + ", ".join(
+                f"ADD COLUMN IF NOT EXISTS {column} {sql_type}" for column, sql_type in missing))
+            logger.info(f"[DB] В {self.table} добавлены колонки: {', '.join(column for column, _ in missing)}.")
+        self._prepared = True
+
+    async def _ensure_staging(self, conn: asyncpg.Connection) -> None:
+        """Создает временную таблицу-буфер в сессии соединения, если ее там еще нет."""
+        pid = conn.get_server_pid()
+        if pid in self._staging_pids:
+            return
+        await conn.execute(f"""
+                           CREATE TEMP TABLE IF NOT EXISTS {self.staging_table} ON COMMIT DELETE ROWS AS
+                           SELECT {self._column_list} FROM {self.table} WITH NO DATA
+                           """)
+        self._staging_pids.add(pid)
+
+    async def write(self, conn: asyncpg.Connection, records: List[Tuple]) -> Tuple[int, float]:
+        """
+        Записывает строки снимка.
+
+        Args:
+            conn: Соединение с БД
+            records: Строки в порядке self.columns
+
+        Returns:
+            Кортеж (число вставленных строк, длительность записи в секундах)
+        """
+        if not self._prepared:
+            await self.prepare(conn)
+        started = time.perf_counter()
+        await self._ensure_staging(conn)
+        try:
+            status = await self._copy_and_insert(conn, records)
+        except asyncpg.exceptions.UndefinedTableError:
+            # Соединение с тем же PID - новая сессия без буфера
+            self._staging_pids.discard(conn.get_server_pid())
+            await self._ensure_staging(conn)
+            status = await self._copy_and_insert(conn, records)
+        return int(status.split()[-1]), time.perf_counter() - started
+
+    async def _copy_and_insert(self, conn: asyncpg.Connection, records: List[Tuple]) -> str:
+        async with conn.transaction():
+            await conn.copy_records_to_table(self.staging_table, records=records, columns=self.columns,
+                                             schema_name='pg_temp')
+            return await conn.execute(f"""
+                                      INSERT INTO {self.table} ({self._column_list})
+                                      SELECT {self._column_list} FROM pg_temp.{self.staging_table}
+                                      ON CONFLICT (trading_pair_id, capture_time) DO NOTHING
+                                      """)
+
+
+class SpillBuffer:
+    """
+    Локальный буфер снимков, которые не удалось записать в БД.
+
+    Снимок дописывается строкой JSON в текущий файл-сегмент
+    <directory>/<table>/<номер>.seg с fsync; сегмент закрывается по размеру.
+    После восстановления БД сегменты воспроизводятся от старых к новым и
+    удаляются. Воспроизведение прерывается по сроку после любого снимка и
+    продолжается с того же места сегмента. Вставка идет с ON CONFLICT DO
+    NOTHING, поэтому повтор сегмента после сбоя или перезапуска посреди
+    воспроизведения безопасен. При превышении
+    лимита диска удаляются самые старые сегменты. Сегменты переживают
+    перезапуск сборщика.
+    """
+
+    def __init__(self, directory: str, table: str, max_bytes: int, segment_bytes: int):
+        self.table = table
+        self.directory = os.path.join(directory, table)
+        self.max_bytes = max_bytes
+        self.segment_bytes = segment_bytes
+        os.makedirs(self.directory, exist_ok=True)
+        # Номер сегмента -> размер в байтах, от старых к новым
+        self._segments: Dict[int, int] = {
+            int(name[:-4]): os.path.getsize(os.path.join(self.directory, name))
+            for name in sorted(os.listdir(self.directory)) if name.endswith('.seg') and name[:-4].isdigit()
+        }
+        # Номер сегмента -> смещение первого невоспроизведенного снимка
+        self._offsets: Dict[int, int] = {}
+        self._active = None
+        self._active_seq = None
+        self.spilled = 0
+        self.replayed = 0
+        self.rejected = 0
+        self.dropped_segments = 0
+        self.dropped_bytes = 0
+
+    def _path(self, seq: int) -> str:
+        return os.path.join(self.directory, f"{seq:012d}.seg")
+
+    @property
+    def pending_bytes(self) -> int:
+        return sum(self._segments.values())
+
+    def __bool__(self) -> bool:
+        return bool(self._segments)
+
+    def append(self, capture_time: datetime, records: List[Tuple]) -> None:
+        """
+        Сохраняет снимок в буфер.
+
+        Args:
+            capture_time: Время снимка
+            records: Строки снимка в порядке столбцов SnapshotWriter (второй элемент - capture_time)
+        """
+        line = orjson.dumps({'capture_time': capture_time.isoformat(),
+                             'rows': [(record[0], *record[2:]) for record in records]}) + b'\n'
+        if self._active is None or self._segments[self._active_seq] + len(line) > self.segment_bytes:
+            self._seal()
+            self._active_seq = max(self._segments, default=0) + 1
+            self._active = open(self._path(self._active_seq), 'ab')
+            self._segments[self._active_seq] = 0
+        self._active.write(line)
+        self._active.flush()
+        os.fsync(self._active.fileno())
+        self._segments[self._active_seq] += len(line)
+        self.spilled += 1
+        self._enforce_limit()
 
+    def _seal(self) -> None:
+        """Закрывает текущий сегмент; следующий снимок начнет новый."""
+        if self._active is not None:
+            self._active.close()
+            self._active = None
+            self._active_seq = None
+
+    def _enforce_limit(self) -> None:
+        """Удаляет самые старые сегменты, пока буфер больше лимита (текущий сегмент не трогается)."""
+        while self.pending_bytes > self.max_bytes and len(self._segments) > 1:
+            seq, size = next(iter(self._segments.items()))
+            os.remove(self._path(seq))
+            del self._segments[seq]
+            self._offsets.pop(seq, None)
+            self.dropped_segments += 1
+            self.dropped_bytes += size
+            logger.error(f"[Spill {self.table}] Буфер больше {self.max_bytes} байт: удален сегмент {seq} ({size} байт).")
+
+    async def replay(self, conn: asyncpg.Connection, writer: SnapshotWriter, deadline: float) -> int:
+        """
+        Воспроизводит сегменты в БД от старых к новым, пока не наступил deadline.
+
+        Снимки, которые БД отвергает по содержимому (DataError, нарушение
+        ограничений), отбрасываются, чтобы не блокировать очередь. Ошибки
+        соединения пробрасываются: остаток воспроизведется позже.
+
+        Args:
+            conn: Соединение с БД
+            writer: Запись снимков в таблицу
+            deadline: Момент time.monotonic(), после которого новый снимок не начинается
+
+        Returns:
+            Число воспроизведенных снимков
+        """
+        self._seal()
+        replayed = 0
+        while self._segments and time.monotonic() < deadline:
+            seq = next(iter(self._segments))
+            finished = False
+            with open(self._path(seq), 'rb') as segment:
+                segment.seek(self._offsets.get(seq, 0))
+                while time.monotonic() < deadline:
+                    line = segment.readline()
+                    if not line:
+                        finished = True
+                        break
+                    if await self._replay_line(conn, writer, seq, line):
+                        replayed += 1
+                    # Смещение сдвигается только после записи: при ошибке соединения снимок повторится
+                    self._offsets[seq] = segment.tell()
+            if not finished:
+                # Срок истек посреди сегмента - следующий проход продолжит с сохраненного смещения
+                break
+            os.remove(self._path(seq))
+            del self._segments[seq]
+            self._offsets.pop(seq, None)
+        self.replayed += replayed
+        return replayed
+
+    async def _replay_line(self, conn: asyncpg.Connection, writer: SnapshotWriter, seq: int, line: bytes) -> bool:
+        """Записывает один снимок сегмента; False - запись повреждена или отвергнута БД."""
+        try:
+            snapshot = orjson.loads(line)
+        except orjson.JSONDecodeError:
+            # Недописанная строка после аварийной остановки
+            logger.warning(f"[Spill {self.table}] Пропущена поврежденная запись сегмента {seq}.")
+            return False
+        capture_time = datetime.fromisoformat(snapshot['capture_time'])
+        # Строки, отложенные до появления новых колонок, дополняются NULL
+        padding = (None,) * (len(writer.columns) - 1 - len(snapshot['rows'][0])) if snapshot['rows'] else ()
+        records = [(row[0], capture_time, *row[1:], *padding) for row in snapshot['rows']]
+        try:
+            await writer.write(conn, records)
+        except (asyncpg.DataError, asyncpg.IntegrityConstraintViolationError) as e:
+            self.rejected += 1
+            logger.error(f"[Spill {self.table}] Снимок {snapshot['capture_time']} отвергнут БД и отброшен: {e}")
+            return False
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        """Состояние буфера для логов и API: объем очереди и счетчики."""
+        return {'segments': len(self._segments), 'pending_bytes': self.pending_bytes,
+                'fill_ratio': round(self.pending_bytes / self.max_bytes, 4), 'spilled': self.spilled,
+                'replayed': self.replayed, 'rejected': self.rejected,
+                'dropped_segments': self.dropped_segments, 'dropped_bytes': self.dropped_bytes}
+
+
+# Буферы сохранений по таблицам (создаются при запуске сохранения)
+SPILL_BUFFERS: Dict[str, SpillBuffer] = {}
+
+SNAPSHOT_KEY_COLUMNS = ('trading_pair_id', 'capture_time', 'pair_symbol', 'base_asset', 'quote_asset')
+# is_stale: в строке есть поле старше допустимого возраста (NULL - строка записана до учета свежести)
+SNAPSHOT_QUALITY_COLUMNS = {'is_stale': 'BOOLEAN DEFAULT FALSE'}
+SPOT_DATA_WRITER = SnapshotWriter('spot_data', SNAPSHOT_KEY_COLUMNS + SPOT_SNAPSHOT_FIELDS + ('is_stale',),
+                                  SNAPSHOT_QUALITY_COLUMNS)
+MARKET_DATA_WRITER = SnapshotWriter('market_data', SNAPSHOT_KEY_COLUMNS + FUTURES_FIELDS + ('is_stale',),
+                                    SNAPSHOT_QUALITY_COLUMNS)
+
+
+def field_max_ages(fields: Iterable[str]) -> np.ndarray:
+    """
+    Допустимый возраст полей снимка в секундах.
+
+    По умолчанию COLLECTOR_FIELD_MAX_AGE, для открытого интереса - три цикла
+    опроса; для поля переопределяется переменной COLLECTOR_MAX_AGE_<ПОЛЕ>.
+    """
+    defaults = {'open_interest': 3 * OI_CYCLE_SECONDS}
+    return np.array([float(os.getenv(f"COLLECTOR_MAX_AGE_{name.upper()}", defaults.get(name, COLLECTOR_FIELD_MAX_AGE)))
+                     for name in fields])
+
+
+class StaleRowCounter:
+    """Счетчики строк снимков с устаревшими полями и всех полных строк по биржам за текущую и прошлую минуты."""
+
+    def __init__(self):
+        self.minute: Optional[datetime] = None
+        self.stale: Counter = Counter()
+        self.total: Counter = Counter()
+        self.last_minute: Optional[datetime] = None
+        self.last_stale: Dict[str, int] = {}
+        self.last_total: Dict[str, int] = {}
+
+    def add(self, capture_time: datetime, stale: Counter, total: Counter) -> bool:
+        """
+        Добавляет счетчики снимка.
+
+        Returns:
+            True, если снимок начал новую минуту (итоги прошлой - в last_*)
+        """
+        minute = capture_time.replace(second=0, microsecond=0)
+        rolled = self.minute is not None and minute != self.minute
+        if rolled:
+            self.last_minute, self.last_stale, self.last_total = self.minute, dict(self.stale), dict(self.total)
+            self.stale, self.total = Counter(), Counter()
+        self.minute = minute
+        self.stale.update(stale)
+        self.total.update(total)
+        return rolled
+
+    def stats(self) -> Dict[str, Any]:
+        return {'minute': self.minute.isoformat() if self.minute else None, 'stale': dict(self.stale),
+                'total': dict(self.total),
+                'last_minute': self.last_minute.isoformat() if self.last_minute else None,
+                'last_stale': self.last_stale, 'last_total': self.last_total}
+
+
+# Счетчики устаревших строк по таблицам (создаются при запуске сохранения)
+STALE_ROW_COUNTERS: Dict[str, StaleRowCounter] = {}
+
+
+async def snapshot_saver(db_pool: asyncpg.Pool, tracked_ids: TrackedPairs, pair_rows: Dict[int, Dict],
+                         state: ColumnarState, writer: SnapshotWriter, interval: int, saver_name: str) -> None:
+    """
+    Сохраняет снимки состояния пар в таблицу с заданным периодом.
+
+    Пара попадает в снимок, как только у нее есть все поля состояния;
+    значения полей не сбрасываются, поэтому пишутся последние известные.
+
+    Args:
+        db_pool: Пул соединений с БД
+        tracked_ids: id сохраняемых пар
+        pair_rows: Строки trading_pairs по id
+        state: Колоночное состояние пар
+        writer: Запись снимков в таблицу
+        interval: Период снимков в секундах
+        saver_name: Имя сохранения для логов
+    """
+    logger.info(f"[{saver_name}] Запущен, снимок каждые {interval} сек в '{writer.table}'.")
+    spill = SPILL_BUFFERS[writer.table] = SpillBuffer(COLLECTOR_SPILL_DIR, writer.table,
+                                                      int(COLLECTOR_SPILL_MAX_MB * 2 ** 20),
+                                                      int(COLLECTOR_SPILL_SEGMENT_MB * 2 ** 20))
+    if spill:
+        logger.warning(f"[{saver_name}] В буфере остались снимки прошлого запуска: {spill.stats()}")
+    stale_policy = COLLECTOR_STALE_POLICY
+    if stale_policy not in STALE_POLICIES:
+        logger.warning(f"[{saver_name}] COLLECTOR_STALE_POLICY={stale_policy} не входит в {STALE_POLICIES}, "
+                       f"используется flag.")
+        stale_policy = 'flag'
+    max_ages = field_max_ages(state.fields)[:, None]
+    stale_counter = STALE_ROW_COUNTERS[writer.table] = StaleRowCounter()
+    version = None
+    capture_time = None
 
-async def db_saver(db_pool: asyncpg.Pool, pairs_from_db: Dict[int, Dict]) -> None:
-    logger.info("[Futures DB Saver] Запущен (Stateful логика).")
-    required_keys_from_ws = ['mark_price', 'index_price', 'funding_rate', 'volume_base_24h', 'volume_quote_24h']
-    exchange_map = {1: "BINANCE", 2: "BYBIT"}
     while True:
-        now = datetime.now(timezone.utc);
-        next_minute = (now.replace(second=0, microsecond=0) + timedelta(minutes=1));
-        sleep_seconds = (next_minute - now).total_seconds()
-        if sleep_seconds > 0: await asyncio.sleep(sleep_seconds)
-        capture_time = next_minute
-        logger.info(f"[{capture_time.strftime('%H:%M:%S')}] Futures DB Saver: Начало сессии сбора данных.")
-        for pair_id, pair_info in pairs_from_db.items():
-            market_key = f"{exchange_map.get(pair_info['exchange_id'])}:{pair_info['pair_symbol']}"
-            state = MARKET_STATE.get(market_key)
-            if state and all(key in state for key in required_keys_from_ws):
-                LAST_KNOWN_FUTURES_STATE.setdefault(pair_id, {});
-                LAST_KNOWN_FUTURES_STATE[pair_id].update(state)
-            if state and 'open_interest' in state:
-                LAST_KNOWN_FUTURES_STATE.setdefault(pair_id, {});
-                LAST_KNOWN_FUTURES_STATE[pair_id]['open_interest'] = state['open_interest']
-        records_for_executemany = []
-        for pair_id, saved_state in LAST_KNOWN_FUTURES_STATE.items():
-            if all(key in saved_state for key in required_keys_from_ws + ['open_interest']):
-                pair_info = pairs_from_db[pair_id];
-                base_asset, quote_asset = parse_symbol(pair_info['pair_symbol'])
-                records_for_executemany.append(
-                    (pair_id, capture_time, pair_info['pair_symbol'], base_asset, quote_asset,
-                     saved_state['mark_price'], saved_state['index_price'], saved_state['funding_rate'],
-                     saved_state['volume_base_24h'], saved_state['volume_quote_24h'], saved_state['open_interest']))
-        if not records_for_executemany: logger.warning(
-            "[Futures DB Saver] Нет полностью сформированных данных для сохранения."); continue
+        capture_time = await wait_for_capture_time(interval, capture_time, saver_name)
+        if tracked_ids.version != version:
+            # Слоты и неизменная часть строки считаются заново только при смене набора пар
+            version = tracked_ids.version
+            pair_keys, pair_exchanges, slot_list = [], [], []
+            for pair_id in tracked_ids.items:
+                row = pair_rows[pair_id]
+                slot = state.slot(EXCHANGE_KEYS[row['exchange_id']], row['pair_symbol'])
+                if slot is None: continue
+                pair_keys.append((pair_id, row['pair_symbol'], *parse_symbol(row['pair_symbol'])))
+                pair_exchanges.append(EXCHANGE_KEYS[row['exchange_id']])
+                slot_list.append(slot)
+            pair_slots = np.array(slot_list, dtype=np.intp)
+        if not pair_keys:
+            continue
+        log = snapshot_log(capture_time)
+        log(f"[{capture_time.strftime('%H:%M:%S')}] {saver_name}: Начало сессии сбора данных.")
+        # Готовность пар ведут воркеры, снимок берется сразу на границе периода
+        collected = np.flatnonzero(state.ready_mask(pair_slots))
+        if not collected.size:
+            logger.warning(f"[{saver_name}] Нет полностью собранных данных для сохранения."); continue
+        values, updated_at = state.columns(pair_slots[collected])
+        # Строка устарела, если хотя бы одно ее поле не обновлялось дольше допустимого
+        stale = (capture_time.timestamp() - updated_at > max_ages).any(axis=0)
+        stale_indices = collected[stale].tolist()
+        if stale_counter.add(capture_time, Counter(pair_exchanges[index] for index in stale_indices),
+                             Counter(pair_exchanges[index] for index in collected.tolist())):
+            if any(stale_counter.last_stale.values()):
+                logger.warning(f"[{saver_name}] Строк с устаревшими полями за {stale_counter.last_minute:%H:%M}: " +
+                               ", ".join(f"{exchange} {stale_counter.last_stale.get(exchange, 0)}/{total}"
+                                         for exchange, total in stale_counter.last_total.items()))
+        if stale_indices and stale_policy == 'refresh':
+            symbols_by_exchange: Dict[str, List[str]] = {}
+            for index in stale_indices:
+                symbols_by_exchange.setdefault(pair_exchanges[index], []).append(pair_keys[index][1])
+            for exchange, symbols in symbols_by_exchange.items():
+                STALE_REFRESHER.request(writer.table, exchange, symbols)
+        if stale_indices and stale_policy == 'skip':
+            collected, values, stale = collected[~stale], values[:, ~stale], stale[~stale]
+        records = []
+        for index, row, is_stale in zip(collected.tolist(), values.T.tolist(), stale.tolist()):
+            pair_id, pair_symbol, base_asset, quote_asset = pair_keys[index]
+            records.append((pair_id, capture_time, pair_symbol, base_asset, quote_asset, *row, is_stale))
+        if not records:
+            logger.warning(f"[{saver_name}] Все собранные строки устарели, снимок пропущен."); continue
         try:
             async with db_pool.acquire() as conn:
-                await conn.executemany("""
-                                       INSERT INTO market_data (trading_pair_id, capture_time, pair_symbol, base_asset,
-                                                                quote_asset, mark_price, index_price, funding_rate,
-                                                                volume_base_24h, volume_quote_24h, open_interest)
-                                       VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10,
-                                               $11) ON CONFLICT (trading_pair_id, capture_time) DO NOTHING;
-                                       """, records_for_executemany)
-            logger.info(f"[Futures DB Saver] УСПЕШНО СОХРАНЕНО {len(records_for_executemany)} записей в 'market_data'.")
+                inserted, elapsed = await writer.write(conn, records)
+                # Обработчик сигналов будится раз в минуту и при частых снимках
+                if capture_time.second == 0:
+                    await conn.execute("SELECT pg_notify($1, $2);", COLLECTOR_NOTIFY_CHANNEL,
+                                       f"{writer.table}:{capture_time.isoformat()}")
+            log(f"[{saver_name}] УСПЕШНО СОХРАНЕНО {inserted} из {len(records)} записей в '{writer.table}' "
+                f"за {elapsed:.3f} сек ({len(records) / max(elapsed, 1e-6):.0f} строк/сек, "
+                f"{elapsed / interval:.1%} периода).")
         except Exception as e:
-            logger.error(f"[Futures DB Saver] DB_ERROR: {e}")
+            logger.error(f"[{saver_name}] DB_ERROR: {e}")
+            try:
+                spill.append(capture_time, records)
+                logger.warning(f"[{saver_name}] Снимок {capture_time.isoformat()} отложен в буфер: {spill.stats()}")
+            except OSError as spill_error:
+                logger.critical(f"[{saver_name}] Снимок {capture_time.isoformat()} потерян, буфер недоступен: "
+                                f"{spill_error}")
+            continue
+        if spill:
+            # Отложенные снимки догоняются не дольше половины периода, остаток - на следующих снимках
+            try:
+                async with db_pool.acquire() as conn:
+                    replayed = await spill.replay(conn, writer, time.monotonic() + interval / 2)
+                logger.info(f"[{saver_name}] Из буфера записано снимков: {replayed}, осталось: {spill.stats()}")
+            except Exception as e:
+                logger.error(f"[{saver_name}] Воспроизведение буфера прервано: {e}")
+
+
+async def spot_db_saver(db_pool: asyncpg.Pool, spot_pair_ids: TrackedPairs, pair_rows: Dict[int, Dict],
+                        interval: int = SPOT_SNAPSHOT_INTERVAL) -> None:
+    await snapshot_saver(db_pool, spot_pair_ids, pair_rows, SPOT_STATE, SPOT_DATA_WRITER, interval, "Spot DB Saver")
+
+
+async def db_saver(db_pool: asyncpg.Pool, futures_pair_ids: TrackedPairs, pair_rows: Dict[int, Dict],
+                   interval: int = FUTURES_SNAPSHOT_INTERVAL) -> None:
+    await snapshot_saver(db_pool, futures_pair_ids, pair_rows, MARKET_STATE, MARKET_DATA_WRITER, interval,
+                         "Futures DB Saver")
+
+
+# --- 6. Главная функция ---
+# Группы потоков WebSocket: состояние, id биржи и тип контракта пар группы
+PAIR_GROUPS = {
+    'futures_binance': (MARKET_STATE, 1, 1),
+    'futures_bybit': (MARKET_STATE, 2, 1),
+    'spot_binance': (SPOT_STATE, 1, 2),
+    'spot_bybit': (SPOT_STATE, 2, 2),
+}
+TRADING_PAIRS_QUERY = "SELECT id, pair_symbol, exchange_id, contract_type_id FROM trading_pairs"
+# Канал PostgreSQL, уведомление в который перечитывает trading_pairs сразу (слушает и run_cmc_signal.py)
+TRADING_PAIRS_NOTIFY_CHANNEL = os.getenv("TRADING_PAIRS_NOTIFY_CHANNEL", "trading_pairs_updated")
+
+
+def group_pairs(rows: Iterable) -> Dict[str, List]:
+    """
+    Раскладывает строки trading_pairs по наборам сборщика.
+
+    Returns:
+        Словарь: группы PAIR_GROUPS -> символы, 'oi_bybit' -> символы Bybit для OI,
+        'futures_ids' / 'spot_ids' -> id сохраняемых пар
+    """
+    groups: Dict[str, List] = {name: [] for name in PAIR_GROUPS}
+    groups.update(futures_ids=[], spot_ids=[])
+    for row in rows:
+        for name, (_, exchange_id, contract_type_id) in PAIR_GROUPS.items():
+            if row['exchange_id'] == exchange_id and row['contract_type_id'] == contract_type_id:
+                groups[name].append(row['pair_symbol'])
+        if row['contract_type_id'] == 1:
+            groups['futures_ids'].append(row['id'])
+        elif row['contract_type_id'] == 2:
+            groups['spot_ids'].append(row['id'])
+    groups['oi_bybit'] = bybit_oi_symbols(groups['futures_bybit'])
+    return groups
+
+
+def bybit_oi_symbols(symbols: List[str]) -> List[str]:
+    """Отбирает пары Bybit с известным котируемым активом для сбора OI."""
+    return [symbol for symbol in symbols if any(symbol.endswith(quote) for quote in QUOTE_ASSETS)]
+
+
+def apply_pair_groups(groups: Dict[str, List], tracked: Dict[str, TrackedPairs]) -> None:
+    """
+    Применяет новые наборы пар: сначала назначает слоты новым парам, затем
+    обновляет наборы, по которым воркеры досылают подписки.
+
+    Если разделяемому состоянию не хватает запаса слотов, новые пары группы
+    пропускаются до перезапуска сборщика.
+    """
+    for name, (state, exchange_id, _) in PAIR_GROUPS.items():
+        exchange = EXCHANGE_KEYS[exchange_id]
+        try:
+            state.add_pairs(exchange, groups[name])
+        except RuntimeError as e:
+            logger.error(f"[Pairs Watcher] {name}: {e}")
+            groups[name] = [symbol for symbol in groups[name] if state.slot(exchange, symbol) is not None]
+    groups['oi_bybit'] = bybit_oi_symbols(groups['futures_bybit'])
+    for name, items in groups.items():
+        added, removed = tracked[name].update(items)
+        if added or removed:
+            logger.info(f"[Pairs Watcher] {name}: добавлено {len(added)}, удалено {len(removed)}.")
+
+
+async def pairs_watcher(db_pool: asyncpg.Pool, tracked: Dict[str, TrackedPairs], pair_rows: Dict[int, Dict]) -> None:
+    """
+    Перечитывает trading_pairs раз в COLLECTOR_PAIRS_RELOAD_SECONDS или сразу
+    по уведомлению TRADING_PAIRS_NOTIFY_CHANNEL и применяет разницу наборов
+    без перезапуска сборщика.
+    """
+    reload_requested = asyncio.Event()
+
+    def on_notify(*args: Any) -> None:
+        reload_requested.set()
+
+    listen_conn = None
+    try:
+        listen_conn = await db_pool.acquire()
+        await listen_conn.add_listener(TRADING_PAIRS_NOTIFY_CHANNEL, on_notify)
+    except Exception as e:
+        logger.warning(f"[Pairs Watcher] LISTEN {TRADING_PAIRS_NOTIFY_CHANNEL} недоступен, только по таймеру: {e}")
+    logger.info(f"[Pairs Watcher] Запущен, перечитывание каждые {COLLECTOR_PAIRS_RELOAD_SECONDS:.0f} сек.")
+    try:
+        while True:
+            try:
+                await asyncio.wait_for(reload_requested.wait(), timeout=COLLECTOR_PAIRS_RELOAD_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            reload_requested.clear()
+            try:
+                async with db_pool.acquire() as conn:
+                    rows = await conn.fetch(TRADING_PAIRS_QUERY)
+            except Exception as e:
+                logger.error(f"[Pairs Watcher] Ошибка чтения trading_pairs: {e}")
+                continue
+            # Строки удаленных пар остаются: сохранения перестают их писать по наборам id
+            pair_rows.update({row['id']: dict(row) for row in rows})
+            apply_pair_groups(group_pairs(rows), tracked)
+    finally:
+        if listen_conn is not None:
+            await listen_conn.remove_listener(TRADING_PAIRS_NOTIFY_CHANNEL, on_notify)
+            await db_pool.release(listen_conn)
 
 
-# --- 5. Главная функция ---
 async def main():
     """Главная функция-оркестратор."""
     db_pool = None
@@ -406,41 +1756,42 @@ async def main():
                                             database=os.getenv("POSTGRES_DB"))
         logger.info("Успешное подключение к PostgreSQL.")
         async with db_pool.acquire() as conn:
-            sql_query = "SELECT id, pair_symbol, exchange_id, contract_type_id FROM trading_pairs"
-            rows = await conn.fetch(sql_query)
+            rows = await conn.fetch(TRADING_PAIRS_QUERY)
             if not rows: logger.error("Таблица trading_pairs пуста. Завершение работы."); return
-            all_pairs_from_db = {row['id']: dict(row) for row in rows}
-            futures_pairs_from_db = {pid: pinfo for pid, pinfo in all_pairs_from_db.items() if
-                                     pinfo['contract_type_id'] == 1}
-            spot_pairs_from_db = {pid: pinfo for pid, pinfo in all_pairs_from_db.items() if
-                                  pinfo['contract_type_id'] == 2}
-            binance_futures_pairs = [p['pair_symbol'] for p in futures_pairs_from_db.values() if p['exchange_id'] == 1]
-            bybit_futures_pairs = [p['pair_symbol'] for p in futures_pairs_from_db.values() if p['exchange_id'] == 2]
-            binance_spot_pairs = [p['pair_symbol'] for p in spot_pairs_from_db.values() if p['exchange_id'] == 1]
-            bybit_spot_pairs = [p['pair_symbol'] for p in spot_pairs_from_db.values() if p['exchange_id'] == 2]
+        pair_rows = {row['id']: dict(row) for row in rows}
+        groups = group_pairs(rows)
         logger.info(
-            f"Загружено {len(rows)} пар: {len(futures_pairs_from_db)} фьючерсных, {len(spot_pairs_from_db)} спотовых.")
-        bybit_oi_pairs = [symbol for symbol in bybit_futures_pairs if
-                          any(symbol.endswith(quote) for quote in QUOTE_ASSETS)]
-        logger.info(f"Для сбора Bybit OI отобрано {len(bybit_oi_pairs)} из {len(bybit_futures_pairs)} пар.")
-        tasks = []
-        if binance_futures_pairs:
-            tasks.append(asyncio.create_task(binance_worker(binance_futures_pairs)))
-            tasks.append(asyncio.create_task(oi_collector("Binance", binance_futures_pairs, parse_binance_oi)))
-        if bybit_futures_pairs:
-            tasks.append(asyncio.create_task(bybit_worker(bybit_futures_pairs)))
-            if bybit_oi_pairs: tasks.append(asyncio.create_task(oi_collector("Bybit", bybit_oi_pairs, parse_bybit_oi)))
-        if binance_spot_pairs:
-            tasks.append(asyncio.create_task(spot_binance_worker(binance_spot_pairs)))
-        if bybit_spot_pairs:
-            tasks.append(asyncio.create_task(spot_bybit_worker(bybit_spot_pairs)))
-        if not tasks: logger.warning("Нет пар для отслеживания. Завершение работы."); return
+            f"Загружено {len(rows)} пар: {len(groups['futures_ids'])} фьючерсных, {len(groups['spot_ids'])} спотовых.")
+        # Наборы пар воркеров, сборщиков OI и сохранений меняет pairs_watcher
+        tracked = {name: TrackedPairs() for name in groups}
+        # Слоты колоночного состояния назначаются до запуска воркеров
+        apply_pair_groups(groups, tracked)
+        ingest_context = None
+        if COLLECTOR_INGEST_MODE == 'process':
+            # spawn: дочерние процессы не наследуют event loop и сокеты основного
+            ingest_context = multiprocessing.get_context('spawn')
+            SPOT_STATE.share(ingest_context, COLLECTOR_SLOT_RESERVE)
+            MARKET_STATE.share(ingest_context, COLLECTOR_SLOT_RESERVE)
+            logger.info("Режим разбора: отдельный процесс на каждую группу WebSocket потоков.")
+
+        def start_worker(worker_name: str) -> asyncio.Task:
+            if ingest_context:
+                return asyncio.create_task(ingest_process_supervisor(ingest_context, worker_name, tracked[worker_name]))
+            return asyncio.create_task(INGEST_WORKERS[worker_name](tracked[worker_name]))
+
+        logger.info(f"Для сбора Bybit OI отобрано {len(groups['oi_bybit'])} из {len(groups['futures_bybit'])} пар.")
+        # Воркеры запускаются и для пустых групп: пары могут появиться без перезапуска
+        tasks = [start_worker(worker_name) for worker_name in INGEST_WORKERS]
+        tasks.append(asyncio.create_task(oi_collector("Binance", tracked['futures_binance'], parse_binance_oi)))
+        tasks.append(asyncio.create_task(
+            oi_collector("Bybit", tracked['oi_bybit'], parse_bybit_oi, fetch_bybit_oi_bulk)))
+        tasks.append(asyncio.create_task(pairs_watcher(db_pool, tracked, pair_rows)))
+        if LIVE_STATE_PORT:
+            tasks.append(asyncio.create_task(live_state_server(LIVE_STATE_HOST, LIVE_STATE_PORT)))
         logger.info("Начальная задержка 30 секунд для сбора первоначальных данных...")
         await asyncio.sleep(30)
-        if futures_pairs_from_db:
-            tasks.append(asyncio.create_task(db_saver(db_pool, futures_pairs_from_db)))
-        if spot_pairs_from_db:
-            tasks.append(asyncio.create_task(spot_db_saver(db_pool, spot_pairs_from_db)))
+        tasks.append(asyncio.create_task(db_saver(db_pool, tracked['futures_ids'], pair_rows)))
+        tasks.append(asyncio.create_task(spot_db_saver(db_pool, tracked['spot_ids'], pair_rows)))
         await asyncio.gather(*tasks)
     except Exception as e:
         logger.critical(f"Критическая ошибка в main: {e}", exc_info=True)
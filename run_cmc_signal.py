@@ -2,22 +2,61 @@
 """
 Модуль для обработки криптовалютных сигналов.
 
-Каждые 15 секунд:
+По событию (или каждые 15 секунд в режиме SIGNAL_TRIGGER_MODE=poll):
 1. Вызывает функцию create_raw_signals в БД
 2. Если найдены новые сигналы, дополняет их данными с Binance и Bybit
 3. Заполняет все необходимые поля для спотовых и фьючерсных данных
+
+Фьючерсные ноги (текущие и 10 минут назад) берутся пачкой из market_data,
+которую пишет сборщик, без дополнительных запросов к биржам.
+
+Ноги сигналов (биржа/пара) и статистика обрабатываются параллельно в пуле
+потоков (SIGNAL_ENRICH_WORKERS) с ограничением одновременных запросов к каждой
+бирже (BINANCE_MAX_CONCURRENCY, BYBIT_MAX_CONCURRENCY). В режиме
+SIGNAL_HTTP_MODE=async вместо потоков используются aiohttp клиенты с общим
+пулом keep-alive соединений на биржу и учетом лимитов веса запросов.
+Если тикер биржи нужен многим сигналам тика (TICKER_SNAPSHOT_MIN_SIGNALS),
+тикеры всех символов загружаются одним запросом на биржу.
+Сбойные запросы повторяются с экспоненциальной задержкой (с учетом
+Retry-After), а при серии ошибок или бане цепь запросов к бирже размыкается
+и статистика берется с другой биржи (RequestGuard).
+
+В режиме SIGNAL_TRIGGER_MODE=listen (по умолчанию) обработка запускается
+уведомлениями PostgreSQL: сборщик сообщает о сохраненном снимке данных, а
+триггер на signals_10min - о вставленных сигналах. Таймер остается страховкой
+на случай пропущенных уведомлений (SIGNAL_SAFETY_INTERVAL).
+
+Длительности этапов и счетчики запросов по биржам собираются в
+PIPELINE_METRICS: итог каждого тика (p50/p95/p99 по этапам) пишется JSON
+строкой в лог, а при заданном METRICS_PORT отдается на /metrics.
 """
 
 import os
 import sys
+import json
 import time
+import select
+import random
+import socket
+import asyncio
+import threading
+import aiohttp
+import numpy as np
 import requests
 import psycopg2
+import psycopg2.extras
+import psycopg2.pool
 import schedule
-from typing import Dict, Any, Optional, List, Tuple, Set
-from dataclasses import dataclass, field
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from functools import partial
+from operator import itemgetter
+from typing import Dict, Any, Optional, List, Tuple, Set, Callable, Iterator
+from collections import Counter, OrderedDict, deque
+from dataclasses import dataclass, field, fields
 from datetime import datetime, timedelta, timezone
-from decimal import Decimal
+from decimal import Decimal, InvalidOperation
 from dotenv import load_dotenv
 
 # Загрузка конфигурации
@@ -32,10 +71,127 @@ DB_CONFIG = {
     "port": os.getenv("POSTGRES_PORT", 5432)
 }
 
+# Пул соединений обработчика: размер и интервал проверки простаивающих соединений
+DB_POOL_MIN_CONN = int(os.getenv("DB_POOL_MIN_CONN", 1))
+DB_POOL_MAX_CONN = int(os.getenv("DB_POOL_MAX_CONN", 4))
+DB_POOL_PING_INTERVAL = float(os.getenv("DB_POOL_PING_INTERVAL", 30))
+# TCP keepalive, чтобы разорванные соединения пула обнаруживались без ожидания
+DB_KEEPALIVE_CONFIG = {
+    "keepalives": 1,
+    "keepalives_idle": 30,
+    "keepalives_interval": 10,
+    "keepalives_count": 3
+}
+
 # Константы
+FUTURES_CONTRACT_TYPE_ID = 1
 SPOT_CONTRACT_TYPE_ID = 2
 BINANCE_EXCHANGE_ID = 1
 BYBIT_EXCHANGE_ID = 2
+EXCHANGE_NAMES = {BINANCE_EXCHANGE_ID: "Binance", BYBIT_EXCHANGE_ID: "Bybit"}
+
+# Спотовые ноги сигнала: (префикс полей SignalData, биржа, котируемый актив)
+SPOT_LEGS = (
+    ('spot_usdt_binance', BINANCE_EXCHANGE_ID, 'USDT'),
+    ('spot_usdt_bybit', BYBIT_EXCHANGE_ID, 'USDT'),
+    ('spot_btc_binance', BINANCE_EXCHANGE_ID, 'BTC'),
+    ('spot_btc_bybit', BYBIT_EXCHANGE_ID, 'BTC'),
+)
+
+# Форматы ответов бирж: ключи 24h тикера, индекс квотируемого объема в свече, интервалы
+EXCHANGE_FORMATS = {
+    BINANCE_EXCHANGE_ID: {
+        'volume_key': 'volume', 'quote_volume_key': 'quoteVolume', 'quote_volume_idx': 7,
+        'interval_1m': '1m', 'interval_1h': '1h', 'interval_1d': '1d',
+    },
+    BYBIT_EXCHANGE_ID: {
+        'volume_key': 'volume24h', 'quote_volume_key': 'turnover24h', 'quote_volume_idx': 6,
+        'interval_1m': '1', 'interval_1h': '60', 'interval_1d': 'D',
+    },
+}
+
+# Фьючерсные ноги сигнала: (префикс колонок, биржа, квотируемый актив); данные из market_data
+FUTURES_LEGS = (
+    ('futures_usdt_binance', BINANCE_EXCHANGE_ID, 'USDT'),
+    ('futures_usdt_bybit', BYBIT_EXCHANGE_ID, 'USDT'),
+)
+
+# Длительность интервалов свечей бирж в миллисекундах
+KLINE_INTERVAL_MS = {
+    '1m': 60_000, '1': 60_000,
+    '1h': 3_600_000, '60': 3_600_000,
+    '1d': 86_400_000, 'D': 86_400_000,
+}
+
+# Кэш свечей: TTL формирующейся свечи, лимиты размера, запас после закрытия свечи
+KLINE_CACHE_FORMING_TTL = float(os.getenv("KLINE_CACHE_FORMING_TTL", 5))
+KLINE_CACHE_MAX_SERIES = int(os.getenv("KLINE_CACHE_MAX_SERIES", 5000))
+KLINE_CACHE_SERIES_CANDLES = 1500
+KLINE_CLOSE_GRACE_MS = 2000
+
+# Локальный API состояния сборщика (пустой URL отключает) и допустимый возраст данных, сек
+LIVE_STATE_URL = os.getenv("LIVE_STATE_URL", "http://127.0.0.1:8765")
+LIVE_STATE_MAX_AGE = float(os.getenv("LIVE_STATE_MAX_AGE", 10))
+LIVE_STATE_TIMEOUT = 1
+
+# Предыдущие данные берутся из spot_data, если строка не старше prev_time на столько секунд
+SPOT_DATA_PREV_TOLERANCE = int(os.getenv("SPOT_DATA_PREV_TOLERANCE", 120))
+# Максимальный возраст текущего снимка market_data (сборщик пишет раз в минуту), сек
+FUTURES_DATA_MAX_AGE = int(os.getenv("FUTURES_DATA_MAX_AGE", 120))
+
+# Базовые URL REST API бирж (переопределяются для локального воспроизведения, см. bench_cmc_signal.py)
+BINANCE_SPOT_API_URL = os.getenv("BINANCE_SPOT_API_URL", "https://api.binance.com")
+BYBIT_API_URL = os.getenv("BYBIT_API_URL", "https://api.bybit.com")
+
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+
+# Параллельное обогащение сигналов (1 - последовательный режим)
+SIGNAL_ENRICH_WORKERS = int(os.getenv("SIGNAL_ENRICH_WORKERS", 8))
+# Максимум одновременных запросов к каждой бирже
+BINANCE_MAX_CONCURRENCY = int(os.getenv("BINANCE_MAX_CONCURRENCY", 5))
+BYBIT_MAX_CONCURRENCY = int(os.getenv("BYBIT_MAX_CONCURRENCY", 5))
+# HTTP режим: threads - requests в пуле потоков, async - aiohttp, все запросы ноги одновременно
+SIGNAL_HTTP_MODE = os.getenv("SIGNAL_HTTP_MODE", "threads")
+# Лимит веса запросов Binance в минуту и доля, которую разрешено использовать
+BINANCE_WEIGHT_LIMIT = int(os.getenv("BINANCE_WEIGHT_LIMIT", 6000))
+BINANCE_WEIGHT_SAFETY = float(os.getenv("BINANCE_WEIGHT_SAFETY", 0.9))
+# Повторы запросов к биржам: число попыток и границы экспоненциальной задержки, сек
+HTTP_RETRY_ATTEMPTS = int(os.getenv("HTTP_RETRY_ATTEMPTS", 3))
+HTTP_RETRY_BASE_DELAY = float(os.getenv("HTTP_RETRY_BASE_DELAY", 0.25))
+HTTP_RETRY_MAX_DELAY = float(os.getenv("HTTP_RETRY_MAX_DELAY", 4))
+# Размыкатель цепи: ошибок подряд до размыкания и пауза до пробного запроса, сек
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", 5))
+CIRCUIT_RESET_TIMEOUT = float(os.getenv("CIRCUIT_RESET_TIMEOUT", 30))
+# Ответы об ограничении частоты: 429, бан Binance (418), бан по IP (403) и коды Bybit в теле ответа
+THROTTLE_STATUSES = (403, 418, 429)
+BYBIT_RATE_LIMIT_CODES = (10006, 10018)
+# Если тикер биржи нужен большему числу сигналов тика, все тикеры биржи загружаются одним запросом
+TICKER_SNAPSHOT_MIN_SIGNALS = int(os.getenv("TICKER_SNAPSHOT_MIN_SIGNALS", 10))
+
+# Запуск обработки: listen - по уведомлениям PostgreSQL, poll - по таймеру
+SIGNAL_TRIGGER_MODE = os.getenv("SIGNAL_TRIGGER_MODE", "listen")
+SIGNAL_POLL_INTERVAL = 15
+# В режиме listen таймер только страхует от пропущенных уведомлений (секунды)
+SIGNAL_SAFETY_INTERVAL = int(os.getenv("SIGNAL_SAFETY_INTERVAL", 60))
+# Каналы уведомлений: вставка сигналов (триггер) и сохранение снимка сборщиком
+SIGNALS_NOTIFY_CHANNEL = os.getenv("SIGNALS_NOTIFY_CHANNEL", "signals_10min_inserted")
+COLLECTOR_NOTIFY_CHANNEL = os.getenv("COLLECTOR_NOTIFY_CHANNEL", "collector_data_saved")
+# Канал обновления trading_pairs (create_futures_pairs.py) и интервал проверки версии таблицы, сек
+TRADING_PAIRS_NOTIFY_CHANNEL = os.getenv("TRADING_PAIRS_NOTIFY_CHANNEL", "trading_pairs_updated")
+TRADING_PAIRS_CHECK_INTERVAL = float(os.getenv("TRADING_PAIRS_CHECK_INTERVAL", 60))
+
+# Разбор сигналов несколькими обработчиками: имя обработчика, размер пачки и
+# срок аренды захваченных сигналов (после него сигнал может взять другой обработчик)
+SIGNAL_WORKER_ID = os.getenv("SIGNAL_WORKER_ID", f"{socket.gethostname()}:{os.getpid()}")
+SIGNAL_CLAIM_BATCH = int(os.getenv("SIGNAL_CLAIM_BATCH", 200))
+SIGNAL_CLAIM_LEASE = int(os.getenv("SIGNAL_CLAIM_LEASE", 120))
+# Ключ advisory lock: create_raw_signals одновременно выполняет только один обработчик
+CREATE_RAW_SIGNALS_LOCK_KEY = 20_251_010
+
+# Метрики конвейера: порт Prometheus (0 - выключен) и JSON строка в лог по итогам тика
+METRICS_PORT = int(os.getenv("METRICS_PORT", 0))
+METRICS_JSON_LOG = os.getenv("METRICS_JSON_LOG", "1") == "1"
+METRICS_QUANTILES = (50, 95, 99)
 
 
 @dataclass
@@ -65,6 +221,18 @@ class PriceStats:
     percent_change_30d: Optional[Decimal] = None
 
 
+@dataclass
+class FuturesMarketData:
+    """Структура для хранения фьючерсных данных (строка market_data)."""
+    capture_time: datetime
+    mark_price: Optional[Decimal] = None
+    index_price: Optional[Decimal] = None
+    funding_rate: Optional[Decimal] = None
+    volume_base_24h: Optional[Decimal] = None
+    volume_quote_24h: Optional[Decimal] = None
+    open_interest: Optional[Decimal] = None
+
+
 @dataclass
 class SignalData:
     """Полная структура данных для сигнала."""
@@ -82,25 +250,416 @@ class SignalData:
     spot_usdt_bybit_prev: Optional[SpotMarketData] = None
     spot_btc_binance_prev: Optional[SpotMarketData] = None
     spot_btc_bybit_prev: Optional[SpotMarketData] = None
+    # Фьючерсные данные из market_data (текущие и 10 минут назад)
+    futures_usdt_binance_now: Optional[FuturesMarketData] = None
+    futures_usdt_bybit_now: Optional[FuturesMarketData] = None
+    futures_usdt_binance_prev: Optional[FuturesMarketData] = None
+    futures_usdt_bybit_prev: Optional[FuturesMarketData] = None
     # Статистика
     price_stats: Optional[PriceStats] = None
     # Доступные торговые пары
     available_pairs: Set[Tuple[int, str]] = field(default_factory=set)
 
 
+# Группы колонок signals_10min для пакетного обновления:
+# (атрибут SignalData, [(поле объекта, колонка, SQL тип)])
+SIGNAL_UPDATE_GROUPS = [
+    (f"{prefix}_{moment}", [
+        (item.name, f"{prefix}_{item.name}_{moment}", 'timestamptz' if item.name == 'capture_time' else 'numeric')
+        for item in fields(SpotMarketData)
+    ])
+    for prefix, _, _ in SPOT_LEGS
+    for moment in ('now', 'prev')
+] + [
+    (f"{prefix}_{moment}", [
+        (item.name, f"{prefix}_{item.name}_{moment}", 'timestamptz' if item.name == 'capture_time' else 'numeric')
+        for item in fields(FuturesMarketData)
+    ])
+    for prefix, _, _ in FUTURES_LEGS
+    for moment in ('now', 'prev')
+] + [
+    ('price_stats', [(item.name, item.name, 'numeric') for item in fields(PriceStats)]),
+]
+
+
+@dataclass
+class SpotLegPlan:
+    """План обработки одной спотовой ноги сигнала."""
+    prefix: str
+    exchange_id: int
+    symbol: str
+    # Текущие данные из сборщика (если свежие)
+    live_now: Optional[SpotMarketData] = None
+    # Предыдущие данные из spot_data (если есть строка рядом с prev_time)
+    stored_prev: Optional[SpotMarketData] = None
+
+
+class PipelineMetrics:
+    """
+    Метрики конвейера обработки сигналов.
+
+    Длительности этапов (span) копятся в пределах тика и по его итогам
+    сводятся в p50/p95/p99; счетчики событий по биржам (запросы, попадания
+    в кэш, ошибки) накапливаются за все время работы. Итог тика пишется
+    JSON строкой в лог и отдается в формате Prometheus на METRICS_PORT.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # (этап, биржа) -> длительности текущего тика в секундах
+        self._tick_spans: Dict[Tuple[str, str], List[float]] = {}
+        # (этап, биржа) -> [сумма, количество] за все время
+        self._span_totals: Dict[Tuple[str, str], List[float]] = {}
+        # (событие, биржа) -> значение счетчика за все время и за текущий тик
+        self._counters: Dict[Tuple[str, str], int] = {}
+        self._tick_counters: Dict[Tuple[str, str], int] = {}
+        # (показатель, биржа) -> текущее значение
+        self._gauges: Dict[Tuple[str, str], float] = {}
+        self._last_tick: Dict[str, Any] = {}
+        self.ticks = 0
+
+    @contextmanager
+    def span(self, stage: str, exchange: str = ''):
+        """
+        Замеряет длительность блока как этап конвейера.
+
+        Args:
+            stage: Название этапа
+            exchange: Биржа, к которой относится этап (пусто - общий этап)
+        """
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - started, exchange)
+
+    def observe(self, stage: str, seconds: float, exchange: str = '') -> None:
+        """Добавляет замер длительности этапа."""
+        key = (stage, exchange)
+        with self._lock:
+            self._tick_spans.setdefault(key, []).append(seconds)
+            totals = self._span_totals.setdefault(key, [0.0, 0])
+            totals[0] += seconds
+            totals[1] += 1
+
+    def inc(self, event: str, exchange: str = '', value: int = 1) -> None:
+        """Увеличивает счетчик события биржи."""
+        key = (event, exchange)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+            self._tick_counters[key] = self._tick_counters.get(key, 0) + value
+
+    def set_gauge(self, name: str, exchange: str, value: float) -> None:
+        """Устанавливает текущее значение показателя биржи."""
+        with self._lock:
+            self._gauges[(name, exchange)] = value
+
+    @property
+    def last_tick(self) -> Dict[str, Any]:
+        """Итог последнего завершенного тика (см. finish_tick)."""
+        with self._lock:
+            return self._last_tick
+
+    def start_tick(self) -> None:
+        """Начинает новый тик: сбрасывает замеры предыдущего."""
+        with self._lock:
+            self._tick_spans = {}
+            self._tick_counters = {}
+
+    def finish_tick(self) -> Dict[str, Any]:
+        """
+        Сводит замеры тика в квантили и пишет итог в лог.
+
+        Returns:
+            Итог тика: этапы с count/p50/p95/p99/max (мс) и счетчики тика
+        """
+        with self._lock:
+            tick_spans, self._tick_spans = self._tick_spans, {}
+            tick_counters, self._tick_counters = self._tick_counters, {}
+            gauges = dict(self._gauges)
+            self.ticks += 1
+
+        stages = []
+        for (stage, exchange), durations in sorted(tick_spans.items()):
+            quantiles = np.percentile(durations, METRICS_QUANTILES)
+            entry = {'stage': stage, 'count': len(durations), 'max_ms': round(max(durations) * 1000, 2)}
+            if exchange:
+                entry['exchange'] = exchange
+            for q, value in zip(METRICS_QUANTILES, quantiles):
+                entry[f'p{q}_ms'] = round(float(value) * 1000, 2)
+            stages.append(entry)
+
+        counters = [
+            {'event': event, 'exchange': exchange, 'value': value}
+            for (event, exchange), value in sorted(tick_counters.items())
+        ]
+        summary = {
+            'type': 'signal_tick_metrics',
+            'time': datetime.now(timezone.utc).isoformat(),
+            'stages': stages,
+            'counters': counters,
+            'gauges': [
+                {'name': name, 'exchange': exchange, 'value': value}
+                for (name, exchange), value in sorted(gauges.items())
+            ]
+        }
+        with self._lock:
+            self._last_tick = summary
+        if METRICS_JSON_LOG:
+            print(json.dumps(summary, ensure_ascii=False))
+        return summary
+
+    @staticmethod
+    def _labels(**labels: str) -> str:
+        """Форматирует непустые метки Prometheus."""
+        parts = [f'{name}="{value}"' for name, value in labels.items() if value]
+        return '{' + ','.join(parts) + '}' if parts else ''
+
+    def render_prometheus(self) -> str:
+        """
+        Формирует метрики в текстовом формате Prometheus.
+
+        Квантили берутся по последнему завершенному тику, суммы и счетчики -
+        за все время работы.
+
+        Returns:
+            Текст для ответа на /metrics
+        """
+        last_tick = self.last_tick
+        with self._lock:
+            span_totals = {key: list(value) for key, value in self._span_totals.items()}
+            counters = dict(self._counters)
+            gauges = dict(self._gauges)
+            ticks = self.ticks
+
+        lines = ['# TYPE signal_stage_seconds summary']
+        for entry in last_tick.get('stages', []):
+            for q in METRICS_QUANTILES:
+                labels = self._labels(stage=entry['stage'], exchange=entry.get('exchange', ''),
+                                      quantile=str(q / 100))
+                lines.append(f"signal_stage_seconds{labels} {entry[f'p{q}_ms'] / 1000}")
+        for (stage, exchange), (total, count) in sorted(span_totals.items()):
+            labels = self._labels(stage=stage, exchange=exchange)
+            lines.append(f"signal_stage_seconds_sum{labels} {total}")
+            lines.append(f"signal_stage_seconds_count{labels} {count}")
+
+        lines.append('# TYPE signal_events_total counter')
+        for (event, exchange), value in sorted(counters.items()):
+            lines.append(f"signal_events_total{self._labels(event=event, exchange=exchange)} {value}")
+
+        for name in sorted({name for name, _ in gauges}):
+            lines.append(f'# TYPE signal_{name} gauge')
+            for (gauge_name, exchange), value in sorted(gauges.items()):
+                if gauge_name == name:
+                    lines.append(f"signal_{name}{self._labels(exchange=exchange)} {value}")
+
+        lines.append('# TYPE signal_ticks_total counter')
+        lines.append(f"signal_ticks_total {ticks}")
+        return '\n'.join(lines) + '\n'
+
+    def serve(self, port: int) -> ThreadingHTTPServer:
+        """
+        Запускает HTTP endpoint /metrics в фоновом потоке.
+
+        Args:
+            port: Порт для прослушивания
+
+        Returns:
+            Запущенный HTTP сервер
+        """
+        metrics = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                body = metrics.render_prometheus().encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer(('0.0.0.0', port), MetricsHandler)
+        threading.Thread(target=server.serve_forever, name='metrics-http', daemon=True).start()
+        print(f"Метрики Prometheus: http://0.0.0.0:{port}/metrics")
+        return server
+
+
+# Общие метрики процесса: пишутся из клиентов, кэша и процессора сигналов
+PIPELINE_METRICS = PipelineMetrics()
+
+
+class RequestGuard:
+    """
+    Повторы запросов и размыкатель цепи для одной биржи.
+
+    Сетевые ошибки, 5xx и 429 повторяются с экспоненциальной задержкой со
+    случайным разбросом, не меньшей Retry-After. После
+    CIRCUIT_FAILURE_THRESHOLD ошибок подряд, бана (403/418) или Retry-After
+    длиннее HTTP_RETRY_MAX_DELAY цепь размыкается: запросы к бирже сразу
+    возвращают None, пока не истечет пауза, затем один пробный запрос решает,
+    замкнуть цепь снова или нет. Состояние цепи - показатель circuit_state
+    (0 - замкнута, 1 - пробный запрос, 2 - разомкнута).
+    """
+
+    CLOSED, HALF_OPEN, OPEN = 'closed', 'half_open', 'open'
+    STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+    def __init__(self, exchange_name: str):
+        self.exchange_name = exchange_name
+        self.state = self.CLOSED
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._open_until = 0.0
+        self._probe_in_flight = False
+        PIPELINE_METRICS.set_gauge('circuit_state', exchange_name, self.STATE_VALUES[self.state])
+
+    @property
+    def available(self) -> bool:
+        """Цепь замкнута или готова к пробному запросу."""
+        with self._lock:
+            if self.state == self.OPEN:
+                return time.monotonic() >= self._open_until
+            return self.state == self.CLOSED or not self._probe_in_flight
+
+    def allow(self) -> bool:
+        """
+        Проверяет, можно ли отправить запрос.
+
+        Returns:
+            True, если цепь замкнута или запрос назначен пробным
+        """
+        with self._lock:
+            if self.state == self.OPEN and time.monotonic() >= self._open_until:
+                self._set_state(self.HALF_OPEN)
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+        PIPELINE_METRICS.inc('circuit_rejected', self.exchange_name)
+        return False
+
+    def record_success(self) -> None:
+        """Отмечает ответ биржи: сбрасывает счетчик ошибок и замыкает цепь."""
+        with self._lock:
+            self._failures = 0
+            self._probe_in_flight = False
+            self._set_state(self.CLOSED)
+
+    def on_error(self, url: str, attempt: int, status: Optional[int] = None,
+                 retry_after: Optional[str] = None, error: Optional[Exception] = None) -> Optional[float]:
+        """
+        Учитывает неудачную попытку и решает, повторять ли запрос.
+
+        Args:
+            url: URL запроса
+            attempt: Номер попытки, начиная с 1
+            status: HTTP статус ответа (None - ответа нет)
+            retry_after: Заголовок Retry-After
+            error: Исключение запроса
+
+        Returns:
+            Задержка перед повтором в секундах или None, если повторять не нужно
+        """
+        PIPELINE_METRICS.inc('errors', self.exchange_name)
+        wait_hint = self._parse_retry_after(retry_after)
+        if status in THROTTLE_STATUSES:
+            PIPELINE_METRICS.inc('throttled', self.exchange_name)
+            if status != 429 or (wait_hint or 0) > HTTP_RETRY_MAX_DELAY:
+                # Бан или долгая пауза: не ждем внутри тика, а размыкаем цепь до снятия ограничения
+                pause = wait_hint or CIRCUIT_RESET_TIMEOUT
+                print(f"API {status} for {url}: {self.exchange_name} ограничивает запросы, "
+                      f"пауза {pause:.0f} сек", file=sys.stderr)
+                with self._lock:
+                    self._open(pause)
+                return None
+            with self._lock:
+                # Ограничение частоты - не отказ биржи; повтор может стать пробным запросом
+                self._probe_in_flight = False
+        elif status is not None and status < 500:
+            # Прочие 4xx повторять бессмысленно, биржа при этом отвечает
+            print(f"API HTTP error for {url}: {status}", file=sys.stderr)
+            self.record_success()
+            return None
+        else:
+            with self._lock:
+                self._failures += 1
+                self._probe_in_flight = False
+                if self.state == self.HALF_OPEN or self._failures >= CIRCUIT_FAILURE_THRESHOLD:
+                    self._open(CIRCUIT_RESET_TIMEOUT)
+
+        if attempt >= HTTP_RETRY_ATTEMPTS or not self.available:
+            print(f"API request error for {url}: {error or status} (попыток: {attempt})", file=sys.stderr)
+            return None
+        PIPELINE_METRICS.inc('retries', self.exchange_name)
+        # Полный случайный разброс, чтобы параллельные запросы не повторялись одновременно
+        backoff = random.uniform(0, min(HTTP_RETRY_MAX_DELAY, HTTP_RETRY_BASE_DELAY * 2 ** (attempt - 1)))
+        return max(backoff, wait_hint or 0)
+
+    def _open(self, seconds: float) -> None:
+        """Размыкает цепь на заданное время (вызывается под self._lock)."""
+        self._probe_in_flight = False
+        self._open_until = max(self._open_until, time.monotonic() + seconds)
+        if self.state != self.OPEN:
+            PIPELINE_METRICS.inc('circuit_opened', self.exchange_name)
+            print(f"{self.exchange_name}: цепь запросов разомкнута на {seconds:.0f} сек", file=sys.stderr)
+        self._set_state(self.OPEN)
+
+    def _set_state(self, state: str) -> None:
+        """Меняет состояние цепи (вызывается под self._lock)."""
+        if state == self.state:
+            return
+        if state == self.CLOSED:
+            print(f"{self.exchange_name}: цепь запросов снова замкнута")
+        self.state = state
+        PIPELINE_METRICS.set_gauge('circuit_state', self.exchange_name, self.STATE_VALUES[state])
+
+    @staticmethod
+    def _parse_retry_after(value: Optional[str]) -> Optional[float]:
+        """Разбирает Retry-After в секундах; формат даты биржи не используют."""
+        try:
+            return max(float(value), 0.0) if value is not None else None
+        except ValueError:
+            return None
+
+
 class BaseAPIClient:
     """Базовый класс для API клиентов."""
 
-    def __init__(self, base_url: str):
+    def __init__(self, base_url: str, max_concurrency: int = 5, exchange_name: str = ''):
         self.base_url = base_url
+        self.exchange_name = exchange_name
         self.session = requests.Session()
         self.session.headers.update({
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+            'User-Agent': USER_AGENT
         })
+        # Пул соединений по размеру лимита, чтобы потоки не ждали свободный сокет
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=max_concurrency)
+        self.session.mount(base_url, adapter)
+        self._semaphore = threading.BoundedSemaphore(max_concurrency)
+        self.guard = RequestGuard(exchange_name)
+        # Тикеры всех символов биржи на время тика: {символ: тикер}
+        self.ticker_snapshot: Optional[Dict[str, Dict]] = None
+
+    def _snapshot_ticker(self, symbol: str) -> Optional[Dict]:
+        """Возвращает тикер из снимка тика; символа нет в снимке - пары нет на бирже."""
+        PIPELINE_METRICS.inc('ticker_snapshot_hits', self.exchange_name)
+        return self.ticker_snapshot.get(symbol)
+
+    @staticmethod
+    def _is_throttled(data: Any) -> bool:
+        """Проверяет, сообщает ли тело успешного ответа об ограничении частоты."""
+        return False
 
     def _make_request(self, endpoint: str, params: Optional[Dict] = None) -> Optional[Dict]:
         """
-        Выполняет HTTP запрос к API.
+        Выполняет HTTP запрос к API с повторами (см. RequestGuard).
 
         Args:
             endpoint: Конечная точка API
@@ -110,26 +669,39 @@ class BaseAPIClient:
             Ответ API в виде словаря или None при ошибке
         """
         url = self.base_url + endpoint
-        try:
-            response = self.session.get(url, params=params, timeout=10)
-            response.raise_for_status()
-            return response.json()
-        except requests.exceptions.HTTPError as e:
-            if e.response.status_code == 400:
-                # Не логируем 400 ошибки подробно - это нормально для отсутствующих пар
+        for attempt in range(1, HTTP_RETRY_ATTEMPTS + 1):
+            if not self.guard.allow():
                 return None
-            print(f"API HTTP error for {url}: {e}", file=sys.stderr)
-            return None
-        except requests.exceptions.RequestException as e:
-            print(f"API request error for {url}: {e}", file=sys.stderr)
-            return None
+            PIPELINE_METRICS.inc('requests', self.exchange_name)
+            try:
+                with self._semaphore, PIPELINE_METRICS.span('exchange_request', self.exchange_name):
+                    response = self.session.get(url, params=params, timeout=10)
+                status = response.status_code
+                if status == 400:
+                    # Не логируем 400 ошибки подробно - это нормально для отсутствующих пар
+                    PIPELINE_METRICS.inc('not_found', self.exchange_name)
+                    self.guard.record_success()
+                    return None
+                if status < 400:
+                    data = response.json()
+                    if not self._is_throttled(data):
+                        self.guard.record_success()
+                        return data
+                    status = 429
+                delay = self.guard.on_error(url, attempt, status, response.headers.get('Retry-After'))
+            except requests.exceptions.RequestException as e:
+                delay = self.guard.on_error(url, attempt, error=e)
+            if delay is None:
+                return None
+            time.sleep(delay)
+        return None
 
 
 class BinanceSpotClient(BaseAPIClient):
     """Клиент для работы со спотовым API Binance."""
 
     def __init__(self):
-        super().__init__('https://api.binance.com')
+        super().__init__(BINANCE_SPOT_API_URL, BINANCE_MAX_CONCURRENCY, EXCHANGE_NAMES[BINANCE_EXCHANGE_ID])
 
     def get_24hr_ticker(self, symbol: str) -> Optional[Dict]:
         """
@@ -141,10 +713,20 @@ class BinanceSpotClient(BaseAPIClient):
         Returns:
             Словарь с данными тикера или None
         """
+        if self.ticker_snapshot is not None:
+            return self._snapshot_ticker(symbol)
         data = self._make_request('/api/v3/ticker/24hr', {'symbol': symbol})
-        if data and isinstance(data, dict) and 'lastPrice' in data:
-            return data
-        return None
+        return self._parse_ticker(data)
+
+    def get_all_tickers(self) -> Optional[Dict[str, Dict]]:
+        """
+        Получает 24-часовую статистику по всем символам одним запросом.
+
+        Returns:
+            Словарь {символ: тикер} или None
+        """
+        data = self._make_request('/api/v3/ticker/24hr')
+        return self._parse_all_tickers(data)
 
     def get_klines(self, symbol: str, interval: str, limit: int = 500,
                    start_time: Optional[int] = None, end_time: Optional[int] = None) -> Optional[List]:
@@ -161,6 +743,28 @@ class BinanceSpotClient(BaseAPIClient):
         Returns:
             Список свечей или None
         """
+        params = self._kline_params(symbol, interval, limit, start_time, end_time)
+        data = self._make_request('/api/v3/klines', params)
+        return self._parse_klines(data)
+
+    @staticmethod
+    def _parse_ticker(data: Optional[Dict]) -> Optional[Dict]:
+        """Проверяет ответ /api/v3/ticker/24hr."""
+        if data and isinstance(data, dict) and 'lastPrice' in data:
+            return data
+        return None
+
+    @staticmethod
+    def _parse_all_tickers(data: Any) -> Optional[Dict[str, Dict]]:
+        """Индексирует по символу ответ /api/v3/ticker/24hr без параметра symbol."""
+        if isinstance(data, list):
+            return {item['symbol']: item for item in data if 'symbol' in item and 'lastPrice' in item}
+        return None
+
+    @staticmethod
+    def _kline_params(symbol: str, interval: str, limit: int,
+                      start_time: Optional[int], end_time: Optional[int]) -> Dict[str, Any]:
+        """Формирует параметры запроса /api/v3/klines."""
         params = {
             'symbol': symbol,
             'interval': interval,
@@ -170,8 +774,11 @@ class BinanceSpotClient(BaseAPIClient):
             params['startTime'] = start_time
         if end_time:
             params['endTime'] = end_time
+        return params
 
-        data = self._make_request('/api/v3/klines', params)
+    @staticmethod
+    def _parse_klines(data: Any) -> Optional[List]:
+        """Проверяет ответ /api/v3/klines."""
         return data if isinstance(data, list) else None
 
 
@@ -179,7 +786,7 @@ class BybitSpotClient(BaseAPIClient):
     """Клиент для работы со спотовым API Bybit."""
 
     def __init__(self):
-        super().__init__('https://api.bybit.com')
+        super().__init__(BYBIT_API_URL, BYBIT_MAX_CONCURRENCY, EXCHANGE_NAMES[BYBIT_EXCHANGE_ID])
 
     def get_24hr_ticker(self, symbol: str) -> Optional[Dict]:
         """
@@ -191,15 +798,23 @@ class BybitSpotClient(BaseAPIClient):
         Returns:
             Словарь с данными тикера или None
         """
+        if self.ticker_snapshot is not None:
+            return self._snapshot_ticker(symbol)
         data = self._make_request('/v5/market/tickers', {
             'category': 'spot',
             'symbol': symbol
         })
+        return self._parse_ticker(data)
 
-        if data and data.get('retCode') == 0:
-            tickers = data.get('result', {}).get('list', [])
-            return tickers[0] if tickers else None
-        return None
+    def get_all_tickers(self) -> Optional[Dict[str, Dict]]:
+        """
+        Получает 24-часовую статистику по всем спотовым символам одним запросом.
+
+        Returns:
+            Словарь {символ: тикер} или None
+        """
+        data = self._make_request('/v5/market/tickers', {'category': 'spot'})
+        return self._parse_all_tickers(data)
 
     def get_klines(self, symbol: str, interval: str, limit: int = 200,
                    start_time: Optional[int] = None, end_time: Optional[int] = None) -> Optional[List]:
@@ -216,6 +831,34 @@ class BybitSpotClient(BaseAPIClient):
         Returns:
             Список свечей или None
         """
+        params = self._kline_params(symbol, interval, limit, start_time, end_time)
+        data = self._make_request('/v5/market/kline', params)
+        return self._parse_klines(data)
+
+    @staticmethod
+    def _is_throttled(data: Any) -> bool:
+        """Bybit сообщает о превышении лимита кодом retCode при HTTP 200."""
+        return isinstance(data, dict) and data.get('retCode') in BYBIT_RATE_LIMIT_CODES
+
+    @staticmethod
+    def _parse_ticker(data: Optional[Dict]) -> Optional[Dict]:
+        """Извлекает тикер из ответа /v5/market/tickers."""
+        if data and data.get('retCode') == 0:
+            tickers = data.get('result', {}).get('list', [])
+            return tickers[0] if tickers else None
+        return None
+
+    @staticmethod
+    def _parse_all_tickers(data: Optional[Dict]) -> Optional[Dict[str, Dict]]:
+        """Индексирует по символу ответ /v5/market/tickers без параметра symbol."""
+        if data and data.get('retCode') == 0:
+            return {item['symbol']: item for item in data.get('result', {}).get('list', []) if 'symbol' in item}
+        return None
+
+    @staticmethod
+    def _kline_params(symbol: str, interval: str, limit: int,
+                      start_time: Optional[int], end_time: Optional[int]) -> Dict[str, Any]:
+        """Формирует параметры запроса /v5/market/kline."""
         params = {
             'category': 'spot',
             'symbol': symbol,
@@ -226,9 +869,11 @@ class BybitSpotClient(BaseAPIClient):
             params['start'] = start_time
         if end_time:
             params['end'] = end_time
+        return params
 
-        data = self._make_request('/v5/market/kline', params)
-
+    @staticmethod
+    def _parse_klines(data: Optional[Dict]) -> Optional[List]:
+        """Извлекает свечи из ответа /v5/market/kline."""
         if data and data.get('retCode') == 0:
             klines = data.get('result', {}).get('list', [])
             # Bybit возвращает свечи в обратном порядке
@@ -236,608 +881,1805 @@ class BybitSpotClient(BaseAPIClient):
         return None
 
 
-class MarketDataProcessor:
-    """Процессор для обработки рыночных данных."""
+class AsyncBaseAPIClient:
+    """
+    Базовый класс для асинхронных API клиентов.
 
-    def __init__(self):
-        self.binance_client = BinanceSpotClient()
-        self.bybit_client = BybitSpotClient()
+    Один клиент держит один пул keep-alive соединений к бирже и ограничивает
+    число одновременных запросов к ней.
+    """
 
-    def get_spot_data_binance(self, symbol: str, prev_time: datetime) -> Tuple[
-        Optional[SpotMarketData], Optional[SpotMarketData]]:
+    def __init__(self, base_url: str, max_concurrency: int = 5, exchange_name: str = ''):
+        self.base_url = base_url
+        self.exchange_name = exchange_name
+        self.max_concurrency = max_concurrency
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self.guard = RequestGuard(exchange_name)
+        # Тикеры всех символов биржи на время тика: {символ: тикер}
+        self.ticker_snapshot: Optional[Dict[str, Dict]] = None
+
+    def _snapshot_ticker(self, symbol: str) -> Optional[Dict]:
+        """Возвращает тикер из снимка тика; символа нет в снимке - пары нет на бирже."""
+        PIPELINE_METRICS.inc('ticker_snapshot_hits', self.exchange_name)
+        return self.ticker_snapshot.get(symbol)
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        """Возвращает HTTP сессию, создавая ее в текущем event loop при первом вызове."""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit_per_host=self.max_concurrency, keepalive_timeout=60,
+                                             ttl_dns_cache=300)
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                headers={'User-Agent': USER_AGENT},
+                timeout=aiohttp.ClientTimeout(total=10)
+            )
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._session
+
+    async def close(self) -> None:
+        """Закрывает HTTP сессию."""
+        if self._session and not self._session.closed:
+            await self._session.close()
+
+    async def _before_request(self, weight: int) -> None:
+        """Вызывается перед каждым запросом; наследники ждут здесь восстановления лимитов."""
+
+    def _after_response(self, response: aiohttp.ClientResponse) -> None:
+        """Вызывается для каждого ответа; наследники читают здесь заголовки лимитов."""
+
+    @staticmethod
+    def _is_throttled(data: Any) -> bool:
+        """Проверяет, сообщает ли тело успешного ответа об ограничении частоты."""
+        return False
+
+    async def _make_request(self, endpoint: str, params: Optional[Dict] = None,
+                            weight: int = 1) -> Optional[Dict]:
         """
-        Получает текущие и предыдущие спотовые данные с Binance.
+        Выполняет HTTP запрос к API с повторами (см. RequestGuard).
 
         Args:
-            symbol: Торговый символ
-            prev_time: Время для получения предыдущих данных
+            endpoint: Конечная точка API
+            params: Параметры запроса
+            weight: Вес запроса в лимитах биржи
 
         Returns:
-            Кортеж (текущие_данные, предыдущие_данные)
+            Ответ API в виде словаря или None при ошибке
         """
-        try:
-            # Получаем текущие данные
-            ticker = self.binance_client.get_24hr_ticker(symbol)
-            if not ticker:
-                return None, None
-
-            # Получаем часовые свечи для расчета объемов
-            now = datetime.now(timezone.utc)
-            hour_ago = now - timedelta(hours=1)
+        url = self.base_url + endpoint
+        session = self._get_session()
+        for attempt in range(1, HTTP_RETRY_ATTEMPTS + 1):
+            if not self.guard.allow():
+                return None
+            # Задержку перед повтором ждем, не занимая слот параллельности
+            async with self._semaphore:
+                await self._before_request(weight)
+                PIPELINE_METRICS.inc('requests', self.exchange_name)
+                try:
+                    with PIPELINE_METRICS.span('exchange_request', self.exchange_name):
+                        async with session.get(url, params=params) as response:
+                            self._after_response(response)
+                            status = response.status
+                            if status == 400:
+                                # Не логируем 400 ошибки подробно - это нормально для отсутствующих пар
+                                PIPELINE_METRICS.inc('not_found', self.exchange_name)
+                                self.guard.record_success()
+                                return None
+                            if status < 400:
+                                data = await response.json(content_type=None)
+                                if not self._is_throttled(data):
+                                    self.guard.record_success()
+                                    return data
+                                status = 429
+                            delay = self.guard.on_error(url, attempt, status, response.headers.get('Retry-After'))
+                except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+                    delay = self.guard.on_error(url, attempt, error=e)
+            if delay is None:
+                return None
+            await asyncio.sleep(delay)
+        return None
 
-            # Текущий часовой объем
-            hour_klines = self.binance_client.get_klines(
-                symbol, '1h', limit=1
-            )
 
-            current_data = SpotMarketData(
-                capture_time=now,
-                price=Decimal(ticker['lastPrice']),
-                vol_1h=Decimal(hour_klines[0][5]) if hour_klines else None,  # Base volume
-                quote_vol_1h=Decimal(hour_klines[0][7]) if hour_klines else None,  # Quote volume
-                vol_24h=Decimal(ticker['volume']),
-                quote_vol_24h=Decimal(ticker['quoteVolume'])
-            )
+class AsyncBinanceSpotClient(AsyncBaseAPIClient):
+    """
+    Асинхронный клиент спотового API Binance.
 
-            # Получаем данные на момент prev_time
-            prev_timestamp = int(prev_time.timestamp() * 1000)
-            prev_klines = self.binance_client.get_klines(
-                symbol, '1m', limit=1,
-                start_time=prev_timestamp,
-                end_time=prev_timestamp + 60000
-            )
+    Учитывает вес запросов: перед отправкой резервирует вес в текущем минутном
+    окне, а после ответа сверяется с заголовком X-MBX-USED-WEIGHT-1M.
+    """
 
-            if not prev_klines:
-                return current_data, None
+    TICKER_WEIGHT = 2
+    ALL_TICKERS_WEIGHT = 80
+    KLINES_WEIGHT = 2
 
-            # Получаем часовой объем на момент prev_time
-            prev_hour_start = prev_time - timedelta(hours=1)
-            prev_hour_klines = self.binance_client.get_klines(
-                symbol, '1h', limit=1,
-                start_time=int(prev_hour_start.timestamp() * 1000)
-            )
+    def __init__(self):
+        super().__init__(BINANCE_SPOT_API_URL, BINANCE_MAX_CONCURRENCY, EXCHANGE_NAMES[BINANCE_EXCHANGE_ID])
+        self._weight_budget = int(BINANCE_WEIGHT_LIMIT * BINANCE_WEIGHT_SAFETY)
+        self._weight_window = 0
+        self._used_weight = 0
 
-            # Получаем 24h объем на момент prev_time
-            prev_24h_start = prev_time - timedelta(hours=24)
-            prev_24h_klines = self.binance_client.get_klines(
-                symbol, '1h', limit=24,
-                start_time=int(prev_24h_start.timestamp() * 1000),
-                end_time=prev_timestamp
-            )
+    async def get_24hr_ticker(self, symbol: str) -> Optional[Dict]:
+        """
+        Получает 24-часовую статистику по символу.
 
-            prev_vol_24h = sum(Decimal(k[5]) for k in prev_24h_klines) if prev_24h_klines else None
-            prev_quote_vol_24h = sum(Decimal(k[7]) for k in prev_24h_klines) if prev_24h_klines else None
+        Args:
+            symbol: Торговый символ (например, BTCUSDT)
 
-            prev_data = SpotMarketData(
-                capture_time=prev_time,
-                price=Decimal(prev_klines[0][4]),  # Close price
-                vol_1h=Decimal(prev_hour_klines[0][5]) if prev_hour_klines else None,
-                quote_vol_1h=Decimal(prev_hour_klines[0][7]) if prev_hour_klines else None,
-                vol_24h=prev_vol_24h,
-                quote_vol_24h=prev_quote_vol_24h
-            )
+        Returns:
+            Словарь с данными тикера или None
+        """
+        if self.ticker_snapshot is not None:
+            return self._snapshot_ticker(symbol)
+        data = await self._make_request('/api/v3/ticker/24hr', {'symbol': symbol}, self.TICKER_WEIGHT)
+        return BinanceSpotClient._parse_ticker(data)
 
-            return current_data, prev_data
+    async def get_all_tickers(self) -> Optional[Dict[str, Dict]]:
+        """
+        Получает 24-часовую статистику по всем символам одним запросом.
 
-        except Exception as e:
-            print(f"Error getting Binance spot data for {symbol}: {e}", file=sys.stderr)
-            return None, None
+        Returns:
+            Словарь {символ: тикер} или None
+        """
+        data = await self._make_request('/api/v3/ticker/24hr', None, self.ALL_TICKERS_WEIGHT)
+        return BinanceSpotClient._parse_all_tickers(data)
 
-    def get_spot_data_bybit(self, symbol: str, prev_time: datetime) -> Tuple[
-        Optional[SpotMarketData], Optional[SpotMarketData]]:
+    async def get_klines(self, symbol: str, interval: str, limit: int = 500,
+                         start_time: Optional[int] = None, end_time: Optional[int] = None) -> Optional[List]:
         """
-        Получает текущие и предыдущие спотовые данные с Bybit.
+        Получает данные свечей.
 
         Args:
             symbol: Торговый символ
-            prev_time: Время для получения предыдущих данных
+            interval: Интервал свечей (1m, 1h, 1d и т.д.)
+            limit: Количество свечей
+            start_time: Начальное время в миллисекундах
+            end_time: Конечное время в миллисекундах
 
         Returns:
-            Кортеж (текущие_данные, предыдущие_данные)
+            Список свечей или None
         """
-        try:
-            # Получаем текущие данные
-            ticker = self.bybit_client.get_24hr_ticker(symbol)
-            if not ticker:
-                return None, None
-
-            now = datetime.now(timezone.utc)
-
-            # Получаем часовые свечи для расчета объемов
-            hour_klines = self.bybit_client.get_klines(
-                symbol, '60', limit=1
-            )
-
-            current_data = SpotMarketData(
-                capture_time=now,
-                price=Decimal(ticker['lastPrice']),
-                vol_1h=Decimal(hour_klines[-1][5]) if hour_klines else None,
-                quote_vol_1h=Decimal(hour_klines[-1][6]) if hour_klines else None,
-                vol_24h=Decimal(ticker['volume24h']),
-                quote_vol_24h=Decimal(ticker['turnover24h'])
-            )
+        params = BinanceSpotClient._kline_params(symbol, interval, limit, start_time, end_time)
+        data = await self._make_request('/api/v3/klines', params, self.KLINES_WEIGHT)
+        return BinanceSpotClient._parse_klines(data)
 
-            # Получаем данные на момент prev_time
-            prev_timestamp = int(prev_time.timestamp() * 1000)
-            prev_klines = self.bybit_client.get_klines(
-                symbol, '1', limit=1,
-                start_time=prev_timestamp,
-                end_time=prev_timestamp + 60000
-            )
-
-            if not prev_klines:
-                return current_data, None
+    async def _before_request(self, weight: int) -> None:
+        while True:
+            window = int(time.time() // 60)
+            if window != self._weight_window:
+                self._weight_window = window
+                self._used_weight = 0
+            if self._used_weight + weight <= self._weight_budget:
+                self._used_weight += weight
+                return
+            wait = (window + 1) * 60 - time.time()
+            print(f"Binance: израсходовано {self._used_weight}/{BINANCE_WEIGHT_LIMIT} веса, "
+                  f"ожидание {wait:.1f} сек", file=sys.stderr)
+            await asyncio.sleep(wait)
+
+    def _after_response(self, response: aiohttp.ClientResponse) -> None:
+        used_weight = response.headers.get('X-MBX-USED-WEIGHT-1M')
+        if used_weight and used_weight.isdigit():
+            window = int(time.time() // 60)
+            if window != self._weight_window:
+                self._weight_window = window
+                self._used_weight = 0
+            # Заголовок учитывает и чужие запросы с этого IP, резерв - наши незавершенные
+            self._used_weight = max(self._used_weight, int(used_weight))
+
+
+class AsyncBybitSpotClient(AsyncBaseAPIClient):
+    """
+    Асинхронный клиент спотового API Bybit.
+
+    При исчерпании лимита (X-Bapi-Limit-Status = 0) ждет до
+    X-Bapi-Limit-Reset-Timestamp.
+    """
 
-            # Получаем объемы на момент prev_time
-            prev_hour_start = prev_time - timedelta(hours=1)
-            prev_hour_klines = self.bybit_client.get_klines(
-                symbol, '60', limit=1,
-                start_time=int(prev_hour_start.timestamp() * 1000)
-            )
+    def __init__(self):
+        super().__init__(BYBIT_API_URL, BYBIT_MAX_CONCURRENCY, EXCHANGE_NAMES[BYBIT_EXCHANGE_ID])
+        self._blocked_until = 0.0
 
-            # Для 24h объема суммируем часовые свечи
-            prev_24h_start = prev_time - timedelta(hours=24)
-            prev_24h_klines = self.bybit_client.get_klines(
-                symbol, '60', limit=24,
-                start_time=int(prev_24h_start.timestamp() * 1000),
-                end_time=prev_timestamp
-            )
+    async def get_24hr_ticker(self, symbol: str) -> Optional[Dict]:
+        """
+        Получает 24-часовую статистику по символу.
 
-            prev_vol_24h = sum(Decimal(k[5]) for k in prev_24h_klines) if prev_24h_klines else None
-            prev_quote_vol_24h = sum(Decimal(k[6]) for k in prev_24h_klines) if prev_24h_klines else None
+        Args:
+            symbol: Торговый символ
 
-            prev_data = SpotMarketData(
-                capture_time=prev_time,
-                price=Decimal(prev_klines[-1][4]),
-                vol_1h=Decimal(prev_hour_klines[-1][5]) if prev_hour_klines else None,
-                quote_vol_1h=Decimal(prev_hour_klines[-1][6]) if prev_hour_klines else None,
-                vol_24h=prev_vol_24h,
-                quote_vol_24h=prev_quote_vol_24h
-            )
+        Returns:
+            Словарь с данными тикера или None
+        """
+        if self.ticker_snapshot is not None:
+            return self._snapshot_ticker(symbol)
+        data = await self._make_request('/v5/market/tickers', {
+            'category': 'spot',
+            'symbol': symbol
+        })
+        return BybitSpotClient._parse_ticker(data)
 
-            return current_data, prev_data
+    async def get_all_tickers(self) -> Optional[Dict[str, Dict]]:
+        """
+        Получает 24-часовую статистику по всем спотовым символам одним запросом.
 
-        except Exception as e:
-            print(f"Error getting Bybit spot data for {symbol}: {e}", file=sys.stderr)
-            return None, None
+        Returns:
+            Словарь {символ: тикер} или None
+        """
+        data = await self._make_request('/v5/market/tickers', {'category': 'spot'})
+        return BybitSpotClient._parse_all_tickers(data)
 
-    def get_price_statistics(self, base_asset: str, quote_asset: str = 'USDT',
-                             available_pairs: Set[Tuple[int, str]] = None) -> Optional[PriceStats]:
+    async def get_klines(self, symbol: str, interval: str, limit: int = 200,
+                         start_time: Optional[int] = None, end_time: Optional[int] = None) -> Optional[List]:
         """
-        Получает статистику цен для пары.
+        Получает данные свечей.
 
         Args:
-            base_asset: Базовый актив
-            quote_asset: Котируемый актив
-            available_pairs: Доступные торговые пары
+            symbol: Торговый символ
+            interval: Интервал свечей
+            limit: Количество свечей
+            start_time: Начальное время в миллисекундах
+            end_time: Конечное время в миллисекундах
 
         Returns:
-            Объект PriceStats или None
+            Список свечей или None
         """
-        symbol = f"{base_asset}{quote_asset}"
+        params = BybitSpotClient._kline_params(symbol, interval, limit, start_time, end_time)
+        data = await self._make_request('/v5/market/kline', params)
+        return BybitSpotClient._parse_klines(data)
 
-        # Проверяем доступность на биржах
-        binance_available = available_pairs and (BINANCE_EXCHANGE_ID, symbol) in available_pairs
-        bybit_available = available_pairs and (BYBIT_EXCHANGE_ID, symbol) in available_pairs
+    _is_throttled = staticmethod(BybitSpotClient._is_throttled)
 
-        # Сначала пробуем Binance, если пара доступна
-        if binance_available:
-            print(f"  Получение статистики с Binance для {symbol}...")
-            stats = self._get_price_stats_binance(symbol)
-            if stats:
-                return stats
+    async def _before_request(self, weight: int) -> None:
+        wait = self._blocked_until - time.time()
+        if wait > 0:
+            print(f"Bybit: лимит запросов исчерпан, ожидание {wait:.1f} сек", file=sys.stderr)
+            await asyncio.sleep(wait)
 
-        # Если не получилось или не доступна на Binance, пробуем Bybit
-        if bybit_available:
-            print(f"  Получение статистики с Bybit для {symbol}...")
-            return self._get_price_stats_bybit(symbol)
+    def _after_response(self, response: aiohttp.ClientResponse) -> None:
+        remaining = response.headers.get('X-Bapi-Limit-Status')
+        reset_at = response.headers.get('X-Bapi-Limit-Reset-Timestamp')
+        if remaining == '0' and reset_at and reset_at.isdigit():
+            self._blocked_until = max(self._blocked_until, int(reset_at) / 1000)
 
-        print(f"  ⚠️ Пара {symbol} не доступна ни на одной бирже для получения статистики")
-        return None
 
-    def _get_price_stats_binance(self, symbol: str) -> Optional[PriceStats]:
-        """Получает статистику цен с Binance."""
-        try:
-            now = datetime.now(timezone.utc)
+class LiveStateClient:
+    """
+    Клиент локального API состояния сборщика get_trading_data.py.
 
-            # Получаем свечи за разные периоды
-            klines_1m = self.binance_client.get_klines(symbol, '1m', limit=60)  # 1 час
-            klines_1h = self.binance_client.get_klines(symbol, '1h', limit=24)  # 24 часа
-            klines_1d = self.binance_client.get_klines(symbol, '1d', limit=30)  # 30 дней
+    Сборщик держит актуальные цены и объемы всех спотовых пар из WebSocket
+    потоков. Снимок запрашивается одним запросом на тик; пары, данные которых
+    старше max_age секунд, не возвращаются и берутся через REST.
+    """
 
-            if not all([klines_1m, klines_1h, klines_1d]):
-                return None
+    def __init__(self, url: str, max_age: float):
+        self.url = url.rstrip('/')
+        self.max_age = max_age
+        self.session = requests.Session()
 
-            # Расчет минимумов и максимумов
-            stats = PriceStats()
+    def get_spot_snapshot(self, pairs: Set[Tuple[int, str]]) -> Dict[Tuple[int, str], SpotMarketData]:
+        """
+        Получает текущие спотовые данные пар из сборщика.
 
-            # 1 час
-            prices_1h = [Decimal(k[2]) for k in klines_1m]  # High prices
-            lows_1h = [Decimal(k[3]) for k in klines_1m]  # Low prices
-            stats.price_max_1h = max(prices_1h)
-            stats.price_min_1h = min(lows_1h)
+        Args:
+            pairs: Множество кортежей (exchange_id, pair_symbol)
 
-            # 24 часа
-            prices_24h = [Decimal(k[2]) for k in klines_1h]
-            lows_24h = [Decimal(k[3]) for k in klines_1h]
-            stats.price_max_24h = max(prices_24h)
-            stats.price_min_24h = min(lows_24h)
+        Returns:
+            Словарь {(exchange_id, pair_symbol): SpotMarketData} только для свежих пар
+        """
+        if not self.url or not pairs:
+            return {}
 
-            # 7 дней
-            klines_7d = klines_1d[-7:]
-            prices_7d = [Decimal(k[2]) for k in klines_7d]
-            lows_7d = [Decimal(k[3]) for k in klines_7d]
-            stats.price_max_7d = max(prices_7d)
-            stats.price_min_7d = min(lows_7d)
+        market_keys = {f"{EXCHANGE_NAMES[exchange_id].upper()}:{symbol}": (exchange_id, symbol)
+                       for exchange_id, symbol in pairs}
+        try:
+            response = self.session.get(f"{self.url}/spot", params={'keys': ','.join(market_keys)},
+                                        timeout=LIVE_STATE_TIMEOUT)
+            response.raise_for_status()
+            data = response.json(parse_float=Decimal)
+        except (requests.exceptions.RequestException, ValueError) as e:
+            print(f"Live state API unavailable, using REST: {e}", file=sys.stderr)
+            return {}
 
-            # 30 дней
-            prices_30d = [Decimal(k[2]) for k in klines_1d]
-            lows_30d = [Decimal(k[3]) for k in klines_1d]
-            stats.price_max_30d = max(prices_30d)
-            stats.price_min_30d = min(lows_30d)
+        # Неполный или поврежденный ответ отбрасывается целиком - все пары уйдут в REST
+        try:
+            server_now = float(data['now'])
+            snapshot = {}
+            for market_key, state in data.get('spot', {}).items():
+                pair = market_keys.get(market_key)
+                updated_at = float(state['updated_at'])
+                if not pair or server_now - updated_at > self.max_age:
+                    continue
+                snapshot[pair] = SpotMarketData(
+                    capture_time=datetime.fromtimestamp(updated_at, tz=timezone.utc),
+                    price=Decimal(state['price']),
+                    vol_1h=Decimal(state['volume_1h']),
+                    quote_vol_1h=Decimal(state['quote_volume_1h']),
+                    vol_24h=Decimal(state['volume_24h']),
+                    quote_vol_24h=Decimal(state['quote_volume_24h'])
+                )
+        except (KeyError, TypeError, ValueError, AttributeError, InvalidOperation) as e:
+            print(f"Malformed live state response, using REST: {e!r}", file=sys.stderr)
+            return {}
+        return snapshot
+
+
+class KlineCache:
+    """
+    Общий кэш свечей в памяти процесса.
+
+    Свечи хранятся по ключу (биржа, символ, интервал) и времени открытия.
+    Свеча, полученная после своего закрытия, не устаревает никогда;
+    формирующаяся свеча живет KLINE_CACHE_FORMING_TTL секунд. Если в кэше не
+    хватает только последних свечей окна, запрашиваются лишь они.
+    """
+
+    def __init__(self, forming_ttl: float = None, max_series: int = None, series_candles: int = None):
+        self.forming_ttl = KLINE_CACHE_FORMING_TTL if forming_ttl is None else forming_ttl
+        self.max_series = max_series or KLINE_CACHE_MAX_SERIES
+        self.series_candles = series_candles or KLINE_CACHE_SERIES_CANDLES
+        # (exchange_id, symbol, interval) -> {open_time_ms: (kline, fetched_at_ms)}
+        self._series: "OrderedDict[Tuple[int, str, str], Dict[int, Tuple[List, int]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.partial_hits = 0
+        self.misses = 0
 
-            # Расчет процентных изменений
-            current_price = Decimal(klines_1m[-1][4])  # Последняя цена закрытия
+    @staticmethod
+    def _expected_open_times(exchange_id: int, interval_ms: int, now_ms: int, limit: int,
+                             start_time: Optional[int], end_time: Optional[int]) -> List[int]:
+        """
+        Вычисляет времена открытия свечей, которые вернет биржа на запрос.
 
-            # 24h изменение
-            price_24h_ago = Decimal(klines_1h[0][1])  # Цена открытия 24 часа назад
-            stats.percent_change_24h = ((current_price - price_24h_ago) / price_24h_ago * 100).quantize(Decimal('0.01'))
+        Binance отдает первые limit свечей после start_time, Bybit - последние
+        limit свечей интервала [start, end].
+        """
+        last_open = now_ms // interval_ms * interval_ms
+        if end_time:
+            last_open = min(last_open, end_time // interval_ms * interval_ms)
+        if start_time:
+            first_open = -(-start_time // interval_ms) * interval_ms
+            if exchange_id == BINANCE_EXCHANGE_ID:
+                last_open = min(last_open, first_open + (limit - 1) * interval_ms)
+            else:
+                first_open = max(first_open, last_open - (limit - 1) * interval_ms)
+        else:
+            first_open = last_open - (limit - 1) * interval_ms
+        return list(range(first_open, last_open + 1, interval_ms))
+
+    def lookup(self, exchange_id: int, symbol: str, params: Dict[str, Any]) -> Tuple[
+        Optional[List], Optional[Dict[str, Any]]]:
+        """
+        Ищет свечи запроса в кэше.
 
-            # 7d изменение
-            price_7d_ago = Decimal(klines_7d[0][1])
-            stats.percent_change_7d = ((current_price - price_7d_ago) / price_7d_ago * 100).quantize(Decimal('0.01'))
+        Args:
+            exchange_id: ID биржи
+            symbol: Торговый символ
+            params: Параметры get_klines
 
-            # 30d изменение
-            price_30d_ago = Decimal(klines_1d[0][1])
-            stats.percent_change_30d = ((current_price - price_30d_ago) / price_30d_ago * 100).quantize(Decimal('0.01'))
+        Returns:
+            (свечи, None) при полном попадании, иначе (None, параметры_запроса)
+        """
+        interval_ms = KLINE_INTERVAL_MS.get(params['interval'])
+        if not interval_ms:
+            return None, params
+
+        now_ms = int(time.time() * 1000)
+        opens = self._expected_open_times(exchange_id, interval_ms, now_ms, params.get('limit', 500),
+                                          params.get('start_time'), params.get('end_time'))
+        forming_ttl_ms = self.forming_ttl * 1000
+
+        current_open = now_ms // interval_ms * interval_ms
+        key = (exchange_id, symbol, params['interval'])
+        with self._lock:
+            series = self._series.get(key)
+            if series is None or not opens:
+                self.misses += 1
+                PIPELINE_METRICS.inc('kline_cache_misses', EXCHANGE_NAMES[exchange_id])
+                return None, params
+            # Серия использована - вытеснение идет с давно не запрашиваемых
+            self._series.move_to_end(key)
+
+            result = []
+            for open_time in opens:
+                entry = series.get(open_time)
+                if entry is None:
+                    break
+                kline, fetched_at = entry
+                closed_when_fetched = fetched_at >= open_time + interval_ms + KLINE_CLOSE_GRACE_MS
+                if not closed_when_fetched and now_ms - fetched_at > forming_ttl_ms:
+                    break
+                result.append(kline)
+
+            if len(result) == len(opens):
+                self.hits += 1
+                PIPELINE_METRICS.inc('kline_cache_hits', EXCHANGE_NAMES[exchange_id])
+                return result, None
+
+            # Не хватает только хвоста окна, которое заканчивается текущей свечой
+            if result and opens[-1] == current_open:
+                self.partial_hits += 1
+                PIPELINE_METRICS.inc('kline_cache_partial_hits', EXCHANGE_NAMES[exchange_id])
+                return None, {'interval': params['interval'], 'limit': len(opens) - len(result)}
+
+            self.misses += 1
+            PIPELINE_METRICS.inc('kline_cache_misses', EXCHANGE_NAMES[exchange_id])
+            return None, params
+
+    def store(self, exchange_id: int, symbol: str, params: Dict[str, Any], fetch_params: Dict[str, Any],
+              data: Optional[List]) -> Optional[List]:
+        """
+        Сохраняет полученные свечи и собирает ответ на исходный запрос.
 
-            return stats
+        Args:
+            exchange_id: ID биржи
+            symbol: Торговый символ
+            params: Исходные параметры get_klines
+            fetch_params: Параметры, с которыми реально выполнен запрос
+            data: Ответ биржи
 
-        except Exception as e:
-            print(f"Error getting price statistics from Binance for {symbol}: {e}", file=sys.stderr)
-            return None
+        Returns:
+            Свечи исходного запроса или None, если собрать их из кэша не удалось
+        """
+        interval_ms = KLINE_INTERVAL_MS.get(params['interval'])
+        if not interval_ms:
+            return data
 
-    def _get_price_stats_bybit(self, symbol: str) -> Optional[PriceStats]:
-        """Получает статистику цен с Bybit."""
-        try:
-            now = datetime.now(timezone.utc)
+        key = (exchange_id, symbol, params['interval'])
+        now_ms = int(time.time() * 1000)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = {}
+                while len(self._series) > self.max_series:
+                    self._series.popitem(last=False)
+            self._series.move_to_end(key)
+
+            for kline in data or ():
+                series[int(kline[0])] = (kline, now_ms)
+            if len(series) > self.series_candles:
+                for open_time in sorted(series)[:len(series) - self.series_candles]:
+                    del series[open_time]
+
+            if fetch_params is params:
+                return data
+
+            opens = self._expected_open_times(exchange_id, interval_ms, now_ms, params.get('limit', 500),
+                                              params.get('start_time'), params.get('end_time'))
+            if not all(open_time in series for open_time in opens):
+                return None
+            return [series[open_time][0] for open_time in opens]
 
-            # Получаем свечи за разные периоды
-            klines_1m = self.bybit_client.get_klines(symbol, '1', limit=60)  # 1 час
-            klines_1h = self.bybit_client.get_klines(symbol, '60', limit=24)  # 24 часа
-            klines_1d = self.bybit_client.get_klines(symbol, 'D', limit=30)  # 30 дней
+    def stats(self) -> Dict[str, int]:
+        """Возвращает счетчики попаданий и размер кэша."""
+        with self._lock:
+            candles = sum(len(series) for series in self._series.values())
+            return {'hits': self.hits, 'partial_hits': self.partial_hits, 'misses': self.misses,
+                    'series': len(self._series), 'candles': candles}
 
-            if not all([klines_1m, klines_1h, klines_1d]):
-                return None
 
-            # Расчет минимумов и максимумов
-            stats = PriceStats()
+class MarketDataProcessor:
+    """Процессор для обработки рыночных данных."""
+
+    def __init__(self, kline_cache: Optional[KlineCache] = None):
+        self.binance_client = BinanceSpotClient()
+        self.bybit_client = BybitSpotClient()
+        self.clients = {
+            BINANCE_EXCHANGE_ID: self.binance_client,
+            BYBIT_EXCHANGE_ID: self.bybit_client,
+        }
+        self.kline_cache = kline_cache or KlineCache()
+
+    def _get_klines(self, exchange_id: int, symbol: str, **params) -> Optional[List]:
+        """
+        Получает свечи через кэш.
+
+        Args:
+            exchange_id: ID биржи
+            symbol: Торговый символ
+            **params: Параметры get_klines
+
+        Returns:
+            Список свечей или None
+        """
+        client = self.clients[exchange_id]
+        cached, fetch_params = self.kline_cache.lookup(exchange_id, symbol, params)
+        if fetch_params is None:
+            return cached
+
+        data = client.get_klines(symbol, **fetch_params)
+        result = self.kline_cache.store(exchange_id, symbol, params, fetch_params, data)
+        if result is None and fetch_params is not params:
+            # Хвост не состыковался с кэшем - запрашиваем окно целиком
+            data = client.get_klines(symbol, **params)
+            result = self.kline_cache.store(exchange_id, symbol, params, params, data)
+        return result
+
+    def get_spot_data_binance(self, symbol: str, prev_time: datetime) -> Tuple[
+        Optional[SpotMarketData], Optional[SpotMarketData]]:
+        """
+        Получает текущие и предыдущие спотовые данные с Binance.
+
+        Args:
+            symbol: Торговый символ
+            prev_time: Время для получения предыдущих данных
+
+        Returns:
+            Кортеж (текущие_данные, предыдущие_данные)
+        """
+        return self.get_spot_data(BINANCE_EXCHANGE_ID, symbol, prev_time)
+
+    def get_spot_data_bybit(self, symbol: str, prev_time: datetime) -> Tuple[
+        Optional[SpotMarketData], Optional[SpotMarketData]]:
+        """
+        Получает текущие и предыдущие спотовые данные с Bybit.
+
+        Args:
+            symbol: Торговый символ
+            prev_time: Время для получения предыдущих данных
+
+        Returns:
+            Кортеж (текущие_данные, предыдущие_данные)
+        """
+        return self.get_spot_data(BYBIT_EXCHANGE_ID, symbol, prev_time)
+
+    def get_spot_data(self, exchange_id: int, symbol: str, prev_time: datetime,
+                      live_now: Optional[SpotMarketData] = None,
+                      stored_prev: Optional[SpotMarketData] = None) -> Tuple[
+        Optional[SpotMarketData], Optional[SpotMarketData]]:
+        """
+        Получает текущие и предыдущие спотовые данные с биржи.
+
+        Args:
+            exchange_id: ID биржи
+            symbol: Торговый символ
+            prev_time: Время для получения предыдущих данных
+            live_now: Свежие текущие данные из сборщика; если заданы, тикер не запрашивается
+            stored_prev: Предыдущие данные из spot_data; если заданы, свечи prev_time не запрашиваются
+
+        Returns:
+            Кортеж (текущие_данные, предыдущие_данные)
+        """
+        client = self.clients[exchange_id]
+        try:
+            kline_requests = self._spot_kline_requests(exchange_id, prev_time)
+
+            if live_now:
+                current_data = live_now
+            else:
+                # Получаем текущие данные
+                ticker = client.get_24hr_ticker(symbol)
+                if not ticker:
+                    return None, None
+                now = datetime.now(timezone.utc)
+                hour_klines = self._get_klines(exchange_id, symbol, **kline_requests['hour'])
+                current_data = self._build_current_spot_data(exchange_id, now, ticker, hour_klines)
+
+            if stored_prev:
+                return current_data, stored_prev
+
+            klines = {'prev': self._get_klines(exchange_id, symbol, **kline_requests['prev'])}
+            # Объемы на момент prev_time нужны, только если есть свеча prev_time
+            if klines['prev']:
+                klines['prev_hour'] = self._get_klines(exchange_id, symbol, **kline_requests['prev_hour'])
+                klines['prev_24h'] = self._get_klines(exchange_id, symbol, **kline_requests['prev_24h'])
+
+            return current_data, self._build_prev_spot_data(exchange_id, prev_time, klines)
+
+        except Exception as e:
+            print(f"Error getting {EXCHANGE_NAMES[exchange_id]} spot data for {symbol}: {e}", file=sys.stderr)
+            return None, None
+
+    @staticmethod
+    def _spot_kline_requests(exchange_id: int, prev_time: datetime) -> Dict[str, Dict[str, Any]]:
+        """
+        Формирует параметры запросов свечей для спотовых данных.
+
+        Args:
+            exchange_id: ID биржи
+            prev_time: Время для получения предыдущих данных
+
+        Returns:
+            Словарь {имя_запроса: параметры get_klines}
+        """
+        fmt = EXCHANGE_FORMATS[exchange_id]
+        prev_timestamp = int(prev_time.timestamp() * 1000)
+        prev_hour_start = prev_time - timedelta(hours=1)
+        prev_24h_start = prev_time - timedelta(hours=24)
+        return {
+            # Текущий часовой объем
+            'hour': {'interval': fmt['interval_1h'], 'limit': 1},
+            # Минутная свеча на момент prev_time
+            'prev': {'interval': fmt['interval_1m'], 'limit': 1,
+                     'start_time': prev_timestamp, 'end_time': prev_timestamp + 60000},
+            # Часовой объем на момент prev_time
+            'prev_hour': {'interval': fmt['interval_1h'], 'limit': 1,
+                          'start_time': int(prev_hour_start.timestamp() * 1000)},
+            # 24h объем на момент prev_time
+            'prev_24h': {'interval': fmt['interval_1h'], 'limit': 24,
+                         'start_time': int(prev_24h_start.timestamp() * 1000), 'end_time': prev_timestamp},
+        }
+
+    @staticmethod
+    def _build_current_spot_data(exchange_id: int, now: datetime, ticker: Dict,
+                                 hour_klines: Optional[List]) -> SpotMarketData:
+        """
+        Собирает текущие спотовые данные из ответов биржи.
+
+        Args:
+            exchange_id: ID биржи
+            now: Время получения данных
+            ticker: 24-часовой тикер
+            hour_klines: Текущая часовая свеча
+
+        Returns:
+            Объект SpotMarketData
+        """
+        fmt = EXCHANGE_FORMATS[exchange_id]
+        quote_idx = fmt['quote_volume_idx']
+        return SpotMarketData(
+            capture_time=now,
+            price=Decimal(ticker['lastPrice']),
+            vol_1h=Decimal(hour_klines[-1][5]) if hour_klines else None,  # Base volume
+            quote_vol_1h=Decimal(hour_klines[-1][quote_idx]) if hour_klines else None,  # Quote volume
+            vol_24h=Decimal(ticker[fmt['volume_key']]),
+            quote_vol_24h=Decimal(ticker[fmt['quote_volume_key']])
+        )
+
+    @staticmethod
+    def _build_prev_spot_data(exchange_id: int, prev_time: datetime,
+                              klines: Dict[str, Optional[List]]) -> Optional[SpotMarketData]:
+        """
+        Собирает спотовые данные на момент prev_time из свечей.
+
+        Args:
+            exchange_id: ID биржи
+            prev_time: Время предыдущих данных
+            klines: Ответы на запросы prev, prev_hour, prev_24h из _spot_kline_requests
+
+        Returns:
+            Объект SpotMarketData или None, если нет свечи prev_time
+        """
+        prev_klines = klines.get('prev')
+        if not prev_klines:
+            return None
+
+        quote_idx = EXCHANGE_FORMATS[exchange_id]['quote_volume_idx']
+        prev_hour_klines = klines.get('prev_hour')
+        prev_24h_klines = klines.get('prev_24h')
+        prev_vol_24h = sum(Decimal(k[5]) for k in prev_24h_klines) if prev_24h_klines else None
+        prev_quote_vol_24h = sum(Decimal(k[quote_idx]) for k in prev_24h_klines) if prev_24h_klines else None
+
+        return SpotMarketData(
+            capture_time=prev_time,
+            price=Decimal(prev_klines[-1][4]),  # Close price
+            vol_1h=Decimal(prev_hour_klines[-1][5]) if prev_hour_klines else None,
+            quote_vol_1h=Decimal(prev_hour_klines[-1][quote_idx]) if prev_hour_klines else None,
+            vol_24h=prev_vol_24h,
+            quote_vol_24h=prev_quote_vol_24h
+        )
+
+    def get_price_statistics(self, base_asset: str, quote_asset: str = 'USDT',
+                             available_pairs: Set[Tuple[int, str]] = None) -> Optional[PriceStats]:
+        """
+        Получает статистику цен для пары.
+
+        Args:
+            base_asset: Базовый актив
+            quote_asset: Котируемый актив
+            available_pairs: Доступные торговые пары
+
+        Returns:
+            Объект PriceStats или None
+        """
+        symbol = f"{base_asset}{quote_asset}"
+
+        # Сначала пробуем Binance, если пара доступна, затем Bybit
+        for exchange_id in self._stats_exchanges(symbol, available_pairs, self.clients):
+            print(f"  Получение статистики с {EXCHANGE_NAMES[exchange_id]} для {symbol}...")
+            stats = self._get_price_stats(exchange_id, symbol)
+            if stats:
+                return stats
+        return None
+
+    @staticmethod
+    def _stats_exchanges(symbol: str, available_pairs: Optional[Set[Tuple[int, str]]],
+                         clients: Dict[int, Any]) -> List[int]:
+        """
+        Определяет биржи для получения статистики в порядке приоритета.
+
+        Биржи с разомкнутой цепью запросов переносятся в конец, чтобы
+        статистика бралась с другой биржи.
+
+        Args:
+            symbol: Торговый символ
+            available_pairs: Доступные торговые пары
+            clients: Клиенты бирж процессора
+
+        Returns:
+            Список ID бирж
+        """
+        exchanges = [exchange_id for exchange_id in (BINANCE_EXCHANGE_ID, BYBIT_EXCHANGE_ID)
+                     if available_pairs and (exchange_id, symbol) in available_pairs]
+        if not exchanges:
+            print(f"  ⚠️ Пара {symbol} не доступна ни на одной бирже для получения статистики")
+        exchanges.sort(key=lambda exchange_id: not clients[exchange_id].guard.available)
+        return exchanges
+
+    def _get_price_stats(self, exchange_id: int, symbol: str) -> Optional[PriceStats]:
+        """Получает статистику цен с биржи."""
+        try:
+            # Получаем свечи за разные периоды
+            klines = {
+                name: self._get_klines(exchange_id, symbol, **params)
+                for name, params in self._stats_kline_requests(exchange_id).items()
+            }
+            with PIPELINE_METRICS.span('stats_compute', EXCHANGE_NAMES[exchange_id]):
+                return self._build_price_stats(klines['1m'], klines['1h'], klines['1d'])
+
+        except Exception as e:
+            print(f"Error getting price statistics from {EXCHANGE_NAMES[exchange_id]} for {symbol}: {e}",
+                  file=sys.stderr)
+            return None
+
+    @staticmethod
+    def _stats_kline_requests(exchange_id: int) -> Dict[str, Dict[str, Any]]:
+        """Формирует параметры запросов свечей для статистики цен."""
+        fmt = EXCHANGE_FORMATS[exchange_id]
+        return {
+            '1m': {'interval': fmt['interval_1m'], 'limit': 60},  # 1 час
+            '1h': {'interval': fmt['interval_1h'], 'limit': 24},  # 24 часа
+            '1d': {'interval': fmt['interval_1d'], 'limit': 30},  # 30 дней
+        }
+
+    @staticmethod
+    def _kline_price_arrays(klines: List) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Разбирает high и low свечей в массивы float64 за один проход.
+
+        Цены открытия и закрытия нужны только в отдельных точках и берутся
+        из исходных строк, поэтому в массивы не разбираются.
 
-            # 1 час
-            prices_1h = [Decimal(k[2]) for k in klines_1m]
-            lows_1h = [Decimal(k[3]) for k in klines_1m]
-            stats.price_max_1h = max(prices_1h)
-            stats.price_min_1h = min(lows_1h)
+        Args:
+            klines: Свечи биржи (high и low в полях 2 и 3)
+
+        Returns:
+            Кортеж массивов (high, low)
+        """
+        count = len(klines)
+        highs = np.fromiter(map(float, map(itemgetter(2), klines)), np.float64, count)
+        lows = np.fromiter(map(float, map(itemgetter(3), klines)), np.float64, count)
+        return highs, lows
+
+    @staticmethod
+    def _window_extremes(klines: List, highs: np.ndarray, lows: np.ndarray,
+                         start: int = 0) -> Tuple[Decimal, Decimal]:
+        """
+        Находит максимум high и минимум low в окне свечей начиная с start.
+
+        Поиск идет по массивам float64, а в Decimal переводятся только две
+        найденные исходные строки, поэтому значения совпадают с биржевыми.
+
+        Args:
+            klines: Исходные свечи
+            highs: Массив high этих свечей
+            lows: Массив low этих свечей
+            start: Индекс первой свечи окна
+
+        Returns:
+            Кортеж (максимум, минимум)
+        """
+        max_idx = start + int(highs[start:].argmax())
+        min_idx = start + int(lows[start:].argmin())
+        return Decimal(klines[max_idx][2]), Decimal(klines[min_idx][3])
+
+    @staticmethod
+    def _build_price_stats(klines_1m: Optional[List], klines_1h: Optional[List],
+                           klines_1d: Optional[List]) -> Optional[PriceStats]:
+        """
+        Рассчитывает статистику цен по свечам.
+
+        Каждая пачка свечей разбирается в массив один раз; окна 7 и 30 дней
+        берутся срезами одного массива дневных свечей.
+
+        Args:
+            klines_1m: Минутные свечи за час
+            klines_1h: Часовые свечи за сутки
+            klines_1d: Дневные свечи за 30 дней
+
+        Returns:
+            Объект PriceStats или None, если каких-то свечей нет
+        """
+        if not all([klines_1m, klines_1h, klines_1d]):
+            return None
+
+        highs_1m, lows_1m = MarketDataProcessor._kline_price_arrays(klines_1m)
+        highs_1h, lows_1h = MarketDataProcessor._kline_price_arrays(klines_1h)
+        highs_1d, lows_1d = MarketDataProcessor._kline_price_arrays(klines_1d)
+        start_7d = max(len(klines_1d) - 7, 0)
+
+        # Расчет минимумов и максимумов
+        stats = PriceStats()
+        stats.price_max_1h, stats.price_min_1h = MarketDataProcessor._window_extremes(
+            klines_1m, highs_1m, lows_1m)
+        stats.price_max_24h, stats.price_min_24h = MarketDataProcessor._window_extremes(
+            klines_1h, highs_1h, lows_1h)
+        stats.price_max_7d, stats.price_min_7d = MarketDataProcessor._window_extremes(
+            klines_1d, highs_1d, lows_1d, start_7d)
+        stats.price_max_30d, stats.price_min_30d = MarketDataProcessor._window_extremes(
+            klines_1d, highs_1d, lows_1d)
+
+        # Расчет процентных изменений: последняя цена закрытия против цен открытия
+        # 24 часа, 7 и 30 дней назад (точная арифметика Decimal над тремя значениями)
+        current_price = Decimal(klines_1m[-1][4])
+        price_24h_ago = Decimal(klines_1h[0][1])
+        price_7d_ago = Decimal(klines_1d[start_7d][1])
+        price_30d_ago = Decimal(klines_1d[0][1])
+        stats.percent_change_24h = ((current_price - price_24h_ago) / price_24h_ago * 100).quantize(Decimal('0.01'))
+        stats.percent_change_7d = ((current_price - price_7d_ago) / price_7d_ago * 100).quantize(Decimal('0.01'))
+        stats.percent_change_30d = ((current_price - price_30d_ago) / price_30d_ago * 100).quantize(Decimal('0.01'))
+
+        return stats
+
+
+class AsyncMarketDataProcessor:
+    """
+    Асинхронный процессор рыночных данных.
+
+    Все запросы одной ноги (тикер и свечи) отправляются одновременно. Клиенты
+    живут в отдельном фоновом event loop, чтобы keep-alive соединения
+    переиспользовались между тиками планировщика.
+    """
+
+    def __init__(self, kline_cache: Optional[KlineCache] = None):
+        self.clients = {
+            BINANCE_EXCHANGE_ID: AsyncBinanceSpotClient(),
+            BYBIT_EXCHANGE_ID: AsyncBybitSpotClient(),
+        }
+        self.kline_cache = kline_cache or KlineCache()
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name='async-http', daemon=True)
+        self._thread.start()
+
+    def submit(self, coro) -> Future:
+        """
+        Запускает корутину в фоновом event loop.
+
+        Args:
+            coro: Корутина
+
+        Returns:
+            concurrent.futures.Future с результатом
+        """
+        return asyncio.run_coroutine_threadsafe(coro, self._loop)
 
-            # 24 часа
-            prices_24h = [Decimal(k[2]) for k in klines_1h]
-            lows_24h = [Decimal(k[3]) for k in klines_1h]
-            stats.price_max_24h = max(prices_24h)
-            stats.price_min_24h = min(lows_24h)
+    def close(self) -> None:
+        """Закрывает HTTP сессии и останавливает фоновый event loop."""
+        for client in self.clients.values():
+            self.submit(client.close()).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
 
-            # 7 дней
-            klines_7d = klines_1d[-7:]
-            prices_7d = [Decimal(k[2]) for k in klines_7d]
-            lows_7d = [Decimal(k[3]) for k in klines_7d]
-            stats.price_max_7d = max(prices_7d)
-            stats.price_min_7d = min(lows_7d)
+    async def _get_klines(self, exchange_id: int, symbol: str, **params) -> Optional[List]:
+        """
+        Получает свечи через кэш.
+
+        Args:
+            exchange_id: ID биржи
+            symbol: Торговый символ
+            **params: Параметры get_klines
+
+        Returns:
+            Список свечей или None
+        """
+        client = self.clients[exchange_id]
+        cached, fetch_params = self.kline_cache.lookup(exchange_id, symbol, params)
+        if fetch_params is None:
+            return cached
+
+        data = await client.get_klines(symbol, **fetch_params)
+        result = self.kline_cache.store(exchange_id, symbol, params, fetch_params, data)
+        if result is None and fetch_params is not params:
+            # Хвост не состыковался с кэшем - запрашиваем окно целиком
+            data = await client.get_klines(symbol, **params)
+            result = self.kline_cache.store(exchange_id, symbol, params, params, data)
+        return result
+
+    async def get_spot_data(self, exchange_id: int, symbol: str, prev_time: datetime,
+                            live_now: Optional[SpotMarketData] = None,
+                            stored_prev: Optional[SpotMarketData] = None) -> Tuple[
+        Optional[SpotMarketData], Optional[SpotMarketData]]:
+        """
+        Получает текущие и предыдущие спотовые данные с биржи одним окном запросов.
+
+        Args:
+            exchange_id: ID биржи
+            symbol: Торговый символ
+            prev_time: Время для получения предыдущих данных
+            live_now: Свежие текущие данные из сборщика; если заданы, тикер не запрашивается
+            stored_prev: Предыдущие данные из spot_data; если заданы, свечи prev_time не запрашиваются
+
+        Returns:
+            Кортеж (текущие_данные, предыдущие_данные)
+        """
+        client = self.clients[exchange_id]
+        try:
+            kline_requests = MarketDataProcessor._spot_kline_requests(exchange_id, prev_time)
+            if stored_prev:
+                for name in ('prev', 'prev_hour', 'prev_24h'):
+                    kline_requests.pop(name)
+            if live_now:
+                kline_requests.pop('hour')
+                ticker_request = asyncio.sleep(0, result=None)
+            else:
+                ticker_request = client.get_24hr_ticker(symbol)
+
+            ticker, *responses = await asyncio.gather(
+                ticker_request,
+                *(self._get_klines(exchange_id, symbol, **params) for params in kline_requests.values())
+            )
+            klines = dict(zip(kline_requests, responses))
+
+            if live_now:
+                current_data = live_now
+            elif ticker:
+                now = datetime.now(timezone.utc)
+                current_data = MarketDataProcessor._build_current_spot_data(exchange_id, now, ticker,
+                                                                            klines['hour'])
+            else:
+                return None, None
+
+            if stored_prev:
+                return current_data, stored_prev
+            return current_data, MarketDataProcessor._build_prev_spot_data(exchange_id, prev_time, klines)
 
-            # 30 дней
-            prices_30d = [Decimal(k[2]) for k in klines_1d]
-            lows_30d = [Decimal(k[3]) for k in klines_1d]
-            stats.price_max_30d = max(prices_30d)
-            stats.price_min_30d = min(lows_30d)
+        except Exception as e:
+            print(f"Error getting {EXCHANGE_NAMES[exchange_id]} spot data for {symbol}: {e}", file=sys.stderr)
+            return None, None
 
-            # Расчет процентных изменений
-            current_price = Decimal(klines_1m[-1][4])
+    async def get_price_statistics(self, base_asset: str, quote_asset: str = 'USDT',
+                                   available_pairs: Set[Tuple[int, str]] = None) -> Optional[PriceStats]:
+        """
+        Получает статистику цен для пары.
 
-            # 24h изменение
-            price_24h_ago = Decimal(klines_1h[0][1])
-            stats.percent_change_24h = ((current_price - price_24h_ago) / price_24h_ago * 100).quantize(Decimal('0.01'))
+        Args:
+            base_asset: Базовый актив
+            quote_asset: Котируемый актив
+            available_pairs: Доступные торговые пары
 
-            # 7d изменение
-            price_7d_ago = Decimal(klines_7d[0][1])
-            stats.percent_change_7d = ((current_price - price_7d_ago) / price_7d_ago * 100).quantize(Decimal('0.01'))
+        Returns:
+            Объект PriceStats или None
+        """
+        symbol = f"{base_asset}{quote_asset}"
 
-            # 30d изменение
-            price_30d_ago = Decimal(klines_1d[0][1])
-            stats.percent_change_30d = ((current_price - price_30d_ago) / price_30d_ago * 100).quantize(Decimal('0.01'))
+        for exchange_id in MarketDataProcessor._stats_exchanges(symbol, available_pairs, self.clients):
+            print(f"  Получение статистики с {EXCHANGE_NAMES[exchange_id]} для {symbol}...")
+            stats = await self._get_price_stats(exchange_id, symbol)
+            if stats:
+                return stats
+        return None
 
-            return stats
+    async def _get_price_stats(self, exchange_id: int, symbol: str) -> Optional[PriceStats]:
+        """Получает статистику цен с биржи."""
+        try:
+            kline_requests = MarketDataProcessor._stats_kline_requests(exchange_id)
+            responses = await asyncio.gather(
+                *(self._get_klines(exchange_id, symbol, **params) for params in kline_requests.values())
+            )
+            klines = dict(zip(kline_requests, responses))
+            with PIPELINE_METRICS.span('stats_compute', EXCHANGE_NAMES[exchange_id]):
+                return MarketDataProcessor._build_price_stats(klines['1m'], klines['1h'], klines['1d'])
 
         except Exception as e:
-            print(f"Error getting price statistics from Bybit for {symbol}: {e}", file=sys.stderr)
+            print(f"Error getting price statistics from {EXCHANGE_NAMES[exchange_id]} for {symbol}: {e}",
+                  file=sys.stderr)
             return None
 
 
 class DatabaseManager:
-    """Менеджер для работы с базой данных."""
+    """
+    Менеджер для работы с базой данных.
+
+    Соединения берутся из постоянного пула и возвращаются в него после тика,
+    поэтому в установившемся режиме новые соединения не открываются.
+    """
+
+    def __init__(self):
+        self._pool: Optional[psycopg2.pool.ThreadedConnectionPool] = None
+        self._pool_lock = threading.Lock()
+        # Время возврата соединения в пул: id(conn) -> time.monotonic()
+        self._released_at: Dict[int, float] = {}
 
     @staticmethod
-    def get_connection() -> Optional[psycopg2.extensions.connection]:
+    def ensure_signal_notify_trigger(cursor) -> bool:
+        """
+        Создает триггер, уведомляющий SIGNALS_NOTIFY_CHANNEL о вставке сигналов.
+
+        Триггер уровня оператора срабатывает один раз на INSERT и молчит,
+        если оператор не вставил ни одной строки. В payload передается
+        количество вставленных сигналов.
+
+        Args:
+            cursor: Курсор БД
+
+        Returns:
+            True, если триггер установлен
+        """
+        try:
+            cursor.execute("""
+                CREATE OR REPLACE FUNCTION notify_signals_10min_inserted() RETURNS trigger
+                LANGUAGE plpgsql AS $$
+                DECLARE
+                    inserted_count integer;
+                BEGIN
+                    SELECT count(*) INTO inserted_count FROM inserted_rows;
+                    IF inserted_count > 0 THEN
+                        PERFORM pg_notify(TG_ARGV[0], inserted_count::text);
+                    END IF;
+                    RETURN NULL;
+                END;
+                $$;
+                DROP TRIGGER IF EXISTS signals_10min_notify_insert ON signals_10min;
+                CREATE TRIGGER signals_10min_notify_insert
+                    AFTER INSERT ON signals_10min
+                    REFERENCING NEW TABLE AS inserted_rows
+                    FOR EACH STATEMENT
+                    EXECUTE PROCEDURE notify_signals_10min_inserted(%s);
+            """, (SIGNALS_NOTIFY_CHANNEL,))
+            return True
+        except psycopg2.Error as e:
+            print(f"Error installing signals notify trigger: {e}", file=sys.stderr)
+            return False
+
+    def _get_pool(self) -> psycopg2.pool.ThreadedConnectionPool:
+        """Создает пул при первом обращении (и после недоступности БД при старте)."""
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = psycopg2.pool.ThreadedConnectionPool(
+                    DB_POOL_MIN_CONN, DB_POOL_MAX_CONN, **DB_CONFIG, **DB_KEEPALIVE_CONFIG
+                )
+            return self._pool
+
+    def _is_healthy(self, conn: psycopg2.extensions.connection) -> bool:
+        """
+        Проверяет соединение перед выдачей из пула.
+
+        Недавно использованные соединения не пингуются; простаивавшие дольше
+        DB_POOL_PING_INTERVAL проверяются запросом SELECT 1.
+
+        Args:
+            conn: Соединение из пула
+
+        Returns:
+            True, если соединение пригодно для работы
+        """
+        if conn.closed:
+            return False
+        released_at = self._released_at.get(id(conn))
+        if released_at is not None and time.monotonic() - released_at < DB_POOL_PING_INTERVAL:
+            return True
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1;")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def get_connection(self) -> Optional[psycopg2.extensions.connection]:
         """
-        Создает и возвращает соединение с БД.
+        Выдает рабочее соединение из пула.
+
+        Разорванные соединения закрываются и заменяются новыми, поэтому после
+        перезапуска или сбоя БД пул восстанавливается без перезапуска процесса.
 
         Returns:
             Объект соединения или None при ошибке
         """
         try:
-            conn = psycopg2.connect(**DB_CONFIG)
-            return conn
-        except psycopg2.OperationalError as e:
+            pool = self._get_pool()
+            for _ in range(DB_POOL_MAX_CONN + 1):
+                conn = pool.getconn()
+                if self._is_healthy(conn):
+                    return conn
+                print("Discarding broken pooled database connection", file=sys.stderr)
+                self._released_at.pop(id(conn), None)
+                pool.putconn(conn, close=True)
+            print("Database connection error: no healthy connection in pool", file=sys.stderr)
+            return None
+        except psycopg2.Error as e:
             print(f"Database connection error: {e}", file=sys.stderr)
             return None
 
+    def release_connection(self, conn: psycopg2.extensions.connection, discard: bool = False) -> None:
+        """
+        Возвращает соединение в пул.
+
+        Args:
+            conn: Соединение, полученное из get_connection
+            discard: Закрыть соединение вместо повторного использования
+        """
+        if self._pool is None:
+            conn.close()
+            return
+        discard = discard or bool(conn.closed)
+        if discard:
+            self._released_at.pop(id(conn), None)
+        else:
+            self._released_at[id(conn)] = time.monotonic()
+        try:
+            self._pool.putconn(conn, close=discard)
+        except psycopg2.Error as e:
+            print(f"Error returning connection to pool: {e}", file=sys.stderr)
+
+    def close(self) -> None:
+        """Закрывает все соединения пула."""
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.closeall()
+                self._pool = None
+            self._released_at.clear()
+
     @staticmethod
-    def get_available_trading_pairs(cursor, token_id: int) -> Set[Tuple[int, str]]:
+    def get_spot_trading_pairs(cursor) -> Dict[int, Set[Tuple[int, str]]]:
         """
-        Получает доступные торговые пары для токена.
+        Получает все спотовые торговые пары, сгруппированные по токенам.
 
         Args:
             cursor: Курсор БД
-            token_id: ID токена
 
         Returns:
-            Множество кортежей (exchange_id, pair_symbol)
+            Словарь {token_id: множество кортежей (exchange_id, pair_symbol)}
         """
         query = """
-            SELECT exchange_id, pair_symbol
+            SELECT token_id, exchange_id, pair_symbol
             FROM trading_pairs
-            WHERE token_id = %s AND contract_type_id = %s
+            WHERE contract_type_id = %s
         """
-        cursor.execute(query, (token_id, SPOT_CONTRACT_TYPE_ID))
-        return set(cursor.fetchall())
+        cursor.execute(query, (SPOT_CONTRACT_TYPE_ID,))
+        pairs: Dict[int, Set[Tuple[int, str]]] = {}
+        for token_id, exchange_id, pair_symbol in cursor.fetchall():
+            pairs.setdefault(token_id, set()).add((exchange_id, pair_symbol))
+        return pairs
 
     @staticmethod
-    def get_new_signals(cursor) -> List[Tuple[int, int, str, str]]:
+    def get_trading_pairs_version(cursor) -> Tuple[int, Optional[datetime]]:
         """
-        Получает новые сигналы для обработки.
+        Получает версию спотовых пар: количество строк и время последнего обновления.
+
+        create_futures_pairs.py обновляет updated_at у каждой записанной пары,
+        поэтому любая синхронизация (и удаление строк) меняет версию.
 
         Args:
             cursor: Курсор БД
 
         Returns:
-            Список кортежей (signal_id, token_id, token_symbol, base_asset)
+            Кортеж (количество, max(updated_at))
+        """
+        cursor.execute("""
+            SELECT count(*), max(updated_at)
+            FROM trading_pairs
+            WHERE contract_type_id = %s
+        """, (SPOT_CONTRACT_TYPE_ID,))
+        return cursor.fetchone()
+
+    @staticmethod
+    def get_stored_prev_spot_data(cursor, pairs: Set[Tuple[int, str]],
+                                  prev_time: datetime) -> Dict[Tuple[int, str], SpotMarketData]:
+        """
+        Получает спотовые данные на момент prev_time из spot_data одним запросом.
+
+        Для каждой пары берется последняя строка не позже prev_time и не раньше
+        prev_time - SPOT_DATA_PREV_TOLERANCE секунд (индекс trading_pair_id, capture_time).
+
+        Args:
+            cursor: Курсор БД
+            pairs: Множество кортежей (exchange_id, pair_symbol)
+            prev_time: Время предыдущих данных
+
+        Returns:
+            Словарь {(exchange_id, pair_symbol): SpotMarketData}; пропуски не включаются
         """
-        # Получаем сигналы, где не заполнены спотовые данные
+        if not pairs:
+            return {}
+
+        exchange_ids, symbols = zip(*pairs)
         query = """
-            SELECT id, token_id, token_symbol, base_asset
-            FROM signals_10min
-            WHERE signal_time > NOW() - INTERVAL '10 minutes'
-              AND spot_usdt_binance_price_now IS NULL
+            SELECT tp.exchange_id, tp.pair_symbol, sd.capture_time, sd.price,
+                   sd.volume_1h, sd.quote_volume_1h, sd.volume_24h, sd.quote_volume_24h
+            FROM trading_pairs tp
+            CROSS JOIN LATERAL (
+                SELECT capture_time, price, volume_1h, quote_volume_1h, volume_24h, quote_volume_24h
+                FROM spot_data
+                WHERE trading_pair_id = tp.id
+                  AND capture_time <= %(prev_time)s
+                  AND capture_time > %(prev_time)s - %(tolerance)s * INTERVAL '1 second'
+                  AND is_stale IS NOT TRUE
+                ORDER BY capture_time DESC
+                LIMIT 1
+            ) sd
+            WHERE tp.contract_type_id = %(contract_type_id)s
+              AND (tp.exchange_id, tp.pair_symbol) IN (
+                  SELECT * FROM unnest(%(exchange_ids)s::int[], %(symbols)s::text[])
+              )
         """
-        cursor.execute(query)
-        return cursor.fetchall()
+        cursor.execute(query, {
+            'prev_time': prev_time,
+            'tolerance': SPOT_DATA_PREV_TOLERANCE,
+            'contract_type_id': SPOT_CONTRACT_TYPE_ID,
+            'exchange_ids': list(exchange_ids),
+            'symbols': list(symbols),
+        })
+
+        def to_decimal(value) -> Optional[Decimal]:
+            return Decimal(str(value)) if value is not None else None
+
+        return {
+            (exchange_id, pair_symbol): SpotMarketData(
+                capture_time=capture_time,
+                price=to_decimal(price),
+                vol_1h=to_decimal(vol_1h),
+                quote_vol_1h=to_decimal(quote_vol_1h),
+                vol_24h=to_decimal(vol_24h),
+                quote_vol_24h=to_decimal(quote_vol_24h)
+            )
+            for exchange_id, pair_symbol, capture_time, price, vol_1h, quote_vol_1h, vol_24h, quote_vol_24h
+            in cursor.fetchall()
+        }
 
     @staticmethod
-    def update_signal(cursor, signal_data: SignalData) -> bool:
+    def get_stored_futures_data(cursor, pairs: Set[Tuple[int, str]], now_time: datetime,
+                                prev_time: datetime) -> Tuple[Dict[Tuple[int, str], FuturesMarketData],
+                                                              Dict[Tuple[int, str], FuturesMarketData]]:
         """
-        Обновляет данные сигнала в БД.
+        Получает текущие и предыдущие фьючерсные данные пар из market_data одним запросом.
+
+        Для каждой пары и каждого момента берется последняя строка не позже
+        момента: не старше FUTURES_DATA_MAX_AGE секунд для текущих данных и
+        SPOT_DATA_PREV_TOLERANCE секунд для предыдущих.
+
+        Args:
+            cursor: Курсор БД
+            pairs: Множество кортежей (exchange_id, pair_symbol) фьючерсных пар
+            now_time: Текущее время
+            prev_time: Время предыдущих данных
+
+        Returns:
+            Кортеж словарей ({пара: текущие данные}, {пара: предыдущие данные}); пропуски не включаются
+        """
+        if not pairs:
+            return {}, {}
+
+        exchange_ids, symbols = zip(*pairs)
+        query = """
+            SELECT m.moment, tp.exchange_id, tp.pair_symbol, md.capture_time, md.mark_price,
+                   md.index_price, md.funding_rate, md.volume_base_24h, md.volume_quote_24h, md.open_interest
+            FROM trading_pairs tp
+            CROSS JOIN (VALUES ('now', %(now_time)s::timestamptz, %(now_tolerance)s),
+                               ('prev', %(prev_time)s::timestamptz, %(prev_tolerance)s)
+            ) AS m(moment, at_time, tolerance)
+            CROSS JOIN LATERAL (
+                SELECT capture_time, mark_price, index_price, funding_rate,
+                       volume_base_24h, volume_quote_24h, open_interest
+                FROM market_data
+                WHERE trading_pair_id = tp.id
+                  AND capture_time <= m.at_time
+                  AND capture_time > m.at_time - m.tolerance * INTERVAL '1 second'
+                  AND is_stale IS NOT TRUE
+                ORDER BY capture_time DESC
+                LIMIT 1
+            ) md
+            WHERE tp.contract_type_id = %(contract_type_id)s
+              AND (tp.exchange_id, tp.pair_symbol) IN (
+                  SELECT * FROM unnest(%(exchange_ids)s::int[], %(symbols)s::text[])
+              )
+        """
+        cursor.execute(query, {
+            'now_time': now_time,
+            'now_tolerance': FUTURES_DATA_MAX_AGE,
+            'prev_time': prev_time,
+            'prev_tolerance': SPOT_DATA_PREV_TOLERANCE,
+            'contract_type_id': FUTURES_CONTRACT_TYPE_ID,
+            'exchange_ids': list(exchange_ids),
+            'symbols': list(symbols),
+        })
+
+        def to_decimal(value) -> Optional[Decimal]:
+            return Decimal(str(value)) if value is not None else None
+
+        snapshots = {'now': {}, 'prev': {}}
+        for moment, exchange_id, pair_symbol, capture_time, *values in cursor.fetchall():
+            snapshots[moment][(exchange_id, pair_symbol)] = FuturesMarketData(
+                capture_time, *(to_decimal(value) for value in values)
+            )
+        return snapshots['now'], snapshots['prev']
+
+    @staticmethod
+    def ensure_futures_columns(cursor) -> bool:
+        """
+        Добавляет в signals_10min колонки фьючерсных ног, если их еще нет.
 
         Args:
             cursor: Курсор БД
-            signal_data: Данные сигнала
 
         Returns:
-            True при успешном обновлении
+            True, если колонки есть или добавлены
         """
+        columns = [
+            (column, sql_type)
+            for attr, group_columns in SIGNAL_UPDATE_GROUPS if attr.startswith('futures_')
+            for _, column, sql_type in group_columns
+        ]
         try:
-            update_parts = []
-            params = {'signal_id': signal_data.signal_id}
-
-            # Обновляем данные Binance USDT
-            if signal_data.spot_usdt_binance_now:
-                update_parts.extend([
-                    "spot_usdt_binance_capture_time_now = %(spot_usdt_binance_capture_time_now)s",
-                    "spot_usdt_binance_price_now = %(spot_usdt_binance_price_now)s",
-                    "spot_usdt_binance_vol_1h_now = %(spot_usdt_binance_vol_1h_now)s",
-                    "spot_usdt_binance_quote_vol_1h_now = %(spot_usdt_binance_quote_vol_1h_now)s",
-                    "spot_usdt_binance_vol_24h_now = %(spot_usdt_binance_vol_24h_now)s",
-                    "spot_usdt_binance_quote_vol_24h_now = %(spot_usdt_binance_quote_vol_24h_now)s"
-                ])
-                params.update({
-                    'spot_usdt_binance_capture_time_now': signal_data.spot_usdt_binance_now.capture_time,
-                    'spot_usdt_binance_price_now': signal_data.spot_usdt_binance_now.price,
-                    'spot_usdt_binance_vol_1h_now': signal_data.spot_usdt_binance_now.vol_1h,
-                    'spot_usdt_binance_quote_vol_1h_now': signal_data.spot_usdt_binance_now.quote_vol_1h,
-                    'spot_usdt_binance_vol_24h_now': signal_data.spot_usdt_binance_now.vol_24h,
-                    'spot_usdt_binance_quote_vol_24h_now': signal_data.spot_usdt_binance_now.quote_vol_24h
-                })
-
-            if signal_data.spot_usdt_binance_prev:
-                update_parts.extend([
-                    "spot_usdt_binance_capture_time_prev = %(spot_usdt_binance_capture_time_prev)s",
-                    "spot_usdt_binance_price_prev = %(spot_usdt_binance_price_prev)s",
-                    "spot_usdt_binance_vol_1h_prev = %(spot_usdt_binance_vol_1h_prev)s",
-                    "spot_usdt_binance_quote_vol_1h_prev = %(spot_usdt_binance_quote_vol_1h_prev)s",
-                    "spot_usdt_binance_vol_24h_prev = %(spot_usdt_binance_vol_24h_prev)s",
-                    "spot_usdt_binance_quote_vol_24h_prev = %(spot_usdt_binance_quote_vol_24h_prev)s"
-                ])
-                params.update({
-                    'spot_usdt_binance_capture_time_prev': signal_data.spot_usdt_binance_prev.capture_time,
-                    'spot_usdt_binance_price_prev': signal_data.spot_usdt_binance_prev.price,
-                    'spot_usdt_binance_vol_1h_prev': signal_data.spot_usdt_binance_prev.vol_1h,
-                    'spot_usdt_binance_quote_vol_1h_prev': signal_data.spot_usdt_binance_prev.quote_vol_1h,
-                    'spot_usdt_binance_vol_24h_prev': signal_data.spot_usdt_binance_prev.vol_24h,
-                    'spot_usdt_binance_quote_vol_24h_prev': signal_data.spot_usdt_binance_prev.quote_vol_24h
-                })
-
-            # Обновляем данные Bybit USDT
-            if signal_data.spot_usdt_bybit_now:
-                update_parts.extend([
-                    "spot_usdt_bybit_capture_time_now = %(spot_usdt_bybit_capture_time_now)s",
-                    "spot_usdt_bybit_price_now = %(spot_usdt_bybit_price_now)s",
-                    "spot_usdt_bybit_vol_1h_now = %(spot_usdt_bybit_vol_1h_now)s",
-                    "spot_usdt_bybit_quote_vol_1h_now = %(spot_usdt_bybit_quote_vol_1h_now)s",
-                    "spot_usdt_bybit_vol_24h_now = %(spot_usdt_bybit_vol_24h_now)s",
-                    "spot_usdt_bybit_quote_vol_24h_now = %(spot_usdt_bybit_quote_vol_24h_now)s"
-                ])
-                params.update({
-                    'spot_usdt_bybit_capture_time_now': signal_data.spot_usdt_bybit_now.capture_time,
-                    'spot_usdt_bybit_price_now': signal_data.spot_usdt_bybit_now.price,
-                    'spot_usdt_bybit_vol_1h_now': signal_data.spot_usdt_bybit_now.vol_1h,
-                    'spot_usdt_bybit_quote_vol_1h_now': signal_data.spot_usdt_bybit_now.quote_vol_1h,
-                    'spot_usdt_bybit_vol_24h_now': signal_data.spot_usdt_bybit_now.vol_24h,
-                    'spot_usdt_bybit_quote_vol_24h_now': signal_data.spot_usdt_bybit_now.quote_vol_24h
-                })
-
-            if signal_data.spot_usdt_bybit_prev:
-                update_parts.extend([
-                    "spot_usdt_bybit_capture_time_prev = %(spot_usdt_bybit_capture_time_prev)s",
-                    "spot_usdt_bybit_price_prev = %(spot_usdt_bybit_price_prev)s",
-                    "spot_usdt_bybit_vol_1h_prev = %(spot_usdt_bybit_vol_1h_prev)s",
-                    "spot_usdt_bybit_quote_vol_1h_prev = %(spot_usdt_bybit_quote_vol_1h_prev)s",
-                    "spot_usdt_bybit_vol_24h_prev = %(spot_usdt_bybit_vol_24h_prev)s",
-                    "spot_usdt_bybit_quote_vol_24h_prev = %(spot_usdt_bybit_quote_vol_24h_prev)s"
-                ])
-                params.update({
-                    'spot_usdt_bybit_capture_time_prev': signal_data.spot_usdt_bybit_prev.capture_time,
-                    'spot_usdt_bybit_price_prev': signal_data.spot_usdt_bybit_prev.price,
-                    'spot_usdt_bybit_vol_1h_prev': signal_data.spot_usdt_bybit_prev.vol_1h,
-                    'spot_usdt_bybit_quote_vol_1h_prev': signal_data.spot_usdt_bybit_prev.quote_vol_1h,
-                    'spot_usdt_bybit_vol_24h_prev': signal_data.spot_usdt_bybit_prev.vol_24h,
-                    'spot_usdt_bybit_quote_vol_24h_prev': signal_data.spot_usdt_bybit_prev.quote_vol_24h
-                })
-
-            # Обновляем данные Binance BTC
-            if signal_data.spot_btc_binance_now:
-                update_parts.extend([
-                    "spot_btc_binance_capture_time_now = %(spot_btc_binance_capture_time_now)s",
-                    "spot_btc_binance_price_now = %(spot_btc_binance_price_now)s",
-                    "spot_btc_binance_vol_1h_now = %(spot_btc_binance_vol_1h_now)s",
-                    "spot_btc_binance_quote_vol_1h_now = %(spot_btc_binance_quote_vol_1h_now)s",
-                    "spot_btc_binance_vol_24h_now = %(spot_btc_binance_vol_24h_now)s",
-                    "spot_btc_binance_quote_vol_24h_now = %(spot_btc_binance_quote_vol_24h_now)s"
-                ])
-                params.update({
-                    'spot_btc_binance_capture_time_now': signal_data.spot_btc_binance_now.capture_time,
-                    'spot_btc_binance_price_now': signal_data.spot_btc_binance_now.price,
-                    'spot_btc_binance_vol_1h_now': signal_data.spot_btc_binance_now.vol_1h,
-                    'spot_btc_binance_quote_vol_1h_now': signal_data.spot_btc_binance_now.quote_vol_1h,
-                    'spot_btc_binance_vol_24h_now': signal_data.spot_btc_binance_now.vol_24h,
-                    'spot_btc_binance_quote_vol_24h_now': signal_data.spot_btc_binance_now.quote_vol_24h
-                })
-
-            if signal_data.spot_btc_binance_prev:
-                update_parts.extend([
-                    "spot_btc_binance_capture_time_prev = %(spot_btc_binance_capture_time_prev)s",
-                    "spot_btc_binance_price_prev = %(spot_btc_binance_price_prev)s",
-                    "spot_btc_binance_vol_1h_prev = %(spot_btc_binance_vol_1h_prev)s",
-                    "spot_btc_binance_quote_vol_1h_prev = %(spot_btc_binance_quote_vol_1h_prev)s",
-                    "spot_btc_binance_vol_24h_prev = %(spot_btc_binance_vol_24h_prev)s",
-                    "spot_btc_binance_quote_vol_24h_prev = %(spot_btc_binance_quote_vol_24h_prev)s"
-                ])
-                params.update({
-                    'spot_btc_binance_capture_time_prev': signal_data.spot_btc_binance_prev.capture_time,
-                    'spot_btc_binance_price_prev': signal_data.spot_btc_binance_prev.price,
-                    'spot_btc_binance_vol_1h_prev': signal_data.spot_btc_binance_prev.vol_1h,
-                    'spot_btc_binance_quote_vol_1h_prev': signal_data.spot_btc_binance_prev.quote_vol_1h,
-                    'spot_btc_binance_vol_24h_prev': signal_data.spot_btc_binance_prev.vol_24h,
-                    'spot_btc_binance_quote_vol_24h_prev': signal_data.spot_btc_binance_prev.quote_vol_24h
-                })
-
-            # Обновляем данные Bybit BTC
-            if signal_data.spot_btc_bybit_now:
-                update_parts.extend([
-                    "spot_btc_bybit_capture_time_now = %(spot_btc_bybit_capture_time_now)s",
-                    "spot_btc_bybit_price_now = %(spot_btc_bybit_price_now)s",
-                    "spot_btc_bybit_vol_1h_now = %(spot_btc_bybit_vol_1h_now)s",
-                    "spot_btc_bybit_quote_vol_1h_now = %(spot_btc_bybit_quote_vol_1h_now)s",
-                    "spot_btc_bybit_vol_24h_now = %(spot_btc_bybit_vol_24h_now)s",
-                    "spot_btc_bybit_quote_vol_24h_now = %(spot_btc_bybit_quote_vol_24h_now)s"
-                ])
-                params.update({
-                    'spot_btc_bybit_capture_time_now': signal_data.spot_btc_bybit_now.capture_time,
-                    'spot_btc_bybit_price_now': signal_data.spot_btc_bybit_now.price,
-                    'spot_btc_bybit_vol_1h_now': signal_data.spot_btc_bybit_now.vol_1h,
-                    'spot_btc_bybit_quote_vol_1h_now': signal_data.spot_btc_bybit_now.quote_vol_1h,
-                    'spot_btc_bybit_vol_24h_now': signal_data.spot_btc_bybit_now.vol_24h,
-                    'spot_btc_bybit_quote_vol_24h_now': signal_data.spot_btc_bybit_now.quote_vol_24h
-                })
-
-            if signal_data.spot_btc_bybit_prev:
-                update_parts.extend([
-                    "spot_btc_bybit_capture_time_prev = %(spot_btc_bybit_capture_time_prev)s",
-                    "spot_btc_bybit_price_prev = %(spot_btc_bybit_price_prev)s",
-                    "spot_btc_bybit_vol_1h_prev = %(spot_btc_bybit_vol_1h_prev)s",
-                    "spot_btc_bybit_quote_vol_1h_prev = %(spot_btc_bybit_quote_vol_1h_prev)s",
-                    "spot_btc_bybit_vol_24h_prev = %(spot_btc_bybit_vol_24h_prev)s",
-                    "spot_btc_bybit_quote_vol_24h_prev = %(spot_btc_bybit_quote_vol_24h_prev)s"
-                ])
-                params.update({
-                    'spot_btc_bybit_capture_time_prev': signal_data.spot_btc_bybit_prev.capture_time,
-                    'spot_btc_bybit_price_prev': signal_data.spot_btc_bybit_prev.price,
-                    'spot_btc_bybit_vol_1h_prev': signal_data.spot_btc_bybit_prev.vol_1h,
-                    'spot_btc_bybit_quote_vol_1h_prev': signal_data.spot_btc_bybit_prev.quote_vol_1h,
-                    'spot_btc_bybit_vol_24h_prev': signal_data.spot_btc_bybit_prev.vol_24h,
-                    'spot_btc_bybit_quote_vol_24h_prev': signal_data.spot_btc_bybit_prev.quote_vol_24h
-                })
-
-            # Обновляем статистику цен
-            if signal_data.price_stats:
-                update_parts.extend([
-                    "price_min_1h = %(price_min_1h)s",
-                    "price_max_1h = %(price_max_1h)s",
-                    "price_min_24h = %(price_min_24h)s",
-                    "price_max_24h = %(price_max_24h)s",
-                    "price_min_7d = %(price_min_7d)s",
-                    "price_max_7d = %(price_max_7d)s",
-                    "price_min_30d = %(price_min_30d)s",
-                    "price_max_30d = %(price_max_30d)s",
-                    "percent_change_24h = %(percent_change_24h)s",
-                    "percent_change_7d = %(percent_change_7d)s",
-                    "percent_change_30d = %(percent_change_30d)s"
-                ])
-                params.update({
-                    'price_min_1h': signal_data.price_stats.price_min_1h,
-                    'price_max_1h': signal_data.price_stats.price_max_1h,
-                    'price_min_24h': signal_data.price_stats.price_min_24h,
-                    'price_max_24h': signal_data.price_stats.price_max_24h,
-                    'price_min_7d': signal_data.price_stats.price_min_7d,
-                    'price_max_7d': signal_data.price_stats.price_max_7d,
-                    'price_min_30d': signal_data.price_stats.price_min_30d,
-                    'price_max_30d': signal_data.price_stats.price_max_30d,
-                    'percent_change_24h': signal_data.price_stats.percent_change_24h,
-                    'percent_change_7d': signal_data.price_stats.percent_change_7d,
-                    'percent_change_30d': signal_data.price_stats.percent_change_30d
-                })
-
-            if not update_parts:
-                print(f"No data to update for signal {signal_data.signal_id}")
-                return False
+            cursor.execute("""
+                SELECT column_name
+                FROM information_schema.columns
+                WHERE table_name = 'signals_10min' AND column_name = ANY(%s)
+            """, ([column for column, _ in columns],))
+            existing = {row[0] for row in cursor.fetchall()}
+            missing = [(column, sql_type) for column, sql_type in columns if column not in existing]
+            if missing:
+                cursor.execute(
+                    "ALTER TABLE signals_10min "
+                    + ", ".join(f"ADD COLUMN IF NOT EXISTS {column} {sql_type.upper()}" for column, sql_type in missing)
+                )
+                print(f"В signals_10min добавлено {len(missing)} колонок фьючерсных данных")
+            return True
+        except psycopg2.Error as e:
+            print(f"Error adding futures columns to signals_10min: {e}", file=sys.stderr)
+            return False
+
+    @staticmethod
+    def ensure_snapshot_quality_columns(cursor) -> bool:
+        """
+        Добавляет в spot_data и market_data флаг is_stale, которым сборщик
+        помечает строки с устаревшими полями.
+
+        Args:
+            cursor: Курсор БД
+
+        Returns:
+            True, если колонки есть или добавлены
+        """
+        try:
+            cursor.execute("""
+                SELECT table_name
+                FROM information_schema.columns
+                WHERE table_name IN ('spot_data', 'market_data') AND column_name = 'is_stale'
+            """)
+            existing = {row[0] for row in cursor.fetchall()}
+            for table in ('spot_data', 'market_data'):
+                if table not in existing:
+                    cursor.execute(f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS is_stale BOOLEAN DEFAULT FALSE")
+                    print(f"В {table} добавлена колонка is_stale")
+            return True
+        except psycopg2.Error as e:
+            print(f"Error adding is_stale columns: {e}", file=sys.stderr)
+            return False
+
+    @staticmethod
+    def ensure_claim_columns(cursor) -> bool:
+        """
+        Добавляет в signals_10min колонки аренды сигналов обработчиками и
+        отметку enriched_at о завершенной попытке обогащения.
 
-            query = f"""
-                UPDATE signals_10min 
-                SET {', '.join(update_parts)}
-                WHERE id = %(signal_id)s
-            """
+        ALTER TABLE выполняется только если колонок еще нет, чтобы рабочие
+        запуски не брали эксклюзивную блокировку таблицы.
+
+        Args:
+            cursor: Курсор БД
 
-            cursor.execute(query, params)
+        Returns:
+            True, если колонки есть или добавлены
+        """
+        try:
+            cursor.execute("""
+                SELECT count(*)
+                FROM information_schema.columns
+                WHERE table_name = 'signals_10min'
+                  AND column_name IN ('enrich_claimed_by', 'enrich_claimed_until', 'enriched_at')
+            """)
+            if cursor.fetchone()[0] == 3:
+                return True
+            cursor.execute("""
+                ALTER TABLE signals_10min
+                    ADD COLUMN IF NOT EXISTS enrich_claimed_by TEXT,
+                    ADD COLUMN IF NOT EXISTS enrich_claimed_until TIMESTAMPTZ,
+                    ADD COLUMN IF NOT EXISTS enriched_at TIMESTAMPTZ;
+                DROP INDEX IF EXISTS idx_signals_10min_pending;
+                CREATE INDEX IF NOT EXISTS idx_signals_10min_unenriched
+                    ON signals_10min (signal_time)
+                    WHERE spot_usdt_binance_price_now IS NULL AND enriched_at IS NULL;
+            """)
             return True
+        except psycopg2.Error as e:
+            print(f"Error adding claim columns to signals_10min: {e}", file=sys.stderr)
+            return False
 
-        except Exception as e:
-            print(f"Error updating signal {signal_data.signal_id}: {e}", file=sys.stderr)
+    @staticmethod
+    def claim_new_signals(cursor, worker_id: str, limit: int, lease_seconds: int) -> List[Tuple[int, int, str, str]]:
+        """
+        Захватывает пачку новых сигналов для обработки этим обработчиком.
+
+        Сигналы без заполненных спотовых данных, которые еще не проходили
+        обогащение (enriched_at пуст) и не арендованы другими обработчиками
+        (или аренда истекла), выбираются с FOR UPDATE SKIP
+        LOCKED и помечаются арендой до NOW() + lease_seconds. Параллельные
+        обработчики получают непересекающиеся пачки; после коммита аренда
+        действует без удержания блокировок строк.
+
+        Args:
+            cursor: Курсор БД
+            worker_id: Имя обработчика
+            limit: Максимум сигналов в пачке
+            lease_seconds: Срок аренды в секундах
+
+        Returns:
+            Список кортежей (signal_id, token_id, token_symbol, base_asset)
+        """
+        query = """
+            WITH claimable AS (
+                SELECT id
+                FROM signals_10min
+                WHERE signal_time > NOW() - INTERVAL '10 minutes'
+                  AND spot_usdt_binance_price_now IS NULL
+                  AND enriched_at IS NULL
+                  AND (enrich_claimed_until IS NULL OR enrich_claimed_until < NOW())
+                ORDER BY signal_time
+                LIMIT %(limit)s
+                FOR UPDATE SKIP LOCKED
+            )
+            UPDATE signals_10min s
+            SET enrich_claimed_by = %(worker_id)s,
+                enrich_claimed_until = NOW() + make_interval(secs => %(lease_seconds)s)
+            FROM claimable c
+            WHERE s.id = c.id
+            RETURNING s.id, s.token_id, s.token_symbol, s.base_asset
+        """
+        cursor.execute(query, {'worker_id': worker_id, 'limit': limit, 'lease_seconds': lease_seconds})
+        return sorted(cursor.fetchall())
+
+    @staticmethod
+    def release_signals(cursor, worker_id: str, signal_ids: List[int]) -> int:
+        """
+        Снимает аренду обработчика с сигналов.
+
+        Сигналы, оставшиеся без данных, снова становятся доступны для захвата.
+
+        Args:
+            cursor: Курсор БД
+            worker_id: Имя обработчика
+            signal_ids: ID сигналов
+
+        Returns:
+            Количество освобожденных сигналов
+        """
+        cursor.execute("""
+            UPDATE signals_10min
+            SET enrich_claimed_by = NULL,
+                enrich_claimed_until = NULL
+            WHERE id = ANY(%s) AND enrich_claimed_by = %s
+        """, (signal_ids, worker_id))
+        return cursor.rowcount
+
+    @staticmethod
+    def complete_signals(cursor, worker_id: str, signal_ids: List[int]) -> int:
+        """
+        Отмечает попытку обогащения сигналов и снимает с них аренду.
+
+        Сигналы без пары Binance USDT (и другие, для которых данных не нашлось)
+        так и остаются без spot_usdt_binance_price_now; enriched_at не дает
+        захватывать их снова.
+
+        Args:
+            cursor: Курсор БД
+            worker_id: Имя обработчика
+            signal_ids: ID обработанных сигналов
+
+        Returns:
+            Количество отмеченных сигналов
+        """
+        cursor.execute("""
+            UPDATE signals_10min
+            SET enriched_at = NOW(),
+                enrich_claimed_by = NULL,
+                enrich_claimed_until = NULL
+            WHERE id = ANY(%s) AND enrich_claimed_by = %s
+        """, (signal_ids, worker_id))
+        return cursor.rowcount
+
+    @staticmethod
+    def _bulk_update_sql() -> Tuple[str, str]:
+        """
+        Формирует запрос пакетного обновления и шаблон строки VALUES.
+
+        Для каждой группы колонок в строке передается флаг наличия данных:
+        колонки группы без данных остаются без изменений.
+
+        Returns:
+            Кортеж (запрос, шаблон)
+        """
+        value_columns = ['signal_id']
+        template = ['%s::integer']
+        assignments = []
+        for attr, columns in SIGNAL_UPDATE_GROUPS:
+            flag = f"has_{attr}"
+            value_columns.append(flag)
+            template.append('%s::boolean')
+            for _, column, sql_type in columns:
+                value_columns.append(column)
+                template.append(f'%s::{sql_type}')
+                assignments.append(f"{column} = CASE WHEN v.{flag} THEN v.{column} ELSE s.{column} END")
+
+        query = f"""
+            UPDATE signals_10min AS s
+            SET {', '.join(assignments)}
+            FROM (VALUES %s) AS v({', '.join(value_columns)})
+            WHERE s.id = v.signal_id
+            RETURNING s.id
+        """
+        return query, f"({', '.join(template)})"
+
+    @staticmethod
+    def update_signals(cursor, signals: List[SignalData]) -> Dict[int, bool]:
+        """
+        Обновляет данные пачки сигналов одним запросом UPDATE ... FROM (VALUES ...).
+
+        Если пакетный запрос падает, сигналы обновляются по одному, каждый в
+        своей точке сохранения, чтобы ошибка одной строки не отменяла остальные.
+
+        Args:
+            cursor: Курсор БД
+            signals: Обработанные сигналы
+
+        Returns:
+            Словарь {signal_id: True при успешном обновлении}
+        """
+        results = {}
+        rows = []
+        to_update = []
+        for signal_data in signals:
+            groups = [getattr(signal_data, attr) for attr, _ in SIGNAL_UPDATE_GROUPS]
+            if not any(groups):
+                print(f"No data to update for signal {signal_data.signal_id}")
+                results[signal_data.signal_id] = False
+                continue
+            row = [signal_data.signal_id]
+            for group, (_, columns) in zip(groups, SIGNAL_UPDATE_GROUPS):
+                row.append(group is not None)
+                row.extend(getattr(group, name) if group else None for name, _, _ in columns)
+            rows.append(row)
+            to_update.append(signal_data)
+
+        if not rows:
+            return results
+
+        query, template = DatabaseManager._bulk_update_sql()
+        cursor.execute("SAVEPOINT bulk_signal_update")
+        try:
+            updated = psycopg2.extras.execute_values(cursor, query, rows, template=template,
+                                                     page_size=len(rows), fetch=True)
+            cursor.execute("RELEASE SAVEPOINT bulk_signal_update")
+        except psycopg2.Error as e:
+            cursor.execute("ROLLBACK TO SAVEPOINT bulk_signal_update")
+            print(f"Bulk update failed, falling back to per-signal updates: {e}", file=sys.stderr)
+            for signal_data, row in zip(to_update, rows):
+                cursor.execute("SAVEPOINT signal_update")
+                try:
+                    updated_ok = bool(psycopg2.extras.execute_values(cursor, query, [row], template=template,
+                                                                     fetch=True))
+                except psycopg2.Error as row_error:
+                    print(f"Error updating signal {signal_data.signal_id}: {row_error}", file=sys.stderr)
+                    updated_ok = False
+                cursor.execute("RELEASE SAVEPOINT signal_update" if updated_ok
+                               else "ROLLBACK TO SAVEPOINT signal_update")
+                results[signal_data.signal_id] = updated_ok
+            return results
+
+        updated_ids = {row[0] for row in updated}
+        for signal_data in to_update:
+            results[signal_data.signal_id] = signal_data.signal_id in updated_ids
+        return results
+
+
+class TradingPairIndex:
+    """
+    Индекс спотовых пар по token_id в памяти.
+
+    Загружается одним запросом и перечитывается, когда меняется версия
+    trading_pairs (проверяется не чаще TRADING_PAIRS_CHECK_INTERVAL) или
+    пришло уведомление об обновлении таблицы (invalidate).
+    """
+
+    def __init__(self, check_interval: float = None):
+        self.check_interval = TRADING_PAIRS_CHECK_INTERVAL if check_interval is None else check_interval
+        self._pairs: Dict[int, frozenset] = {}
+        self._version: Optional[Tuple[int, Optional[datetime]]] = None
+        self._checked_at = 0.0
+        self._stale = True
+        self.refreshes = 0
+        self.last_refresh_ms: Optional[float] = None
+
+    def invalidate(self) -> None:
+        """Помечает индекс устаревшим: версия будет проверена при следующем обращении."""
+        self._stale = True
+
+    def ensure_fresh(self, cursor) -> bool:
+        """
+        Перечитывает пары, если изменилась версия trading_pairs.
+
+        Args:
+            cursor: Курсор БД
+
+        Returns:
+            True, если индекс был перезагружен
+        """
+        now = time.monotonic()
+        if not self._stale and now - self._checked_at < self.check_interval:
+            return False
+
+        version = DatabaseManager.get_trading_pairs_version(cursor)
+        self._checked_at = now
+        self._stale = False
+        if version == self._version:
             return False
 
+        started = time.perf_counter()
+        pairs = DatabaseManager.get_spot_trading_pairs(cursor)
+        self._pairs = {token_id: frozenset(token_pairs) for token_id, token_pairs in pairs.items()}
+        self._version = version
+        self.refreshes += 1
+        refresh_seconds = time.perf_counter() - started
+        self.last_refresh_ms = refresh_seconds * 1000
+        PIPELINE_METRICS.observe('pair_index_refresh', refresh_seconds)
+        stats = self.stats()
+        print(f"Индекс спотовых пар обновлен: {stats['tokens']} токенов, {stats['pairs']} пар "
+              f"за {stats['last_refresh_ms']:.1f} мс")
+        return True
+
+    def get(self, token_id: int) -> frozenset:
+        """
+        Возвращает спотовые пары токена.
+
+        Args:
+            token_id: ID токена
+
+        Returns:
+            Множество кортежей (exchange_id, pair_symbol)
+        """
+        return self._pairs.get(token_id, frozenset())
+
+    def stats(self) -> Dict[str, Any]:
+        """Размер индекса и длительность последней загрузки."""
+        return {
+            'tokens': len(self._pairs),
+            'pairs': sum(len(token_pairs) for token_pairs in self._pairs.values()),
+            'refreshes': self.refreshes,
+            'last_refresh_ms': self.last_refresh_ms
+        }
+
+
+class SignalListener:
+    """Ожидание уведомлений PostgreSQL на выделенном соединении (LISTEN)."""
+
+    def __init__(self, channels: List[str]):
+        self.channels = channels
+        self.conn: Optional[psycopg2.extensions.connection] = None
+
+    def _connect(self) -> None:
+        """Открывает autocommit соединение и подписывается на каналы."""
+        conn = psycopg2.connect(**DB_CONFIG)
+        conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+        with conn.cursor() as cursor:
+            for channel in self.channels:
+                cursor.execute(f'LISTEN "{channel}";')
+        self.conn = conn
+        print(f"Подписка на уведомления: {', '.join(self.channels)}")
+
+    def wait(self, timeout: float) -> List[psycopg2.extensions.Notify]:
+        """
+        Ждет уведомления не дольше timeout секунд.
+
+        Возвращает все накопившиеся уведомления разом, чтобы серия событий
+        обрабатывалась одним проходом. При потере соединения переподключается
+        при следующем вызове; пропущенные события покрывает страховочный таймер.
+
+        Args:
+            timeout: Максимальное время ожидания в секундах
+
+        Returns:
+            Список уведомлений (пустой по таймауту или при ошибке)
+        """
+        try:
+            if self.conn is None or self.conn.closed:
+                self._connect()
+            if not self.conn.notifies:
+                readable, _, _ = select.select([self.conn], [], [], timeout)
+                if not readable:
+                    return []
+            self.conn.poll()
+            notifies = list(self.conn.notifies)
+            self.conn.notifies.clear()
+            return notifies
+        except (psycopg2.Error, OSError) as e:
+            print(f"Notification listener error: {e}", file=sys.stderr)
+            self.close()
+            time.sleep(min(timeout, 5))
+            return []
+
+    def close(self) -> None:
+        """Закрывает соединение подписки."""
+        if self.conn is not None and not self.conn.closed:
+            self.conn.close()
+        self.conn = None
+
 
 class SignalProcessor:
     """Основной процессор сигналов."""
 
     def __init__(self):
         self.db_manager = DatabaseManager()
-        self.market_processor = MarketDataProcessor()
+        # Кэш свечей общий для всех тиков и обоих HTTP режимов
+        self.kline_cache = KlineCache()
+        self.market_processor = MarketDataProcessor(self.kline_cache)
+        self.async_market_processor = (AsyncMarketDataProcessor(self.kline_cache)
+                                       if SIGNAL_HTTP_MODE == 'async' else None)
+        self.live_state = LiveStateClient(LIVE_STATE_URL, LIVE_STATE_MAX_AGE)
+        self.pair_index = TradingPairIndex()
+        # Снимки текущих (сборщик) и предыдущих (spot_data) данных на время тика
+        self._live_snapshot: Dict[Tuple[int, str], SpotMarketData] = {}
+        self._stored_prev: Dict[Tuple[int, str], SpotMarketData] = {}
+        self._tick_prev_time = datetime.now(timezone.utc)
+        # PID сессий, в которых вызывалась create_raw_signals: уведомления
+        # триггера от собственных вставок уже обработаны тем же проходом
+        self._own_backend_pids: deque = deque(maxlen=64)
+
+    def prepare_database(self, notify_trigger: bool) -> None:
+        """
+        Готовит схему БД к работе обработчика.
+
+        Добавляет колонки аренды сигналов, фьючерсных данных, флаг is_stale
+        снимков и, для режима уведомлений, триггер на вставку сигналов.
+        Каждый шаг фиксируется отдельно.
+
+        Args:
+            notify_trigger: Устанавливать триггер уведомлений
+        """
+        conn = self.db_manager.get_connection()
+        if not conn:
+            return
+        steps = [self.db_manager.ensure_claim_columns, self.db_manager.ensure_futures_columns,
+                 self.db_manager.ensure_snapshot_quality_columns]
+        if notify_trigger:
+            steps.append(self.db_manager.ensure_signal_notify_trigger)
+        try:
+            for step in steps:
+                with conn.cursor() as cursor:
+                    ok = step(cursor)
+                if ok:
+                    conn.commit()
+                else:
+                    conn.rollback()
+        finally:
+            self.db_manager.release_connection(conn)
+
+    def is_own_notify(self, notify: psycopg2.extensions.Notify) -> bool:
+        """
+        Проверяет, что уведомление вызвано вставкой из собственного прохода.
+
+        Args:
+            notify: Уведомление PostgreSQL
+
+        Returns:
+            True, если сигналы уже обработаны этим процессором
+        """
+        return notify.pid in self._own_backend_pids
 
-    def process_signals(self) -> None:
+    def close(self) -> None:
+        """Освобождает сетевые ресурсы процессора."""
+        if self.async_market_processor:
+            self.async_market_processor.close()
+        self.db_manager.close()
+
+    def process_signals(self, run_db_function: bool = True) -> bool:
         """
         Основной метод обработки сигналов.
 
@@ -845,126 +2687,494 @@ class SignalProcessor:
         1. Вызывает функцию create_raw_signals в БД
         2. Получает новые сигналы
         3. Обогащает их данными с бирж
-        4. Обновляет записи в БД
+        4. Обновляет записи в БД одним пакетным запросом
+
+        Args:
+            run_db_function: Вызывать create_raw_signals. False - сигналы уже
+                вставлены другой сессией, обрабатываются только ожидающие
+
+        Returns:
+            True, если полная пачка новых сигналов обработана и в очереди могут
+            остаться сигналы
         """
         print(f"\n[{datetime.now()}] === Начало обработки сигналов ===")
+        PIPELINE_METRICS.start_tick()
+        tick_started = time.perf_counter()
 
         conn = self.db_manager.get_connection()
         if not conn:
             print("Failed to connect to database", file=sys.stderr)
-            return
+            return False
 
+        broken = False
+        batch_full = False
+        claimed_ids: List[int] = []
         try:
             with conn.cursor() as cursor:
                 # Шаг 1: Вызываем функцию в БД
-                print("Шаг 1: Вызов функции create_raw_signals...")
-                cursor.execute("SELECT create_raw_signals();")
-                new_signals_count = cursor.fetchone()[0]
-                conn.commit()
-                print(f"Функция вернула: {new_signals_count} новых сигналов")
-
-                if new_signals_count == 0:
-                    print("Новых сигналов не найдено")
-                    return
-
-                # Шаг 2: Получаем новые сигналы
+                if run_db_function:
+                    print("Шаг 1: Вызов функции create_raw_signals...")
+                    self._own_backend_pids.append(conn.get_backend_pid())
+                    with PIPELINE_METRICS.span('db_create_raw_signals'):
+                        # Блокировка снимается коммитом; занята - функцию уже выполняет другой обработчик
+                        cursor.execute("SELECT pg_try_advisory_xact_lock(%s);", (CREATE_RAW_SIGNALS_LOCK_KEY,))
+                        if cursor.fetchone()[0]:
+                            cursor.execute("SELECT create_raw_signals();")
+                            new_signals_count = cursor.fetchone()[0]
+                            conn.commit()
+                            print(f"Функция вернула: {new_signals_count} новых сигналов")
+                        else:
+                            conn.rollback()
+                            new_signals_count = None
+                            print("create_raw_signals выполняет другой обработчик, разбираем ожидающие сигналы")
+
+                    # Захват выполняется и без новых сигналов: в очереди могут быть возвращенные
+                    # после ошибки сигналы и сигналы с истекшей арендой
+                    if new_signals_count == 0:
+                        print("Новых сигналов не найдено, проверяем ожидающие")
+                else:
+                    print("Шаг 1: Сигналы вставлены другой сессией, create_raw_signals пропущена")
+
+                # Шаг 2: Захватываем пачку новых сигналов (другие обработчики ее пропустят)
                 print("\nШаг 2: Получение новых сигналов для обработки...")
-                signals = self.db_manager.get_new_signals(cursor)
+                with PIPELINE_METRICS.span('db_fetch_signals'):
+                    signals = self.db_manager.claim_new_signals(cursor, SIGNAL_WORKER_ID, SIGNAL_CLAIM_BATCH,
+                                                                SIGNAL_CLAIM_LEASE)
+                    conn.commit()
 
                 if not signals:
                     print("Не найдено сигналов для обработки")
-                    return
-
-                print(f"Найдено {len(signals)} сигналов для обработки")
-
-                # Шаг 3: Обрабатываем каждый сигнал
-                for signal_id, token_id, token_symbol, base_asset in signals:
-                    print(f"\n--- Обработка сигнала ID: {signal_id}, токен: {token_symbol} ---")
-
-                    # Создаем объект для хранения данных
-                    signal_data = SignalData(
-                        signal_id=signal_id,
-                        token_id=token_id,
-                        token_symbol=token_symbol,
-                        base_asset=base_asset
-                    )
-
-                    # Получаем доступные торговые пары
-                    signal_data.available_pairs = self.db_manager.get_available_trading_pairs(cursor, token_id)
-
-                    # Время для получения предыдущих данных (10 минут назад)
-                    prev_time = datetime.now(timezone.utc) - timedelta(minutes=10)
-
-                    # Обрабатываем каждую пару
-                    self._process_trading_pairs(signal_data, prev_time)
-
-                    # Получаем статистику цен
-                    print(f"Получение статистики цен для {base_asset}...")
-                    signal_data.price_stats = self.market_processor.get_price_statistics(
-                        base_asset,
-                        available_pairs=signal_data.available_pairs
-                    )
-
-                    # Обновляем данные в БД
-                    print(f"Обновление данных в БД для сигнала {signal_id}...")
-                    if self.db_manager.update_signal(cursor, signal_data):
+                    return False
+
+                batch_full = len(signals) >= SIGNAL_CLAIM_BATCH
+                claimed_ids = [signal_id for signal_id, _, _, _ in signals]
+                print(f"Захвачено {len(signals)} сигналов для обработки (обработчик {SIGNAL_WORKER_ID})")
+
+                # Шаг 3: Готовим сигналы (доступные пары - из индекса в памяти)
+                signals_data = []
+                with PIPELINE_METRICS.span('db_trading_pairs'):
+                    self.pair_index.ensure_fresh(cursor)
+                    for signal_id, token_id, token_symbol, base_asset in signals:
+                        signal_data = SignalData(
+                            signal_id=signal_id,
+                            token_id=token_id,
+                            token_symbol=token_symbol,
+                            base_asset=base_asset
+                        )
+                        signal_data.available_pairs = self.pair_index.get(token_id)
+                        signals_data.append(signal_data)
+
+                # Время для получения предыдущих данных (10 минут назад), общее для тика
+                self._tick_prev_time = datetime.now(timezone.utc) - timedelta(minutes=10)
+
+                # Текущие данные всех ног берем из сборщика, предыдущие - из spot_data
+                tick_pairs = {
+                    (exchange_id, symbol)
+                    for signal_data in signals_data
+                    for _, exchange_id, symbol in self._signal_spot_pairs(signal_data)
+                }
+                with PIPELINE_METRICS.span('live_snapshot'):
+                    self._live_snapshot = self.live_state.get_spot_snapshot(tick_pairs)
+                print(f"Текущие данные из сборщика: {len(self._live_snapshot)}/{len(tick_pairs)} пар")
+                try:
+                    with PIPELINE_METRICS.span('db_prev_spot'):
+                        self._stored_prev = self.db_manager.get_stored_prev_spot_data(
+                            cursor, tick_pairs, self._tick_prev_time
+                        )
                         conn.commit()
+                except psycopg2.Error as e:
+                    conn.rollback()
+                    self._stored_prev = {}
+                    print(f"Error reading prev data from spot_data, using REST: {e}", file=sys.stderr)
+                print(f"Предыдущие данные из spot_data: {len(self._stored_prev)}/{len(tick_pairs)} пар")
+
+                # Фьючерсные ноги (текущие и предыдущие) - из market_data, без запросов к биржам
+                futures_pairs = {
+                    (exchange_id, symbol)
+                    for signal_data in signals_data
+                    for _, exchange_id, symbol in self._signal_futures_pairs(signal_data)
+                }
+                try:
+                    with PIPELINE_METRICS.span('db_futures'):
+                        futures_now, futures_prev = self.db_manager.get_stored_futures_data(
+                            cursor, futures_pairs, datetime.now(timezone.utc), self._tick_prev_time
+                        )
+                        conn.commit()
+                except psycopg2.Error as e:
+                    conn.rollback()
+                    futures_now, futures_prev = {}, {}
+                    print(f"Error reading futures data from market_data: {e}", file=sys.stderr)
+                for signal_data in signals_data:
+                    for prefix, exchange_id, symbol in self._signal_futures_pairs(signal_data):
+                        setattr(signal_data, f"{prefix}_now", futures_now.get((exchange_id, symbol)))
+                        setattr(signal_data, f"{prefix}_prev", futures_prev.get((exchange_id, symbol)))
+                print(f"Фьючерсные данные из market_data: текущие {len(futures_now)}, "
+                      f"предыдущие {len(futures_prev)} из {len(futures_pairs)} пар")
+
+                # Тикеры, которых нет у сборщика, при большой пачке берем одним запросом на биржу
+                self._prefetch_tickers(signals_data)
+
+                # Шаг 4: Обогащаем данными с бирж
+                with PIPELINE_METRICS.span('enrich'):
+                    enriched_signals = list(self._enrich_signals(signals_data))
+
+                # Шаг 5: Сохраняем все сигналы одним запросом
+                print(f"\nОбновление данных в БД для {len(enriched_signals)} сигналов...")
+                with PIPELINE_METRICS.span('db_update'):
+                    results = self.db_manager.update_signals(cursor, enriched_signals)
+                    self.db_manager.complete_signals(cursor, SIGNAL_WORKER_ID, claimed_ids)
+                    conn.commit()
+                claimed_ids = []
+                for signal_id, updated in results.items():
+                    if updated:
+                        PIPELINE_METRICS.inc('signals_updated')
                         print(f"✅ Сигнал {signal_id} успешно обновлен")
                     else:
-                        conn.rollback()
+                        PIPELINE_METRICS.inc('signals_failed')
                         print(f"❌ Ошибка обновления сигнала {signal_id}")
 
         except Exception as e:
             print(f"Critical error during signal processing: {e}", file=sys.stderr)
-            if conn:
-                conn.rollback()
+            # Сетевые ошибки означают разорванное соединение - в пул его не возвращаем
+            broken = isinstance(e, (psycopg2.OperationalError, psycopg2.InterfaceError))
+            # Возвращенную пачку не разбираем повторно в том же цикле - она дождется следующего прохода
+            batch_full = False
+            if conn and not conn.closed:
+                try:
+                    conn.rollback()
+                except psycopg2.Error:
+                    broken = True
+            # Возвращаем захваченные сигналы в очередь; если соединение потеряно, аренда истечет сама
+            if claimed_ids and not broken:
+                try:
+                    with conn.cursor() as cursor:
+                        self.db_manager.release_signals(cursor, SIGNAL_WORKER_ID, claimed_ids)
+                    conn.commit()
+                except psycopg2.Error as release_error:
+                    broken = True
+                    print(f"Error releasing claimed signals: {release_error}", file=sys.stderr)
 
         finally:
+            self._clear_ticker_snapshots()
             if conn:
-                conn.close()
+                self.db_manager.release_connection(conn, discard=broken)
+            cache_stats = self.kline_cache.stats()
+            print(f"Кэш свечей: попаданий {cache_stats['hits']}, частичных {cache_stats['partial_hits']}, "
+                  f"промахов {cache_stats['misses']}, свечей в памяти {cache_stats['candles']}")
+            PIPELINE_METRICS.observe('tick', time.perf_counter() - tick_started)
+            PIPELINE_METRICS.finish_tick()
             print(f"\n[{datetime.now()}] === Обработка сигналов завершена ===")
 
-    def _process_trading_pairs(self, signal_data: SignalData, prev_time: datetime) -> None:
+        return batch_full
+
+    def drain_signals(self, run_db_function: bool = True) -> None:
+        """
+        Выполняет проход обработки и, пока захватываются полные пачки, разбирает
+        остаток очереди проходами без create_raw_signals.
+
+        Args:
+            run_db_function: Вызывать create_raw_signals в первом проходе
+        """
+        more_pending = self.process_signals(run_db_function=run_db_function)
+        while more_pending:
+            more_pending = self.process_signals(run_db_function=False)
+
+    def _prefetch_tickers(self, signals_data: List[SignalData]) -> None:
+        """
+        Загружает тикеры всех символов биржи, если они нужны многим сигналам тика.
+
+        Для биржи, на которой текущих данных сборщика не хватает более чем
+        TICKER_SNAPSHOT_MIN_SIGNALS сигналам, все тикеры загружаются одним
+        запросом, и до конца тика get_24hr_ticker отвечает из снимка. Если
+        загрузить снимок не удалось, тикеры запрашиваются по символам.
+
+        Args:
+            signals_data: Подготовленные сигналы тика
+        """
+        signals_per_exchange = Counter()
+        for signal_data in signals_data:
+            signals_per_exchange.update({
+                exchange_id
+                for _, exchange_id, symbol in self._signal_spot_pairs(signal_data)
+                if (exchange_id, symbol) not in self._live_snapshot
+            })
+
+        clients = (self.async_market_processor or self.market_processor).clients
+        for exchange_id, signals_count in signals_per_exchange.items():
+            if signals_count <= TICKER_SNAPSHOT_MIN_SIGNALS:
+                continue
+            client = clients[exchange_id]
+            with PIPELINE_METRICS.span('ticker_snapshot', client.exchange_name):
+                if self.async_market_processor:
+                    snapshot = self.async_market_processor.submit(client.get_all_tickers()).result()
+                else:
+                    snapshot = client.get_all_tickers()
+            client.ticker_snapshot = snapshot
+            if snapshot is None:
+                print(f"{client.exchange_name}: не удалось загрузить тикеры, запрашиваем по символам",
+                      file=sys.stderr)
+            else:
+                print(f"{client.exchange_name}: загружено {len(snapshot)} тикеров для {signals_count} сигналов")
+
+    def _clear_ticker_snapshots(self) -> None:
+        """Сбрасывает снимки тикеров тика, чтобы следующий тик не получил устаревшие цены."""
+        processors = [self.market_processor, self.async_market_processor]
+        for processor in filter(None, processors):
+            for client in processor.clients.values():
+                client.ticker_snapshot = None
+
+    def _enrich_signals(self, signals_data: List[SignalData]) -> Iterator[SignalData]:
+        """
+        Обогащает сигналы данными с бирж.
+
+        В режиме async все сигналы обрабатываются корутинами в фоновом event
+        loop. Иначе при SIGNAL_ENRICH_WORKERS > 1 все ноги и статистика всех
+        сигналов выполняются в общем пуле потоков. Сигнал отдается сразу, как
+        только завершены все его задачи.
+
+        Args:
+            signals_data: Подготовленные сигналы
+
+        Yields:
+            Полностью обработанные сигналы
         """
-        Обрабатывает торговые пары для сигнала.
+        if self.async_market_processor:
+            future_to_signal = {
+                self.async_market_processor.submit(self._enrich_signal_async(signal_data)): signal_data
+                for signal_data in signals_data
+            }
+            for future in as_completed(future_to_signal):
+                signal_data = future_to_signal[future]
+                error = future.exception()
+                if error:
+                    print(f"Error enriching signal {signal_data.signal_id}: {error}", file=sys.stderr)
+                yield signal_data
+            return
+
+        if SIGNAL_ENRICH_WORKERS <= 1:
+            for signal_data in signals_data:
+                for task in self._enrichment_tasks(signal_data):
+                    task()
+                yield signal_data
+            return
+
+        with ThreadPoolExecutor(max_workers=SIGNAL_ENRICH_WORKERS, thread_name_prefix='enrich') as executor:
+            remaining: Dict[int, int] = {}
+            future_to_signal = {}
+            for signal_data in signals_data:
+                tasks = self._enrichment_tasks(signal_data)
+                remaining[signal_data.signal_id] = len(tasks)
+                for task in tasks:
+                    future_to_signal[executor.submit(task)] = signal_data
+
+            for future in as_completed(future_to_signal):
+                signal_data = future_to_signal[future]
+                error = future.exception()
+                if error:
+                    print(f"Error enriching signal {signal_data.signal_id}: {error}", file=sys.stderr)
+                remaining[signal_data.signal_id] -= 1
+                if remaining[signal_data.signal_id] == 0:
+                    yield signal_data
+
+    @staticmethod
+    def _signal_spot_pairs(signal_data: SignalData) -> List[Tuple[str, int, str]]:
+        """
+        Определяет спотовые ноги сигнала, доступные на биржах.
 
         Args:
             signal_data: Данные сигнала
+
+        Returns:
+            Список кортежей (префикс_полей, exchange_id, символ)
+        """
+        pairs = []
+        for prefix, exchange_id, quote_asset in SPOT_LEGS:
+            symbol = f"{signal_data.base_asset}{quote_asset}"
+            if (exchange_id, symbol) in signal_data.available_pairs:
+                pairs.append((prefix, exchange_id, symbol))
+        return pairs
+
+    @staticmethod
+    def _signal_futures_pairs(signal_data: SignalData) -> List[Tuple[str, int, str]]:
+        """
+        Определяет фьючерсные ноги сигнала.
+
+        Наличие контракта проверяет запрос к market_data: пары без
+        фьючерса просто не попадают в результат.
+
+        Args:
+            signal_data: Данные сигнала
+
+        Returns:
+            Список кортежей (префикс_полей, exchange_id, символ)
+        """
+        return [
+            (prefix, exchange_id, f"{signal_data.base_asset}{quote_asset}")
+            for prefix, exchange_id, quote_asset in FUTURES_LEGS
+        ]
+
+    def _enrichment_plan(self, signal_data: SignalData) -> Tuple[datetime, List[SpotLegPlan]]:
+        """
+        Составляет план обработки спотовых ног сигнала с учетом снимков тика.
+
+        Args:
+            signal_data: Данные сигнала
+
+        Returns:
+            Кортеж (prev_time, планы_ног)
+        """
+        print(f"\n--- Обработка сигнала ID: {signal_data.signal_id}, токен: {signal_data.token_symbol} ---")
+
+        legs = [
+            SpotLegPlan(
+                prefix=prefix,
+                exchange_id=exchange_id,
+                symbol=symbol,
+                live_now=self._live_snapshot.get((exchange_id, symbol)),
+                stored_prev=self._stored_prev.get((exchange_id, symbol))
+            )
+            for prefix, exchange_id, symbol in self._signal_spot_pairs(signal_data)
+        ]
+        return self._tick_prev_time, legs
+
+    def _enrichment_tasks(self, signal_data: SignalData) -> List[Callable[[], None]]:
+        """
+        Формирует независимые задачи обогащения сигнала.
+
+        Каждая задача заполняет только свои поля SignalData, поэтому задачи
+        можно выполнять параллельно.
+
+        Args:
+            signal_data: Данные сигнала
+
+        Returns:
+            Список задач без аргументов
+        """
+        prev_time, legs = self._enrichment_plan(signal_data)
+        tasks = [partial(self._process_spot_leg, signal_data, leg, prev_time) for leg in legs]
+        tasks.append(partial(self._process_price_stats, signal_data))
+        return tasks
+
+    async def _enrich_signal_async(self, signal_data: SignalData) -> None:
+        """
+        Обогащает сигнал, отправляя запросы всех ног и статистики одновременно.
+
+        Args:
+            signal_data: Данные сигнала
+        """
+        prev_time, legs = self._enrichment_plan(signal_data)
+        processor = self.async_market_processor
+
+        async def process_leg(leg: SpotLegPlan) -> None:
+            print(f"Получение данных {leg.symbol} с {EXCHANGE_NAMES[leg.exchange_id]}...")
+            with PIPELINE_METRICS.span('spot_leg', EXCHANGE_NAMES[leg.exchange_id]):
+                now_data, prev_data = await processor.get_spot_data(leg.exchange_id, leg.symbol, prev_time,
+                                                                    leg.live_now, leg.stored_prev)
+            setattr(signal_data, f"{leg.prefix}_now", now_data)
+            setattr(signal_data, f"{leg.prefix}_prev", prev_data)
+
+        async def process_stats() -> None:
+            print(f"Получение статистики цен для {signal_data.base_asset}...")
+            with PIPELINE_METRICS.span('price_stats'):
+                signal_data.price_stats = await processor.get_price_statistics(
+                    signal_data.base_asset,
+                    available_pairs=signal_data.available_pairs
+                )
+
+        await asyncio.gather(*(process_leg(leg) for leg in legs), process_stats())
+
+    def _process_spot_leg(self, signal_data: SignalData, leg: SpotLegPlan, prev_time: datetime) -> None:
+        """
+        Получает текущие и предыдущие данные одной спотовой пары сигнала.
+
+        Args:
+            signal_data: Данные сигнала
+            leg: План ноги
             prev_time: Время для получения предыдущих данных
         """
-        base_asset = signal_data.base_asset
-
-        # Проверяем доступность пар на биржах
-        binance_usdt_available = (BINANCE_EXCHANGE_ID, f"{base_asset}USDT") in signal_data.available_pairs
-        binance_btc_available = (BINANCE_EXCHANGE_ID, f"{base_asset}BTC") in signal_data.available_pairs
-        bybit_usdt_available = (BYBIT_EXCHANGE_ID, f"{base_asset}USDT") in signal_data.available_pairs
-        bybit_btc_available = (BYBIT_EXCHANGE_ID, f"{base_asset}BTC") in signal_data.available_pairs
-
-        # Получаем данные USDT пар
-        if binance_usdt_available:
-            print(f"Получение данных {base_asset}USDT с Binance...")
-            now_data, prev_data = self.market_processor.get_spot_data_binance(f"{base_asset}USDT", prev_time)
-            signal_data.spot_usdt_binance_now = now_data
-            signal_data.spot_usdt_binance_prev = prev_data
-
-        if bybit_usdt_available:
-            print(f"Получение данных {base_asset}USDT с Bybit...")
-            now_data, prev_data = self.market_processor.get_spot_data_bybit(f"{base_asset}USDT", prev_time)
-            signal_data.spot_usdt_bybit_now = now_data
-            signal_data.spot_usdt_bybit_prev = prev_data
-
-        # Получаем данные BTC пар
-        if binance_btc_available:
-            print(f"Получение данных {base_asset}BTC с Binance...")
-            now_data, prev_data = self.market_processor.get_spot_data_binance(f"{base_asset}BTC", prev_time)
-            signal_data.spot_btc_binance_now = now_data
-            signal_data.spot_btc_binance_prev = prev_data
-
-        if bybit_btc_available:
-            print(f"Получение данных {base_asset}BTC с Bybit...")
-            now_data, prev_data = self.market_processor.get_spot_data_bybit(f"{base_asset}BTC", prev_time)
-            signal_data.spot_btc_bybit_now = now_data
-            signal_data.spot_btc_bybit_prev = prev_data
+        print(f"Получение данных {leg.symbol} с {EXCHANGE_NAMES[leg.exchange_id]}...")
+        with PIPELINE_METRICS.span('spot_leg', EXCHANGE_NAMES[leg.exchange_id]):
+            now_data, prev_data = self.market_processor.get_spot_data(leg.exchange_id, leg.symbol, prev_time,
+                                                                      leg.live_now, leg.stored_prev)
+        setattr(signal_data, f"{leg.prefix}_now", now_data)
+        setattr(signal_data, f"{leg.prefix}_prev", prev_data)
+
+    def _process_price_stats(self, signal_data: SignalData) -> None:
+        """
+        Получает статистику цен для сигнала.
+
+        Args:
+            signal_data: Данные сигнала
+        """
+        print(f"Получение статистики цен для {signal_data.base_asset}...")
+        with PIPELINE_METRICS.span('price_stats'):
+            signal_data.price_stats = self.market_processor.get_price_statistics(
+                signal_data.base_asset,
+                available_pairs=signal_data.available_pairs
+            )
+
+
+def run_polling(processor: SignalProcessor) -> None:
+    """
+    Запускает обработку по таймеру каждые SIGNAL_POLL_INTERVAL секунд; очередь
+    больше одной пачки (SIGNAL_CLAIM_BATCH) разбирается проходами подряд.
+
+    Args:
+        processor: Процессор сигналов
+    """
+    processor.prepare_database(notify_trigger=False)
+    schedule.every(SIGNAL_POLL_INTERVAL).seconds.do(processor.drain_signals)
+
+    print(f"\nПланировщик запущен. Первая проверка через {SIGNAL_POLL_INTERVAL} секунд...")
+    print("Для остановки нажмите Ctrl+C\n")
+
+    while True:
+        schedule.run_pending()
+        time.sleep(1)
+
+
+def run_event_loop(processor: SignalProcessor) -> None:
+    """
+    Запускает обработку по уведомлениям PostgreSQL.
+
+    Уведомление сборщика о сохраненном снимке запускает полный проход с
+    create_raw_signals; уведомление триггера о сигналах, вставленных другой
+    сессией, - только обогащение ожидающих сигналов. Накопившиеся
+    уведомления объединяются в один проход, уведомление об обновлении
+    trading_pairs сбрасывает индекс пар, а очередь больше одной пачки
+    (SIGNAL_CLAIM_BATCH) разбирается проходами подряд. Если полного прохода
+    не было SIGNAL_SAFETY_INTERVAL секунд, он выполняется по таймеру.
+
+    Args:
+        processor: Процессор сигналов
+    """
+    processor.prepare_database(notify_trigger=True)
+    listener = SignalListener([SIGNALS_NOTIFY_CHANNEL, COLLECTOR_NOTIFY_CHANNEL, TRADING_PAIRS_NOTIFY_CHANNEL])
+    print("\nОжидание уведомлений. Первый проход выполняется сразу...")
+    print("Для остановки нажмите Ctrl+C\n")
+
+    next_full_run = time.monotonic()
+    try:
+        while True:
+            notifies = listener.wait(max(0.0, next_full_run - time.monotonic()))
+            if any(notify.channel == TRADING_PAIRS_NOTIFY_CHANNEL for notify in notifies):
+                processor.pair_index.invalidate()
+            run_full = time.monotonic() >= next_full_run or any(
+                notify.channel == COLLECTOR_NOTIFY_CHANNEL for notify in notifies
+            )
+            external_signals = any(
+                notify.channel == SIGNALS_NOTIFY_CHANNEL and not processor.is_own_notify(notify)
+                for notify in notifies
+            )
+
+            # Очередь больше одной пачки разбирается сразу
+            if run_full:
+                processor.drain_signals()
+                next_full_run = time.monotonic() + SIGNAL_SAFETY_INTERVAL
+            elif external_signals:
+                processor.drain_signals(run_db_function=False)
+    finally:
+        listener.close()
 
 
 def main():
@@ -972,28 +3182,32 @@ def main():
     print("=" * 60)
     print("Запуск планировщика обработки криптовалютных сигналов")
     print(f"Время запуска: {datetime.now()}")
-    print(f"Интервал обработки: каждые 15 секунд")
+    if SIGNAL_TRIGGER_MODE == 'listen':
+        print(f"Режим запуска: уведомления PostgreSQL, страховочный проход каждые {SIGNAL_SAFETY_INTERVAL} секунд")
+    else:
+        print(f"Интервал обработки: каждые {SIGNAL_POLL_INTERVAL} секунд")
+    print(f"HTTP режим: {SIGNAL_HTTP_MODE}, потоков обогащения: {SIGNAL_ENRICH_WORKERS} "
+          f"(Binance: {BINANCE_MAX_CONCURRENCY}, Bybit: {BYBIT_MAX_CONCURRENCY} одновременных запросов)")
     print("=" * 60)
 
     # Создаем процессор сигналов
     processor = SignalProcessor()
-
-    # Настраиваем планировщик
-    schedule.every(15).seconds.do(processor.process_signals)
-
-    print("\nПланировщик запущен. Первая проверка через 15 секунд...")
-    print("Для остановки нажмите Ctrl+C\n")
+    if METRICS_PORT:
+        PIPELINE_METRICS.serve(METRICS_PORT)
 
     try:
-        while True:
-            schedule.run_pending()
-            time.sleep(1)
+        if SIGNAL_TRIGGER_MODE == 'listen':
+            run_event_loop(processor)
+        else:
+            run_polling(processor)
     except KeyboardInterrupt:
         print("\n\nПланировщик остановлен пользователем")
         print(f"Время остановки: {datetime.now()}")
     except Exception as e:
         print(f"\n\nКритическая ошибка: {e}", file=sys.stderr)
         sys.exit(1)
+    finally:
+        processor.close()
 
 
 if __name__ == "__main__":